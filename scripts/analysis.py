@@ -1,146 +1,182 @@
+import os
 import metrics
-from collections import defaultdict
-from collections import Counter
+from loader import load_columns
+from columns_cache import load_cached
+from timeline import TimeIndex
+from incremental import CountState
+from store import GroupedIds
+from drilldown import KeyTable
+from documents import Documents
+from functools import cached_property
 
+DATASETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            '..', 'datasets')
 
-class Analysis:
-
-    
-    def __init__(self, corpus_path):
-        self.le2m, self.m2le = self.load(corpus_path)
-        self.create_input_formats()
 
-        self.moa = metrics.MOA(self.o_l)
-        self.moda = metrics.MODA(self.amb_dominance)
-        self.emnle = metrics.EMNLE(self.amb_dominance)
-        self.dtr = metrics.DTR(self.dates)
-
-        self.rora = 0.0
-        if self.ra:
-            self.rora = metrics.RORA(self.oa, self.ra)
+class Analysis:
+    """
+    metric-based analysis of a dataset
 
-        self.mov = metrics.MOV(self.o_m)
-        self.modv = metrics.MODV(self.var_dominance)
-        self.elenm = metrics.ELENM(self.var_entropy)
+    the dataset is loaded once into interned columns and counted into a
+    lexical expression x meaning co-occurrence matrix. Metrics are only
+    computed when they are accessed, e.g. Analysis('WSD___SE2-AW').moa
+    """
 
-        self.rorv = 0.0
-        if self.rorv:
-            self.rorv = metrics.RORV(self.ov, self.rv)
+    def __init__(self, corpus_path, cached=True, resources=None):
+        self.columns = self.load(corpus_path, cached, resources)
+        self.counts = self.columns.count_matrix()
 
-    def load(self, corpus_path):
+    def load(self, corpus_path, cached=True, resources=None):
         """
-        load mappings:
-        lexical expression -> meanings
-        meanings -> lexical expressions
+        load corpus into columns and set resource ambiguity (ra),
+        resource variance (rv) and document creation times (dates)
 
-        :param str corpus_path: path to corpus in tsv format
+        :param str corpus_path: path to corpus in tsv format, or the name of
+        a file in the datasets directory (e.g. 'WSD___SE2-AW')
         1. identifier
         2. lexical expression
         3. meaning
         4. [if available] document creation time
         5. [if available] resource ambiguity
         6. [if available] resource variance
-
-
-        :rtype: tuple
-        :return: (lexical expression -> meaning,
-                  meaning -> lexical expression
+        :param bool cached: load the corpus from its binary cache, see
+        columns_cache (built or refreshed if needed)
+        :param resource_index.ResourceIndex resources: if given, resource
+        ambiguity and variance are looked up in this index instead of being
+        read from the corpus
+
+        :rtype: loader.Columns
+        :return: the corpus as interned columns
+        """
+        if not os.path.isfile(corpus_path):
+            corpus_path = os.path.join(DATASETS_DIR, corpus_path)
+        columns = load_cached(corpus_path) if cached else load_columns(corpus_path)
+        if resources is not None:
+            columns = resources.apply(columns)
+        self.ra = columns.resource_ambiguity()
+        self.rv = columns.resource_variance()
+        self.dates = columns.dates()
+        return columns
+
+    @cached_property
+    def metrics(self):
+        """
+        :rtype: metrics.DatasetMetrics
+        :return: lazily computed metrics of the dataset
         """
-        le2m = defaultdict(list)
-        m2le = defaultdict(list)
-        self.ra = {}
-        self.rv = {}
-        self.dates=set()
-        with open('../datasets/' + corpus_path) as infile:
-            for line in infile:
+        return self.counts.metrics(self.columns.resource_ambiguity_column(),
+                                   self.columns.resource_variance_column(),
+                                   self.columns.creation_dates)
 
-                try:
-                    iden, le, m, dct, r_amb, r_var = line.strip().split('\t')
-                except ValueError:
-                    continue
+    def __getattr__(self, name):
+        if name in metrics.DatasetMetrics.NAMES:
+            return getattr(self.metrics, name)
+        raise AttributeError(name)
 
-                if dct.strip() not in {'NONE', 'None', ''}:
-                    self.dates.add(dct)
-                if r_amb not in {'NONE', 'None'}:
-                    r_amb = int(r_amb)
-                    self.ra[le] = r_amb
-                if r_var not in {'NONE', 'None'}:
-                    r_var = int(r_var)
-                    self.rv[m] = r_var
+    @cached_property
+    def state(self):
+        """
+        :rtype: incremental.CountState
+        :return: mergeable per-key count state, built on first use
+        """
+        return CountState.from_columns(self.columns)
 
-                le2m[le].append(m)
-                m2le[m].append(le)
+    def update(self, rows):
+        """
+        add rows to the analysis, only the statistics of the keys in rows
+        are recomputed. Afterwards, metrics are served by the count state;
+        columns, counts, le2m and m2le keep describing the loaded corpus.
 
-        return le2m, m2le
+        :param rows: iterable of rows with six fields, see load
+        """
+        self.state.update(rows)
+        self.metrics = self.state
 
-    def get_distribution(self, a_list):
+    def merge(self, other):
         """
-        compute probability of each item in the list
+        add the counts of another Analysis (or CountState), see update
 
-        :param a_list: a list of items
+        :param other: Analysis or incremental.CountState
+        """
+        self.state.merge(getattr(other, 'state', other))
+        self.metrics = self.state
 
-        :rtype: list
-        :return: list of probabilities of each item
+    def save_state(self, path):
         """
-        counts = Counter(a_list)
-        total = len(a_list)
+        write a snapshot of the count state, which can be resumed with
+        incremental.CountState.load
 
-        distribution = []
+        :param str path: output path (.npz)
+        """
+        self.state.save(path)
 
-        for item, freq in counts.items():
-            rel_freq = freq / total
-            distribution.append(rel_freq)
+    def timeline(self, unit='month'):
+        """
+        :param str unit: 'day', 'month' or 'year'
 
-        return distribution
+        :rtype: timeline.TimeIndex
+        :return: metrics per time window of document creation time
+        """
+        return TimeIndex(self.columns, unit)
 
-    def create_input_formats(self):
+    @cached_property
+    def le2m(self):
         """
-        each metric requires the data in a certain format this method
-        prepares those
+        :rtype: store.GroupedIds
+        :return: lexical expression -> list of meanings (one per mention)
         """
-        # moa: m -> set([le1, le2])
-        self.o_m = {}
-        # moda: list of dominant percentages
-        self.amb_dominance = []
-        # emnle: list of entropy values (meaning distribution)
-        self.amb_entropy = []
+        return GroupedIds(self.columns.le_ids, self.columns.les,
+                          self.columns.m_ids, self.columns.meanings)
 
-        # rora:
-            # (oa) le -> int (observed ambiguity))
-            # (ra) le -> int (resource ambiguity)
-        self.oa = {}
-
-        # mov l -> set([m1, m2])
-        self.o_l = {}
-        # modv: list of dominant percentages
-        self.var_dominance = []
-        # elenm: list of entropy values (le distribution)
-        self.var_entropy = []
-        # rora:
-            # le -> int (observed ambiguity))
-            # le -> int (resource ambiguity)
-        self.ov = {}
-
-        for le, meanings in self.le2m.items():
-            self.o_l[le] = set(meanings)
-
-            self.oa[le] = len(set(meanings))
-
-            distribution = self.get_distribution(meanings)
-            maximum = max(distribution)
-            entropy = metrics.entropy(distribution, normalized=True)
-
-            self.amb_dominance.append(maximum)
-            self.amb_entropy.append(entropy)
+    @cached_property
+    def m2le(self):
+        """
+        :rtype: store.GroupedIds
+        :return: meaning -> list of lexical expressions (one per mention)
+        """
+        return GroupedIds(self.columns.m_ids, self.columns.meanings,
+                          self.columns.le_ids, self.columns.les)
 
-        for m, les in self.m2le.items():
-            self.o_m[m] = set(les)
+    @cached_property
+    def ambiguity_table(self):
+        """
+        :rtype: drilldown.KeyTable
+        :return: statistics per lexical expression of the loaded corpus
+        """
+        return KeyTable.from_metrics(self._counted_metrics(), 'ambiguity',
+                                     self.columns.les)
 
-            self.ov[m] = len(set(les))
+    @cached_property
+    def variance_table(self):
+        """
+        :rtype: drilldown.KeyTable
+        :return: statistics per meaning of the loaded corpus
+        """
+        return KeyTable.from_metrics(self._counted_metrics(), 'variance',
+                                     self.columns.meanings)
 
-            distribution = self.get_distribution(les)
-            maximum = max(distribution)
-            entropy = metrics.entropy(distribution, normalized=True)
+    @cached_property
+    def mfs(self):
+        """
+        :rtype: baselines.MostFrequentSense
+        :return: most frequent sense baseline fitted on the loaded corpus
+        """
+        from baselines import MostFrequentSense
+        return MostFrequentSense.fit(self)
 
-            self.var_dominance.append(maximum)
-            self.var_entropy.append(entropy)
+    @cached_property
+    def documents(self):
+        """
+        :rtype: documents.Documents
+        :return: per-document metrics of the loaded corpus, with the
+        documents parsed from the identifiers
+        """
+        return Documents.from_columns(self.columns)
+
+    def _counted_metrics(self):
+        # after update or merge, metrics is the count state
+        if isinstance(self.metrics, metrics.DatasetMetrics):
+            return self.metrics
+        return self.counts.metrics(self.columns.resource_ambiguity_column(),
+                                   self.columns.resource_variance_column(),
+                                   self.columns.creation_dates)
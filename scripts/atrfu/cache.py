@@ -0,0 +1,251 @@
+"""
+persistent caches for the candidate generation
+
+FrequencyCache stores the candidate frequencies of a mention, keyed by
+(identifier, date): they depend on the date for which the page views were
+looked up. TieredCache memoizes the lookups underneath, e.g. the candidate
+set of a (mention, link) pair and the page views of an (entity, date) pair,
+so that runs for different dates share them. All entries are stored in
+SQLite and committed in batches, so a crash loses at most the last
+uncommitted batch and never corrupts the file.
+"""
+import json
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from pageviews import to_date_string
+
+
+class FrequencyCache:
+    """
+    (identifier, date) -> candidate frequencies (dict candidate -> views)
+
+    >>> cache = FrequencyCache(':memory:')
+    >>> cache.put('d1.t1', '2015-07-01', {'http://dbpedia.org/resource/France': 8920})
+    >>> cache.get('d1.t1', '2015-07-01')
+    {'http://dbpedia.org/resource/France': 8920}
+    >>> cache.get('d1.t1', '2011-12-01') is None
+    True
+    >>> cache.close()
+
+    :param str path: path of the SQLite database
+    :param int batch_size: number of puts per commit
+    """
+
+    def __init__(self, path, batch_size=100):
+        self.path = path
+        self.batch_size = batch_size
+        self.uncommitted = 0
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('''CREATE TABLE IF NOT EXISTS frequencies (
+                                       identifier TEXT NOT NULL,
+                                       date TEXT NOT NULL,
+                                       freq TEXT NOT NULL,
+                                       PRIMARY KEY (identifier, date))''')
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM frequencies').fetchone()[0]
+
+    def get(self, identifier, date):
+        """
+        :rtype: dict
+        :return: cached candidate frequencies, None if not cached
+        """
+        row = self.connection.execute(
+            'SELECT freq FROM frequencies WHERE identifier = ? AND date = ?',
+            (identifier, to_date_string(date))).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def put(self, identifier, date, freq):
+        self.connection.execute(
+            'INSERT OR REPLACE INTO frequencies VALUES (?, ?, ?)',
+            (identifier, to_date_string(date), json.dumps(freq)))
+        self.uncommitted += 1
+        if self.uncommitted >= self.batch_size:
+            self.commit()
+
+    def commit(self):
+        self.connection.commit()
+        self.uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+    def import_pickle(self, pickle_path, dates):
+        """
+        import a cache written by earlier versions of
+        compute_entity_ranks_relfreqs (a pickled dict identifier -> freq)
+
+        :param str pickle_path: path to the pickled dict
+        :param dates: the date all entries were computed for (str), or a
+        dict identifier -> date if they were computed for the creation time
+        of each mention. Entries without a date are skipped.
+
+        :rtype: int
+        :return: number of imported entries
+        """
+        with open(pickle_path, 'rb') as infile:
+            old_cache = pickle.load(infile)
+
+        imported = 0
+        for identifier, freq in old_cache.items():
+            identifier = identifier.strip()
+            date = dates.get(identifier) if isinstance(dates, dict) else dates
+            if date is None:
+                continue
+            self.connection.execute(
+                'INSERT OR REPLACE INTO frequencies VALUES (?, ?, ?)',
+                (identifier, to_date_string(date), json.dumps(freq)))
+            imported += 1
+        self.commit()
+        return imported
+
+
+class LRUCache:
+    """
+    in-memory mapping that keeps the maxsize most recently used entries
+
+    >>> cache = LRUCache(2)
+    >>> cache.put('a', 1); cache.put('b', 2); cache.get('a')
+    1
+    >>> cache.put('c', 3)
+    >>> cache.get('b') is None
+    True
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+
+class TieredCache:
+    """
+    two-level cache: an LRUCache in front of a SQLite table. Keys are
+    tuples of strings, values are JSON serializable. Safe to share
+    between threads.
+
+    >>> cache = TieredCache(':memory:', 'views', maxsize=1)
+    >>> cache.put(('France', '2015-07-01'), 8920)
+    >>> cache.put(('Paris', '2015-07-01'), 1200)
+    >>> cache.get(('France', '2015-07-01'))
+    8920
+    >>> cache.disk_hits, cache.disk_misses
+    (1, 0)
+    >>> cache.close()
+
+    :param str path: path of the SQLite database
+    :param str table: name of the table holding this cache
+    :param int maxsize: number of entries kept in memory
+    :param int max_disk_entries: if not None, the least recently used
+    entries on disk are evicted beyond this number at each commit
+    :param int batch_size: number of puts per commit
+    """
+
+    def __init__(self, path, table, maxsize=10000, max_disk_entries=None,
+                 batch_size=100):
+        self.table = table
+        self.memory = LRUCache(maxsize)
+        self.max_disk_entries = max_disk_entries
+        self.batch_size = batch_size
+        self.uncommitted = 0
+        self.disk_hits = 0
+        self.disk_misses = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('''CREATE TABLE IF NOT EXISTS %s (
+                                       key TEXT PRIMARY KEY,
+                                       value TEXT NOT NULL,
+                                       accessed REAL NOT NULL)''' % table)
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get(self, key):
+        """
+        :rtype: object
+        :return: cached value, None if not cached in memory nor on disk
+        """
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT value FROM %s WHERE key = ?' % self.table,
+                (json.dumps(key),)).fetchone()
+            if row is None:
+                self.disk_misses += 1
+                return None
+            self.disk_hits += 1
+            self.connection.execute(
+                'UPDATE %s SET accessed = ? WHERE key = ?' % self.table,
+                (time.time(), json.dumps(key)))
+        value = json.loads(row[0])
+        self.memory.put(key, value)
+        return value
+
+    def put(self, key, value):
+        self.memory.put(key, value)
+        with self.lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO %s VALUES (?, ?, ?)' % self.table,
+                (json.dumps(key), json.dumps(value), time.time()))
+            self.uncommitted += 1
+            if self.uncommitted >= self.batch_size:
+                self._commit()
+
+    def commit(self):
+        with self.lock:
+            self._commit()
+
+    def _commit(self):
+        if self.max_disk_entries is not None:
+            self.connection.execute(
+                '''DELETE FROM %s WHERE key IN (
+                       SELECT key FROM %s ORDER BY accessed DESC
+                       LIMIT -1 OFFSET ?)''' % (self.table, self.table),
+                (self.max_disk_entries,))
+        self.connection.commit()
+        self.uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self.connection.close()
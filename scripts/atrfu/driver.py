@@ -0,0 +1,350 @@
+"""
+resumable driver for the time analysis of entity ranks
+
+a work unit is a mention and a snapshot date: the candidate frequencies of
+the mention are the page views of its candidates on that date (or on the
+creation time of its document). Units are looked up by a pool of threads
+and their frequencies checkpointed in a FrequencyCache (SQLite), committed
+in batches, so a run that crashes or is interrupted resumes with the units
+that are not in it. Failed lookups (e.g. an unavailable endpoint) are
+retried with exponential backoff and otherwise left out of the checkpoint,
+so the next run retries them. Units on dates the page view provider has no
+data for are rejected before any lookup, never checkpointed as units
+without views. Progress is reported as JSON events, one per line.
+
+Usage: python driver.py MENTIONS --dates creation 2007-12-01 2011-12-01
+                        [--cache meantime.sqlite] [--workers 8]
+                        [--events events.jsonl] [--views-from 2007-12-01]
+"""
+import argparse
+import json
+import sys
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+import requests
+
+from cache import FrequencyCache, TieredCache
+from pageviews import (PageViewError, UnavailableDates, default_provider,
+                       to_date_string)
+from the_candidate_generation import (SPARQL_ENDPOINT, RateLimiter,
+                                      candidates_to_freq, get_rank_and_relfreq,
+                                      make_session)
+
+CREATION = 'creation'
+
+
+def read_mentions(path, views_from=None):
+    """
+    :param str path: tsv file with mention, gold link, creation time
+    (yyyy-mm-dd) and identifier
+    :param datetime.datetime views_from: if not None, mentions created
+    before this date are skipped (no page views are available for them)
+
+    :rtype: list
+    :return: list of (identifier, goldmention, goldlink, creation time)
+    """
+    mentions = []
+    with open(path, encoding='utf-8') as infile:
+        for line in infile:
+            goldmention, goldlink, creation_time, identifier = line.rstrip('\n').split('\t')
+            if views_from is not None and \
+                    datetime.strptime(creation_time, '%Y-%m-%d') < views_from:
+                continue
+            mentions.append((identifier, goldmention, goldlink, creation_time))
+    return mentions
+
+
+def work_units(mentions, snapshots):
+    """
+    >>> mentions = [('d1.t1', 'Boeing', 'http://dbpedia.org/resource/Boeing', '2008-03-01')]
+    >>> [unit[0] + ' ' + unit[4] for unit in work_units(mentions, [CREATION, '2011-12-01'])]
+    ['creation 2008-03-01', '2011-12-01 2011-12-01']
+
+    :param list mentions: see read_mentions
+    :param list snapshots: CREATION or dates (yyyy-mm-dd or datetime)
+
+    :rtype: list
+    :return: list of (snapshot, identifier, goldmention, goldlink, date),
+    snapshot by snapshot
+    """
+    units = []
+    for snapshot in snapshots:
+        snapshot = to_date_string(snapshot)
+        for identifier, goldmention, goldlink, creation_time in mentions:
+            date = creation_time if snapshot == CREATION else snapshot
+            units.append((snapshot, identifier, goldmention, goldlink, date))
+    return units
+
+
+class EventLog:
+    """
+    structured events, one JSON object per line with the event name and
+    the time it was emitted
+
+    >>> import io
+    >>> stream = io.StringIO()
+    >>> EventLog(stream).emit('start', units=8)
+    >>> sorted(json.loads(stream.getvalue()))
+    ['event', 'time', 'units']
+
+    :param stream: file object the events are written to
+    :param float interval: minimum number of seconds between progress events
+    """
+
+    def __init__(self, stream=sys.stderr, interval=5.0):
+        self.stream = stream
+        self.interval = interval
+
+    def emit(self, event, **fields):
+        record = {'event': event, 'time': round(time.time(), 3)}
+        record.update(fields)
+        self.stream.write(json.dumps(record) + '\n')
+        self.stream.flush()
+
+
+class Progress:
+    """
+    counts of the units of a run, reported as 'progress' events
+
+    :param EventLog events: where progress is reported
+    :param int total: number of units to look up in this run
+    """
+
+    def __init__(self, events, total):
+        self.events = events
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.start = time.monotonic()
+        self.last_report = self.start
+
+    def report(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_report < self.events.interval:
+            return
+        self.last_report = now
+        elapsed = now - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - self.done - self.failed
+        self.events.emit('progress', done=self.done, failed=self.failed,
+                         total=self.total, elapsed=round(elapsed, 3),
+                         units_per_second=round(rate, 3),
+                         eta=round(remaining / rate, 1) if rate else None)
+
+
+def lookup(unit, options, retries=3, backoff=1.0):
+    """
+    candidate frequencies of a work unit, retried on request and page view
+errors
+
+    :param tuple unit: see work_units
+    :param dict options: keyword arguments of candidates_to_freq
+    :param int retries: number of retries after the first attempt
+    :param float backoff: seconds before the first retry, doubled after
+    every retry
+
+    :rtype: dict
+    :return: candidate -> page views
+
+    :raises requests.RequestException: if the last attempt fails
+    :raises pageviews.PageViewError: if the last attempt fails
+    """
+    _, _, goldmention, goldlink, date = unit
+    for attempt in range(retries + 1):
+        try:
+            return candidates_to_freq(goldmention, goldlink, date, strict=True, **options)
+        except (requests.RequestException, PageViewError):
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+def summarize(units, checkpoint):
+    """
+    :param list units: see work_units
+    :param cache.FrequencyCache checkpoint: candidate frequencies per unit
+
+    :rtype: dict
+    :return: snapshot -> {'mentions', 'missing', 'ranked', 'avg_rank',
+    'avg_relfreq'}, averages are None if no gold link was ranked
+    """
+    ranks, relfreqs, summary = {}, {}, {}
+    for snapshot, identifier, _, goldlink, date in units:
+        counts = summary.setdefault(snapshot, {'mentions': 0, 'missing': 0, 'ranked': 0})
+        counts['mentions'] += 1
+        freq = checkpoint.get(identifier, date)
+        if freq is None:
+            counts['missing'] += 1
+            continue
+        if freq:
+            success, rank, relfreq = get_rank_and_relfreq(goldlink, freq)
+            if success:
+                counts['ranked'] += 1
+                ranks.setdefault(snapshot, []).append(rank)
+                relfreqs.setdefault(snapshot, []).append(relfreq)
+    for snapshot, counts in summary.items():
+        counts['avg_rank'] = (sum(ranks[snapshot]) / len(ranks[snapshot])
+                              if snapshot in ranks else None)
+        counts['avg_relfreq'] = (sum(relfreqs[snapshot]) / len(relfreqs[snapshot])
+                                 if snapshot in relfreqs else None)
+    return summary
+
+
+def run(mentions, snapshots, cache_path, max_workers=8, retries=3, backoff=1.0,
+        events=None, checkpoint_every=100, endpoint=SPARQL_ENDPOINT,
+        requests_per_second=None, provider=None, candidate_cache=None,
+        view_cache=None, views_per_second=None):
+    """
+    look up every (mention, snapshot) unit that is not checkpointed yet and
+    compute the average rank and relative frequency of the gold links per
+    snapshot
+
+    :param list mentions: see read_mentions
+    :param list snapshots: see work_units
+    :param str cache_path: path of the FrequencyCache used as checkpoint,
+    shared with compute_entity_ranks_relfreqs
+    :param int max_workers: number of lookup threads
+    :param int retries: see lookup
+    :param float backoff: see lookup
+    :param EventLog events: where events are reported (default: stderr)
+    :param int checkpoint_every: number of units per commit
+    :param str endpoint: url of the SPARQL endpoint
+    :param float requests_per_second: maximum rate of SPARQL requests
+    :param pageviews.PageViewProvider provider: source of the page views; it
+    has to raise on failed lookups, not return no views (default:
+    pageviews.default_provider in strict mode)
+    :param cache.TieredCache candidate_cache: memoizes candidate sets per
+    (goldmention, goldlink), e.g. across snapshots and runs
+    :param cache.TieredCache view_cache: memoizes page views per
+    (entity, date)
+    :param float views_per_second: maximum rate of page view requests of
+    the default provider
+
+    :rtype: dict
+    :return: see summarize
+    """
+    events = events or EventLog()
+    units = work_units(mentions, snapshots)
+    session = make_session(max_workers)
+    views_executor = None
+    if provider is None:
+        views_executor = ThreadPoolExecutor(max_workers)
+        provider = default_provider(session=session, max_workers=max_workers,
+                                    executor=views_executor,
+                                    limiter=RateLimiter(views_per_second),
+                                    strict=True)
+    options = {'session': session,
+               'endpoint': endpoint,
+               'limiter': RateLimiter(requests_per_second),
+               'provider': provider,
+               'candidate_cache': candidate_cache,
+               'view_cache': view_cache}
+
+    checkpoint = FrequencyCache(cache_path, batch_size=checkpoint_every)
+    executor = ThreadPoolExecutor(max_workers)
+    running = {}
+    try:
+        todo = {}
+        rejected = {}
+        for unit in units:
+            key = (unit[1], unit[4])
+            if key in todo or key in rejected or checkpoint.get(*key) is not None:
+                continue
+            try:
+                provider.check_dates(unit[4])
+                todo[key] = unit
+            except UnavailableDates as error:
+                rejected[key] = str(error)
+        for error, count in sorted(Counter(rejected.values()).items()):
+            events.emit('rejected', error=error, units=count)
+        events.emit('start', units=len(units), checkpointed=len(units) - len(todo) - len(rejected),
+                    rejected=len(rejected), todo=len(todo), workers=max_workers)
+
+        progress = Progress(events, len(todo))
+        queue = iter(todo.items())
+        while True:
+            # keep a bounded number of units in flight
+            for key, unit in queue:
+                running[executor.submit(lookup, unit, options, retries, backoff)] = key
+                if len(running) >= 2 * max_workers:
+                    break
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                identifier, date = running.pop(future)
+                try:
+                    checkpoint.put(identifier, date, future.result())
+                    progress.done += 1
+                except (requests.RequestException, PageViewError,
+                        UnavailableDates) as error:
+                    progress.failed += 1
+                    events.emit('failed', identifier=identifier, date=date,
+                                error=repr(error))
+            progress.report()
+        checkpoint.commit()
+        progress.report(force=True)
+
+        summary = summarize(units, checkpoint)
+        for snapshot, counts in summary.items():
+            events.emit('snapshot', snapshot=snapshot, **counts)
+        events.emit('end', done=progress.done, failed=progress.failed,
+                    elapsed=round(time.monotonic() - progress.start, 3))
+        return summary
+    finally:
+        executor.shutdown(cancel_futures=True)
+        # keep the lookups that finished while the run was interrupted
+        for future, key in running.items():
+            if not future.cancelled() and future.exception() is None:
+                checkpoint.put(*key, future.result())
+        if views_executor is not None:
+            views_executor.shutdown(cancel_futures=True)
+        checkpoint.close()
+        session.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('mentions', help='tsv with mention, gold link, creation time, identifier')
+    parser.add_argument('--dates', nargs='+', default=[CREATION],
+                        help='snapshot dates (yyyy-mm-dd), "%s" for the '
+                        'creation time of each mention' % CREATION)
+    parser.add_argument('--cache', default='meantime.sqlite',
+                        help='checkpoint of candidate frequencies (SQLite)')
+    parser.add_argument('--memo', default=None,
+                        help='SQLite file memoizing candidate sets and page views')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--requests-per-second', type=float, default=None)
+    parser.add_argument('--views-per-second', type=float, default=None)
+    parser.add_argument('--checkpoint-every', type=int, default=100,
+                        help='number of units per commit')
+    parser.add_argument('--views-from', default=None,
+                        help='skip mentions created before this date (yyyy-mm-dd)')
+    parser.add_argument('--events', default=None,
+                        help='append events to this file (default: stderr)')
+    parser.add_argument('--interval', type=float, default=5.0,
+                        help='seconds between progress events')
+    args = parser.parse_args()
+
+    views_from = (datetime.strptime(args.views_from, '%Y-%m-%d')
+                  if args.views_from else None)
+    stream = sys.stderr if args.events is None else open(args.events, 'a', encoding='utf-8')
+    memo = ({'candidate_cache': TieredCache(args.memo, 'candidates'),
+             'view_cache': TieredCache(args.memo, 'views')}
+            if args.memo is not None else {})
+    try:
+        run(read_mentions(args.mentions, views_from), args.dates, args.cache,
+            max_workers=args.workers, retries=args.retries,
+            events=EventLog(stream, args.interval),
+            checkpoint_every=args.checkpoint_every,
+            requests_per_second=args.requests_per_second,
+            views_per_second=args.views_per_second, **memo)
+    finally:
+        for memo_cache in memo.values():
+            memo_cache.close()
+        if stream is not sys.stderr:
+            stream.close()
@@ -1,9 +1,8 @@
 from datetime import datetime
-from the_candidate_generation import compute_entity_ranks_relfreqs
+from cache import FrequencyCache, TieredCache
+from driver import CREATION, read_mentions, run
 from lxml import etree
 import os
-from glob import glob
-import pickle
 
 
 def get_wid2w(doc):
@@ -54,51 +53,37 @@ def get_mention2goldlink(input_path, debug=False):
 
     return mention2goldlink
 
-# create iterable for meantime corpus
-views_from = datetime(2007, 12, 1)
-
-filename='meantime_with_times.tsv'
-
-cache_path = 'cache.pickle'
-iterable = []
-with open(filename, 'r') as f:
-    for line in f:
-        line=line.split('\t')
-        goldmention=line[0]
-        goldlink=line[1]
-        creation_time=line[2]
-        identifier=line[3]
-        print(line)
-        print(creation_time)
-        year, month, day = creation_time.split('-')
-        ct_datetime = datetime(int(year), int(month), int(day))
-        if ct_datetime < views_from:
-            continue
-
-        iterable.append((identifier, goldmention, goldlink, creation_time))
-
-# run it on the meantime corpus
-run = True
-if run:
-    mt_cache, mt_avg_rank, mt_avg_relfreq = compute_entity_ranks_relfreqs(iterable, 'meantime.pickle')
-    print()
-    print('meantime.pickle')
-    print(round(mt_avg_rank,2), round(mt_avg_relfreq,2))
-    mt_cache, mt_avg_rank, mt_avg_relfreq = compute_entity_ranks_relfreqs(iterable,
-                                                                          'meantime2007-12.pickle',
-                                                                          datetime(2007, 12, 1))
-    print()
-    print('meantime2007-12.pickle')
-    print(round(mt_avg_rank,2), round(mt_avg_relfreq,2))
-    mt_cache, mt_avg_rank, mt_avg_relfreq = compute_entity_ranks_relfreqs(iterable,
-                                                                          'meantime2011-12.pickle',
-                                                                          datetime(2011, 12, 1))
-    print()
-    print('meantime2011-12.pickle')
-    print(round(mt_avg_rank,2), round(mt_avg_relfreq,2))
-    mt_cache, mt_avg_rank, mt_avg_relfreq = compute_entity_ranks_relfreqs(iterable,
-                                                                          'meantime2015-12.pickle',
-                                                                          datetime(2015, 12, 1))
-    print()
-    print('meantime2015-12.pickle')
-    print(round(mt_avg_rank,2), round(mt_avg_relfreq,2))
+# mentions created before this date have no page views; dates before
+# 2015-07-01 are looked up in wikiviews (see pageviews.default_provider)
+VIEWS_FROM = datetime(2007, 12, 1)
+SNAPSHOTS = [CREATION, '2007-12-01', '2011-12-01', '2015-12-01']
+
+
+if __name__ == '__main__':
+    mentions = read_mentions('meantime_with_times.tsv', VIEWS_FROM)
+    cache_path = 'meantime.sqlite'
+
+    # frequencies computed by earlier runs for the creation time of each mention
+    if not os.path.exists(cache_path) and os.path.exists('meantime.pickle'):
+        with FrequencyCache(cache_path) as cache:
+            cache.import_pickle('meantime.pickle',
+                                {identifier: creation_time
+                                 for identifier, _, _, creation_time in mentions})
+
+    # candidates and page views are shared by the runs for different dates
+    memo = {'candidate_cache': TieredCache('candidates.sqlite', 'candidates'),
+            'view_cache': TieredCache('views.sqlite', 'views')}
+    try:
+        summary = run(mentions, SNAPSHOTS, cache_path, **memo)
+    finally:
+        for memo_cache in memo.values():
+            memo_cache.close()
+
+    for snapshot in SNAPSHOTS:
+        counts = summary[snapshot]
+        print()
+        print(snapshot)
+        if counts['ranked']:
+            print(round(counts['avg_rank'], 2), round(counts['avg_relfreq'], 2))
+        else:
+            print('no ranked mentions (%d missing)' % counts['missing'])
@@ -1,9 +1,44 @@
+// page views of one or more entities from wikiviews, printed as one JSON
+// object entity -> (date -> views), null for entities that failed
+// usage: node get_views.js START END ENTITY [ENTITY ...]
 WikiViews = require('wikiviews');
 
-var entity = process.argv[2];
-var startDate = process.argv[3];
-var endDate = process.argv[4];
- 
-WikiViews(entity, startDate, endDate, function(data) {
-    console.log(data);
-});
\ No newline at end of file
+var startDate = process.argv[2];
+var endDate = process.argv[3];
+var entities = process.argv.slice(4);
+var MAX_IN_FLIGHT = 8;
+
+var results = {};
+var next = 0;
+var done = 0;
+
+function lookUp() {
+    if (next >= entities.length) {
+        return;
+    }
+    var entity = entities[next++];
+    try {
+        WikiViews(entity, startDate, endDate, function(data) {
+            finish(entity, data === undefined ? null : data);
+        });
+    } catch (error) {
+        finish(entity, null);
+    }
+}
+
+function finish(entity, data) {
+    results[entity] = data;
+    done += 1;
+    if (done === entities.length) {
+        console.log(JSON.stringify(results));
+    } else {
+        lookUp();
+    }
+}
+
+if (entities.length === 0) {
+    console.log('{}');
+}
+for (var i = 0; i < MAX_IN_FLIGHT; i++) {
+    lookUp();
+}
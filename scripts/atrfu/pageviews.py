@@ -0,0 +1,350 @@
+"""
+page view providers
+
+a provider returns the daily page views of a batch of Wikipedia articles
+within a date range in one call:
+
+    provider.get_views(['France', 'Paris'], '2015-07-01', '2015-07-02')
+    {'France': {'2015-07-01': 8920, '2015-07-02': ...}, 'Paris': {...}}
+
+dates are strings of format yyyy-mm-dd (datetime.date values are accepted
+as well). A provider that has no data before some date (first_date) raises
+UnavailableDates for earlier dates instead of returning no views, so that
+missing data is not taken for articles without views.
+"""
+import datetime
+import json
+import os
+import subprocess
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+WIKIMEDIA_API = 'https://wikimedia.org/api/rest_v1/metrics/pageviews/per-article'
+WIKIMEDIA_FIRST_DATE = '2015-07-01'
+USER_AGENT = 'SemanticOverfitting (https://github.com/cltl/SemanticOverfitting)'
+
+
+def to_date_string(date):
+    """
+    >>> to_date_string(datetime.datetime(2007, 12, 1))
+    '2007-12-01'
+    >>> to_date_string('2015-07-01')
+    '2015-07-01'
+    """
+    if isinstance(date, (datetime.date, datetime.datetime)):
+        return date.strftime('%Y-%m-%d')
+    return date
+
+
+class RateLimiter:
+    """
+    spaces calls out so that at most `rate` calls per second are made,
+    shared between threads. No limit if rate is None.
+
+    >>> limiter = RateLimiter(None)
+    >>> limiter.wait()
+    """
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.lock = threading.Lock()
+        self.next_call = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_call - now
+            self.next_call = max(now, self.next_call) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class UnavailableDates(ValueError):
+    """
+    the provider has no page views for the requested dates
+    """
+
+
+class PageViewError(RuntimeError):
+    """
+    the page views of an article could not be looked up
+    """
+
+
+class PageViewProvider:
+    """
+    interface of page view providers
+
+    :cvar str first_date: first date with page views (None: no limit)
+    """
+    first_date = None
+
+    def get_views(self, entities, start, end):
+        """
+        :param list entities: Wikipedia article titles (e.g. 'Barack_Obama')
+        :param str start: first date (yyyy-mm-dd)
+        :param str end: last date (yyyy-mm-dd), inclusive
+
+        :rtype: dict
+        :return: entity -> (date -> views), for every requested entity.
+        Dates without views are left out.
+        """
+        raise NotImplementedError
+
+    def check_dates(self, start):
+        """
+        :raises UnavailableDates: if start is before first_date
+        """
+        if self.first_date is not None and to_date_string(start) < self.first_date:
+            raise UnavailableDates('%s has no page views before %s, requested %s'
+                                   % (type(self).__name__, self.first_date,
+                                      to_date_string(start)))
+
+    def close(self):
+        """
+        release the resources of the provider
+        """
+
+
+class WikimediaPageViews(PageViewProvider):
+    """
+    page views from the Wikimedia REST API (available from 2015-07-01)
+
+    >>> WikimediaPageViews().get_views(['France'], '2011-12-01', '2011-12-01')
+    Traceback (most recent call last):
+    ...
+    pageviews.UnavailableDates: WikimediaPageViews has no page views before 2015-07-01, requested 2011-12-01
+
+    :param requests.Session session: session used for all requests
+    :param int max_workers: number of articles fetched concurrently, by
+    executor or by a pool owned by the provider (see close)
+    :param str project: e.g. 'en.wikipedia'
+    :param bool strict: raise requests.HTTPError on server errors and rate
+    limiting instead of returning no views (articles without views still
+    return no views)
+    :param RateLimiter limiter: if not None, limits the request rate
+    :param str api: url of the per-article page view API
+    :param concurrent.futures.Executor executor: pool shared with other
+    lookups; it is not shut down by close
+    """
+    first_date = WIKIMEDIA_FIRST_DATE
+
+    def __init__(self, session=None, max_workers=1, project='en.wikipedia',
+                 access='all-access', agent='all-agents', strict=False,
+                 limiter=None, api=WIKIMEDIA_API, executor=None):
+        self.session = session or requests.Session()
+        self.max_workers = max_workers
+        self.project = project
+        self.access = access
+        self.agent = agent
+        self.strict = strict
+        self.limiter = limiter
+        self.api = api
+        self.owns_executor = executor is None and max_workers > 1
+        self.executor = ThreadPoolExecutor(max_workers) if self.owns_executor else executor
+
+    def get_views(self, entities, start, end):
+        self.check_dates(start)
+        start = to_date_string(start).replace('-', '')
+        end = to_date_string(end).replace('-', '')
+        if self.executor is not None and len(entities) > 1:
+            results = self.executor.map(self._get_article_views, entities,
+                                        [start] * len(entities),
+                                        [end] * len(entities))
+            return dict(zip(entities, results))
+        return {entity: self._get_article_views(entity, start, end)
+                for entity in entities}
+
+    def close(self):
+        if self.owns_executor:
+            self.executor.shutdown()
+
+    def _get_article_views(self, entity, start, end):
+        url = '/'.join([self.api, self.project, self.access, self.agent,
+                        urllib.parse.quote(entity, safe=''), 'daily',
+                        start + '00', end + '00'])
+        if self.limiter is not None:
+            self.limiter.wait()
+        response = self.session.get(url, headers={'User-Agent': USER_AGENT})
+        if self.strict and (response.status_code == 429 or response.status_code >= 500):
+            response.raise_for_status()
+        if response.status_code != 200:
+            return {}
+        return {'%s-%s-%s' % (item['timestamp'][:4],
+                              item['timestamp'][4:6],
+                              item['timestamp'][6:8]): item['views']
+                for item in response.json()['items']}
+
+
+class FilePageViews(PageViewProvider):
+    """
+    offline page views read from a tsv file with the columns
+    entity, date (yyyy-mm-dd) and views, e.g. for tests
+
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     path = os.path.join(directory, 'views.tsv')
+    ...     FilePageViews.save({'France': {'2015-07-01': 8920}}, path)
+    ...     FilePageViews(path).get_views(['France', 'Paris'], '2015-07-01', '2015-07-01')
+    {'France': {'2015-07-01': 8920}, 'Paris': {}}
+
+    :param str path: tsv file, see save
+    :param str first_date: if not None, earlier dates raise UnavailableDates,
+    e.g. to stand in for the Wikimedia REST API
+    """
+
+    def __init__(self, path, first_date=None):
+        self.first_date = first_date
+        self.views = {}
+        with open(path, encoding='utf-8') as infile:
+            for line in infile:
+                entity, date, views = line.rstrip('\n').split('\t')
+                self.views.setdefault(entity, {})[date] = int(views)
+
+    def get_views(self, entities, start, end):
+        self.check_dates(start)
+        start, end = to_date_string(start), to_date_string(end)
+        return {entity: {date: views
+                         for date, views in self.views.get(entity, {}).items()
+                         if start <= date <= end}
+                for entity in entities}
+
+    @staticmethod
+    def save(views, path):
+        """
+        store the output of get_views, e.g. to record a live provider
+
+        :param dict views: entity -> (date -> views)
+        :param str path: output path
+        """
+        with open(path, 'w', encoding='utf-8') as outfile:
+            for entity, dates in views.items():
+                for date, count in sorted(dates.items()):
+                    outfile.write('%s\t%s\t%d\n' % (entity, date, count))
+
+
+class NodePageViews(PageViewProvider):
+    """
+    page views from the wikiviews npm package through get_views.js. The
+    entities of a get_views call are looked up by one node process (per
+    batch_size entities), passed as arguments, not through a shell.
+
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     script = os.path.join(directory, 'views.js')
+    ...     with open(script, 'w') as outfile:
+    ...         _ = outfile.write('var views = {}; process.argv.slice(4).forEach(function(e) '
+    ...                           '{ views[e] = e == "Nowhere" ? null : {"2011-12-01": e.length}; }); '
+    ...                           'console.log(JSON.stringify(views));')
+    ...     NodePageViews(script).get_views(['France', 'Nowhere'], '2011-12-01', '2011-12-01')
+    ERROR Nowhere 20111201 20111201
+    {'France': {'2011-12-01': 6}, 'Nowhere': {}}
+
+    :param str script: path of get_views.js
+    :param bool strict: raise PageViewError if the lookup of an entity
+    fails (including node not being installed) instead of returning no
+    views for it
+    :param int batch_size: maximum number of entities per node process
+    :param str node: node executable
+    """
+
+    def __init__(self, script=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                           'get_views.js'), strict=False, batch_size=200,
+                 node='node'):
+        self.script = script
+        self.strict = strict
+        self.batch_size = batch_size
+        self.node = node
+
+    def get_views(self, entities, start, end):
+        start = to_date_string(start).replace('-', '')
+        end = to_date_string(end).replace('-', '')
+        results = {}
+        for offset in range(0, len(entities), self.batch_size):
+            batch = entities[offset:offset + self.batch_size]
+            try:
+                output = subprocess.check_output([self.node, self.script, start, end] + batch)
+                views = json.loads(output.decode('utf-8'))
+            except (OSError, subprocess.CalledProcessError, ValueError) as error:
+                if self.strict:
+                    raise PageViewError('%s %s %s' % (', '.join(batch), start, end)) from error
+                views = {}
+            for entity in batch:
+                if views.get(entity) is None:
+                    if self.strict:
+                        raise PageViewError('%s %s %s' % (entity, start, end))
+                    print('ERROR', entity, start, end)
+                    views[entity] = {}
+                results[entity] = views[entity]
+        return results
+
+
+class ByDatePageViews(PageViewProvider):
+    """
+    page views from one provider before the first date of another one and
+    from the other one afterwards, e.g. the Wikimedia REST API from
+    2015-07-01 and wikiviews before
+
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     FilePageViews.save({'France': {'2011-12-01': 10}}, os.path.join(directory, 'early.tsv'))
+    ...     FilePageViews.save({'France': {'2015-07-01': 20}}, os.path.join(directory, 'late.tsv'))
+    ...     early = FilePageViews(os.path.join(directory, 'early.tsv'))
+    ...     late = FilePageViews(os.path.join(directory, 'late.tsv'), first_date='2015-07-01')
+    >>> ByDatePageViews(early, late).get_views(['France'], '2011-12-01', '2015-07-01')
+    {'France': {'2011-12-01': 10, '2015-07-01': 20}}
+
+    :param PageViewProvider early: provider for the dates before
+    late.first_date
+    :param PageViewProvider late: provider from late.first_date on
+    """
+
+    def __init__(self, early, late):
+        self.early = early
+        self.late = late
+        self.first_date = early.first_date
+
+    def get_views(self, entities, start, end):
+        start, end = to_date_string(start), to_date_string(end)
+        split = self.late.first_date
+        if end < split:
+            return self.early.get_views(entities, start, end)
+        if start >= split:
+            return self.late.get_views(entities, start, end)
+        last_early = to_date_string(datetime.datetime.strptime(split, '%Y-%m-%d').date() -
+                                    datetime.timedelta(days=1))
+        views = self.early.get_views(entities, start, last_early)
+        for entity, dates in self.late.get_views(entities, split, end).items():
+            views.setdefault(entity, {}).update(dates)
+        return views
+
+    def close(self):
+        self.early.close()
+        self.late.close()
+
+
+def default_provider(session=None, max_workers=1, executor=None, limiter=None,
+                     strict=False):
+    """
+    page views of the Wikimedia REST API from 2015-07-01 on and of
+    wikiviews (NodePageViews) before
+
+    :param requests.Session session: see WikimediaPageViews
+    :param int max_workers: see WikimediaPageViews
+    :param concurrent.futures.Executor executor: see WikimediaPageViews
+    :param RateLimiter limiter: see WikimediaPageViews
+    :param bool strict: raise on failed lookups (PageViewError,
+    requests.HTTPError) instead of returning no views
+
+    :rtype: ByDatePageViews
+    """
+    return ByDatePageViews(NodePageViews(strict=strict),
+                           WikimediaPageViews(session=session, max_workers=max_workers,
+                                              strict=strict, limiter=limiter,
+                                              executor=executor))
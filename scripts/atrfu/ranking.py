@@ -0,0 +1,128 @@
+"""
+rank and relative frequency of a gold candidate among its candidates
+
+the rank of a key is 1 + the number of candidates with a higher frequency,
+plus a share of the candidates with the same frequency that depends on the
+tie-breaking rule:
+
+* 'first': candidates that come earlier (in dict or array order) rank
+  higher; this is the order a stable sort by decreasing frequency gives
+* 'min': all tied candidates get the best rank
+* 'max': all tied candidates get the worst rank
+* 'average': all tied candidates get the mean of the ranks they span
+"""
+import numpy as np
+
+TIES = ('first', 'min', 'max', 'average')
+
+
+def _rank(greater, ties_before, ties, method):
+    if method == 'first':
+        return 1 + greater + ties_before
+    if method == 'min':
+        return 1 + greater
+    if method == 'max':
+        return greater + ties
+    if method == 'average':
+        return greater + (ties + 1) / 2
+    raise ValueError('unknown tie-breaking rule %r, use one of %s'
+                     % (method, ', '.join(TIES)))
+
+
+def rank_of(key, d, ties='first'):
+    """
+    rank and relative frequency (in percent) of key in a single pass over d
+
+    >>> rank_of('b', {'a': 5, 'b': 3, 'c': 3, 'd': 1})
+    (2, 25.0)
+    >>> rank_of('c', {'a': 5, 'b': 3, 'c': 3, 'd': 1})
+    (3, 25.0)
+    >>> rank_of('c', {'a': 5, 'b': 3, 'c': 3, 'd': 1}, ties='min')
+    (2, 25.0)
+    >>> rank_of('c', {'a': 5, 'b': 3, 'c': 3, 'd': 1}, ties='average')
+    (2.5, 25.0)
+
+    :param key: key to rank
+    :param dict d: key -> frequency
+    :param str ties: tie-breaking rule, see TIES
+
+    :rtype: tuple
+    :return: (rank, relative frequency), (None, None) if key is not in d
+    or all frequencies are zero
+    """
+    if key not in d:
+        return None, None
+
+    value = d[key]
+    total = 0
+    greater = 0
+    tied = 0
+    ties_before = 0
+    seen_key = False
+    for other, other_value in d.items():
+        total += other_value
+        if other == key:
+            seen_key = True
+        if other_value > value:
+            greater += 1
+        elif other_value == value:
+            tied += 1
+            if not seen_key:
+                ties_before += 1
+
+    if total == 0:
+        return None, None
+    return _rank(greater, ties_before, tied, ties), 100 * (value / total)
+
+
+def rank_batch(frequencies, gold_indices, ties='first'):
+    """
+    rank the gold candidates of many mentions at once
+
+    >>> ranks, relfreqs = rank_batch([[5, 3, 3, 1], [0, 2]], [2, 1])
+    >>> ranks.tolist(), relfreqs.tolist()
+    ([3.0, 1.0], [25.0, 100.0])
+    >>> ranks, relfreqs = rank_batch([[], [4]], [0, 0])
+    >>> ranks.tolist(), relfreqs.tolist()
+    ([nan, 1.0], [nan, 100.0])
+
+    :param list frequencies: one sequence of candidate frequencies per mention
+    :param list gold_indices: position of the gold candidate per mention
+    :param str ties: tie-breaking rule, see TIES
+
+    :rtype: tuple
+    :return: (ranks, relative frequencies in percent) as float arrays,
+    nan for mentions without candidates, whose gold index is out of range
+    or whose frequencies are all zero
+    """
+    lengths = np.array([len(values) for values in frequencies], dtype=np.int64)
+    values = (np.concatenate([np.asarray(values, dtype=np.float64)
+                              for values in frequencies])
+              if len(frequencies) else np.zeros(0))
+    n = len(lengths)
+    offsets = np.zeros(n, dtype=np.int64)
+    np.cumsum(lengths[:-1], out=offsets[1:])
+    segments = np.repeat(np.arange(n), lengths)
+    positions = np.arange(len(values)) - np.repeat(offsets, lengths)
+
+    gold_indices = np.asarray(gold_indices, dtype=np.int64)
+    found = (gold_indices >= 0) & (gold_indices < lengths)
+    gold_values = np.zeros(n)
+    gold_values[found] = values[(offsets + gold_indices)[found]]
+    segment_gold = gold_values[segments]
+
+    greater = np.bincount(segments, weights=values > segment_gold, minlength=n)
+    equal = values == segment_gold
+    tied = np.bincount(segments, weights=equal, minlength=n)
+    ties_before = np.bincount(segments,
+                              weights=equal & (positions < gold_indices[segments]),
+                              minlength=n)
+    totals = np.bincount(segments, weights=values, minlength=n)
+
+    ranks = np.asarray(_rank(greater, ties_before, tied, ties), dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        relfreqs = 100 * (gold_values / totals)
+    missing = ~found | (totals == 0)
+    ranks[missing] = np.nan
+    relfreqs[missing] = np.nan
+    return ranks, relfreqs
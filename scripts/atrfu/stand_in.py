@@ -0,0 +1,135 @@
+"""
+local stand-in for the DBpedia SPARQL endpoint and the Wikimedia page view
+API, for tests
+
+the SPARQL stand-in answers the disambiguation queries of
+the_candidate_generation.candidates_to_freq from a dict
+(goldmention, goldlink) -> candidate links; the page view stand-in answers
+per-article requests like the REST API, including a 404 for dates before
+the first date it has data for. Every request is counted, and the first
+`failures` requests can be answered with 503 to simulate an outage.
+"""
+import json
+import re
+import threading
+import urllib.parse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+QUERY = re.compile(r'STR\(\?lbl\) in \("(?P<mention>.*)", "(?P=mention) \(disambiguation\)"\)'
+                   r'.*wikiPageDisambiguates> <(?P<link>[^>]*)> , \?link', re.DOTALL)
+
+
+class StandIn:
+    """
+    >>> import requests
+    >>> with StandIn({('Paris', 'http://x/Paris'): ['http://x/Paris']}) as stand_in:
+    ...     requests.get(stand_in.api + '/en.wikipedia/all-access/all-agents/'
+    ...                  'Paris/daily/2015070100/2015070100').status_code
+    404
+
+    :param dict candidates: (goldmention, goldlink) -> list of candidate links
+    :param dict views: entity -> (date (yyyy-mm-dd) -> views)
+    :param str first_date: page views before this date are not available
+    :param int failures: number of requests answered with 503 first
+    """
+
+    def __init__(self, candidates=None, views=None, first_date='2015-07-01', failures=0):
+        self.candidates = candidates or {}
+        self.views = views or {}
+        self.first_date = first_date
+        self.failures = failures
+        self.requests = Counter()
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d' % self.server.server_port
+
+    @property
+    def endpoint(self):
+        return self.url + '/sparql'
+
+    @property
+    def api(self):
+        return self.url + '/pageviews'
+
+    def _fail(self):
+        with self.lock:
+            if self.failures > 0:
+                self.failures -= 1
+                return True
+        return False
+
+    def _count(self, key):
+        with self.lock:
+            self.requests[key] += 1
+
+    def sparql(self, query):
+        """
+        :rtype: tuple
+        :return: (status, body)
+        """
+        match = QUERY.search(query)
+        if match is None:
+            return 400, {}
+        self._count(('sparql', match.group('mention'), match.group('link')))
+        links = self.candidates.get((match.group('mention'), match.group('link')), [])
+        return 200, {'results': {'bindings': [{'link': {'value': link}} for link in links]}}
+
+    def page_views(self, path):
+        """
+        :param str path: <project>/<access>/<agent>/<entity>/daily/<start>/<end>
+
+        :rtype: tuple
+        :return: (status, body)
+        """
+        _, _, _, entity, _, start, end = path.split('/')
+        entity = urllib.parse.unquote(entity)
+        start = '%s-%s-%s' % (start[:4], start[4:6], start[6:8])
+        end = '%s-%s-%s' % (end[:4], end[4:6], end[6:8])
+        self._count(('views', entity, start))
+        items = [{'timestamp': date.replace('-', '') + '00', 'views': views}
+                 for date, views in sorted(self.views.get(entity, {}).items())
+                 if max(start, self.first_date) <= date <= end]
+        if not items:
+            return 404, {'title': 'Not found.'}
+        return 200, {'items': items}
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urllib.parse.urlparse(self.path)
+                if stand_in._fail():
+                    status, body = 503, {}
+                elif url.path == '/sparql':
+                    status, body = stand_in.sparql(
+                        urllib.parse.parse_qs(url.query)['query'][0])
+                elif url.path.startswith('/pageviews/'):
+                    status, body = stand_in.page_views(url.path[len('/pageviews/'):])
+                else:
+                    status, body = 404, {}
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
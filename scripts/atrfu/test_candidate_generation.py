@@ -0,0 +1,101 @@
+import os
+import tempfile
+import time
+import unittest
+
+import requests
+
+from pageviews import RateLimiter, WikimediaPageViews
+from stand_in import StandIn
+from the_candidate_generation import (compute_entity_ranks_relfreqs,
+                                      get_dbpedia_results)
+
+RESOURCE = 'http://dbpedia.org/resource/'
+DATE = '2015-12-01'
+
+
+def corpus(n_entities=12, n_mentions=60):
+    """
+    mentions, candidate sets and page views with ties, gold links that are
+    not among their candidates and candidates without views
+    """
+    entities = ['Entity_%d' % i for i in range(n_entities)]
+    candidates, views = {}, {}
+    for i, entity in enumerate(entities):
+        links = [RESOURCE + entity, RESOURCE + entity + '_(film)', RESOURCE + entity + '_(band)']
+        if i % 5 == 4:
+            links = links[1:]
+        candidates[('mention %d' % i, RESOURCE + entity)] = links
+        for k, link in enumerate(links):
+            if i % 7 != 3 or k:
+                views[link.replace(RESOURCE, '')] = {DATE: (i * 7 + k * 3) % 5 + 1}
+    mentions = [('d%d.t%d' % (j // 10, j), 'mention %d' % (j % n_entities),
+                 RESOURCE + entities[j % n_entities], '2015-%02d-01' % (j % 12 + 1))
+                for j in range(n_mentions)]
+    return mentions, candidates, views
+
+
+class ConcurrentLookupTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.mentions, candidates, views = corpus()
+        self.stand_in = StandIn(candidates, views).__enter__()
+
+    def tearDown(self):
+        self.stand_in.__exit__(None, None, None)
+
+    def run_lookups(self, name, max_workers):
+        provider = WikimediaPageViews(max_workers=max_workers, api=self.stand_in.api)
+        try:
+            return compute_entity_ranks_relfreqs(self.mentions,
+                                                 os.path.join(self.directory, name),
+                                                 DATE, max_workers=max_workers,
+                                                 endpoint=self.stand_in.endpoint,
+                                                 provider=provider)
+        finally:
+            provider.close()
+
+    def test_concurrent_equals_serial(self):
+        serial = self.run_lookups('serial.sqlite', 1)
+        concurrent = self.run_lookups('concurrent.sqlite', 8)
+        self.assertEqual(serial, concurrent)
+        self.assertTrue(any(serial[0].values()))
+        self.assertTrue(any(not freq for freq in serial[0].values()))
+
+    def test_checkpointed_units_are_not_looked_up(self):
+        self.run_lookups('cache.sqlite', 8)
+        looked_up = sum(self.stand_in.requests.values())
+        self.run_lookups('cache.sqlite', 8)
+        self.assertEqual(sum(self.stand_in.requests.values()), looked_up)
+
+
+class StandInTest(unittest.TestCase):
+
+    def test_page_view_rate_limit(self):
+        views = {'Entity_%d' % i: {DATE: i} for i in range(10)}
+        with StandIn(views=views) as stand_in:
+            provider = WikimediaPageViews(max_workers=10, api=stand_in.api,
+                                          limiter=RateLimiter(50))
+            start = time.monotonic()
+            result = provider.get_views(sorted(views), DATE, DATE)
+            elapsed = time.monotonic() - start
+            provider.close()
+        self.assertEqual(result['Entity_3'], {DATE: 3})
+        self.assertGreaterEqual(elapsed, 9 / 50)
+
+    def test_strict_sparql_errors(self):
+        with StandIn(failures=1) as stand_in:
+            query = ('select distinct(?link) where { ?disambiguation rdfs:label ?lbl. '
+                     'FILTER (STR(?lbl) in ("a", "a (disambiguation)")) . ?disambiguation '
+                     '<http://dbpedia.org/ontology/wikiPageDisambiguates> <x> , ?link .}')
+            with self.assertRaises(requests.HTTPError):
+                get_dbpedia_results(query, endpoint=stand_in.endpoint, strict=True)
+            self.assertEqual(get_dbpedia_results(query, endpoint=stand_in.endpoint,
+                                                 strict=True), set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import io
+import json
+import os
+import tempfile
+import threading
+import unittest
+from collections import Counter
+
+from driver import CREATION, EventLog, run, work_units
+from pageviews import FilePageViews
+from stand_in import StandIn
+from test_candidate_generation import DATE, corpus
+
+
+class CountingPageViews(FilePageViews):
+    """
+    FilePageViews that counts the lookups it completes and interrupts the
+    run (KeyboardInterrupt) instead of its interrupt_at'th lookup
+    """
+
+    def __init__(self, path, first_date=None, interrupt_at=None):
+        super().__init__(path, first_date)
+        self.interrupt_at = interrupt_at
+        self.calls = 0
+        self.lookups = Counter()
+        self.lock = threading.Lock()
+
+    def get_views(self, entities, start, end):
+        with self.lock:
+            self.calls += 1
+            if self.calls == self.interrupt_at:
+                raise KeyboardInterrupt
+        views = super().get_views(entities, start, end)
+        with self.lock:
+            self.lookups[(tuple(entities), start)] += 1
+        return views
+
+
+class ResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.cache_path = os.path.join(self.directory, 'checkpoint.sqlite')
+        self.views_path = os.path.join(self.directory, 'views.tsv')
+        mentions, self.candidates, views = corpus()
+        # one mention per candidate set, so that a page view lookup is a unit
+        self.mentions = mentions[:12]
+        self.in_candidates = {identifier: goldlink in self.candidates[(goldmention, goldlink)]
+                              for identifier, goldmention, goldlink, _ in self.mentions}
+        views['Entity_0'] = {'2011-12-01': 3, DATE: 4}
+        FilePageViews.save(views, self.views_path)
+
+    def provider(self, interrupt_at=None):
+        return CountingPageViews(self.views_path, first_date='2015-07-01',
+                                 interrupt_at=interrupt_at)
+
+    def run_driver(self, stand_in, provider, snapshots, stream=None):
+        return run(self.mentions, snapshots, self.cache_path, max_workers=4,
+                   retries=0, events=EventLog(stream or io.StringIO()),
+                   checkpoint_every=3, endpoint=stand_in.endpoint, provider=provider)
+
+    def test_resume_looks_up_every_unit_once(self):
+        snapshots = [CREATION, DATE]
+        units = {(unit[1], unit[4]) for unit in work_units(self.mentions, snapshots)}
+        with StandIn(self.candidates) as stand_in:
+            interrupted = self.provider(interrupt_at=7)
+            with self.assertRaises(KeyboardInterrupt):
+                self.run_driver(stand_in, interrupted, snapshots)
+            resumed = self.provider()
+            summary = self.run_driver(stand_in, resumed, snapshots)
+        lookups = interrupted.lookups + resumed.lookups
+        self.assertTrue(interrupted.lookups)
+        self.assertTrue(resumed.lookups)
+        self.assertEqual(set(lookups.values()), {1})
+        # units before the first date are rejected, units whose gold link is
+        # not a candidate need no page views
+        looked_up = {(identifier, date) for identifier, date in units
+                     if date >= '2015-07-01' and self.in_candidates[identifier]}
+        self.assertEqual(sum(lookups.values()), len(looked_up))
+        self.assertEqual(summary[DATE]['missing'], 0)
+        self.assertTrue(summary[DATE]['ranked'])
+
+    def test_unavailable_dates_are_rejected(self):
+        stream = io.StringIO()
+        with StandIn(self.candidates) as stand_in:
+            provider = self.provider()
+            summary = self.run_driver(stand_in, provider, ['2011-12-01', DATE], stream)
+            self.assertEqual(summary['2011-12-01']['missing'], len(self.mentions))
+            self.assertFalse([key for key in provider.lookups if key[1] == '2011-12-01'])
+            events = [json.loads(line) for line in stream.getvalue().splitlines()]
+            self.assertEqual([event['units'] for event in events
+                              if event['event'] == 'rejected'], [len(self.mentions)])
+            # the rejected units are not checkpointed, a provider with data
+            # for them looks them up
+            provider = CountingPageViews(self.views_path)
+            summary = self.run_driver(stand_in, provider, ['2011-12-01', DATE])
+        self.assertEqual(summary['2011-12-01']['missing'], 0)
+        self.assertEqual({key[1] for key in provider.lookups}, {'2011-12-01'})
+
+
+if __name__ == '__main__':
+    unittest.main()
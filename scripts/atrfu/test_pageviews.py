@@ -0,0 +1,93 @@
+import json
+import os
+import tempfile
+import unittest
+
+from pageviews import (ByDatePageViews, FilePageViews, NodePageViews,
+                       PageViewError, UnavailableDates, WikimediaPageViews)
+from stand_in import StandIn
+from test_candidate_generation import DATE, RESOURCE, corpus
+from the_candidate_generation import compute_entity_ranks_relfreqs
+
+
+class UnavailableDatesTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_wikimedia_before_first_date(self):
+        mentions, candidates, views = corpus()
+        with StandIn(candidates, views) as stand_in:
+            provider = WikimediaPageViews(api=stand_in.api)
+            with self.assertRaises(UnavailableDates):
+                compute_entity_ranks_relfreqs(mentions,
+                                              os.path.join(self.directory, 'cache.sqlite'),
+                                              '2011-12-01', endpoint=stand_in.endpoint,
+                                              provider=provider)
+            self.assertFalse([key for key in stand_in.requests if key[0] == 'views'])
+
+    def test_early_dates_go_to_the_early_provider(self):
+        FilePageViews.save({'Boeing': {'2011-12-01': 7}},
+                           os.path.join(self.directory, 'early.tsv'))
+        with StandIn(views={'Boeing': {DATE: 9}}) as stand_in:
+            provider = ByDatePageViews(FilePageViews(os.path.join(self.directory, 'early.tsv')),
+                                       WikimediaPageViews(api=stand_in.api))
+            self.assertEqual(provider.get_views(['Boeing'], '2011-12-01', '2011-12-01'),
+                             {'Boeing': {'2011-12-01': 7}})
+            self.assertEqual(provider.get_views(['Boeing'], DATE, DATE),
+                             {'Boeing': {DATE: 9}})
+            self.assertEqual(provider.get_views(['Boeing'], '2011-12-01', DATE),
+                             {'Boeing': {'2011-12-01': 7, DATE: 9}})
+
+
+class PoolTest(unittest.TestCase):
+
+    def test_one_pool_per_provider(self):
+        views = {'Entity_%d' % i: {DATE: i} for i in range(20)}
+        with StandIn(views=views) as stand_in:
+            provider = WikimediaPageViews(max_workers=4, api=stand_in.api)
+            pool = provider.executor
+            for _ in range(5):
+                self.assertEqual(provider.get_views(sorted(views), DATE, DATE)['Entity_7'],
+                                 {DATE: 7})
+            self.assertIs(provider.executor, pool)
+            self.assertLessEqual(len(pool._threads), 4)
+            provider.close()
+
+
+class NodePageViewsTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.calls = os.path.join(directory.name, 'calls')
+        # stand-in for get_views.js that logs its invocations
+        self.script = os.path.join(directory.name, 'views.js')
+        with open(self.script, 'w') as outfile:
+            outfile.write('var fs = require("fs"); fs.appendFileSync(%s, "call\\n"); '
+                          'var views = {}; process.argv.slice(4).forEach(function(e) '
+                          '{ views[e] = {"2011-12-01": e.length}; }); '
+                          'console.log(JSON.stringify(views));' % json.dumps(self.calls))
+
+    def test_one_process_per_batch(self):
+        entities = ['Entity_%d' % i for i in range(25)]
+        views = NodePageViews(self.script, batch_size=10).get_views(entities, '2011-12-01',
+                                                                    '2011-12-01')
+        self.assertEqual(views['Entity_12'], {'2011-12-01': 9})
+        self.assertEqual(len(views), 25)
+        with open(self.calls) as infile:
+            self.assertEqual(len(infile.readlines()), 3)
+
+    def test_missing_node(self):
+        provider = NodePageViews(self.script, node=os.path.join(self.script, 'no-node'))
+        self.assertEqual(provider.get_views(['France'], '2011-12-01', '2011-12-01'),
+                         {'France': {}})
+        provider.strict = True
+        with self.assertRaises(PageViewError):
+            provider.get_views(['France'], '2011-12-01', '2011-12-01')
+
+
+if __name__ == '__main__':
+    unittest.main()
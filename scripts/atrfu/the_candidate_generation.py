@@ -1,61 +1,83 @@
 import requests
 import urllib.request
 import urllib
-import os
-import subprocess
-import ast
-import pickle
 import operator
+from concurrent.futures import ThreadPoolExecutor
 
-def obtain_view(entity, date, debug=False):
-    """
+from cache import FrequencyCache
+from pageviews import RateLimiter, default_provider, to_date_string
+from ranking import rank_of
 
-    >>> obtain_view('France', '2015-07-01')
-    8920
+SPARQL_ENDPOINT = 'http://dbpedia.org/sparql'
+DBPEDIA_RESOURCE = 'http://dbpedia.org/resource/'
 
-    """
-    result = 0
 
-    for element, replace in [('(', '\('),
-                             (')', '\)'),
-                             ('&', '\&'),
-                             ("'", "")]:
-        entity = entity.replace(element, replace)
+def make_session(pool_size=10):
+    """
+    http session that keeps up to pool_size connections per host open
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size,
+                                            pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def obtain_view(entity, date, debug=False, provider=None):
+    """
 
-    date_for_command = date.replace('-', '')
-    command = 'node get_views.js {entity} {date_for_command} {date_for_command}'.format(
-        **locals())
+    >>> obtain_view('France', '2015-07-01')
+    8920
 
-    try:
-        output = subprocess.check_output(command, shell=True)
-        output = output.decode('utf-8')
-        views = ast.literal_eval(output)
-    except subprocess.CalledProcessError:
-        print('ERROR', command)
-        views = {}
+    :param str entity: Wikipedia article title
+    :param str date: yyyy-mm-dd
+    :param pageviews.PageViewProvider provider: source of the page views
+    (default: pageviews.default_provider)
 
-    if date in views:
-        result = sum(views.values())
+    :rtype: int
+    :return: page views of entity on date
+    """
+    if provider is None:
+        provider = default_provider()
+    views = provider.get_views([entity], date, date)[entity]
+    result = sum(views.values())
 
     if debug:
         print()
-        print(command)
+        print(entity, date)
         print(result)
         input('continue?')
 
     return result
 
 
-def get_dbpedia_results(query, debug=False):
+def get_dbpedia_results(query, debug=False, session=None,
+                        endpoint=SPARQL_ENDPOINT, limiter=None, strict=False):
+    """
+    :param str query: SPARQL query selecting ?link
+    :param requests.Session session: session to reuse connections from
+    (default: a new connection per request)
+    :param str endpoint: url of the SPARQL endpoint
+    :param RateLimiter limiter: if not None, limits the request rate
+    :param bool strict: raise requests.HTTPError if the endpoint answers
+    with an error instead of returning no results, so that the answer of
+    an unavailable endpoint is not taken for an empty candidate set
+
+    :rtype: set
+    :return: set of links
+    """
     if debug:
         print(query)
     q = {'query': query, 'format': 'json'}
-    s = 'http://dbpedia.org/sparql'
-    url = s + '?' + urllib.parse.urlencode(q)
+    url = endpoint + '?' + urllib.parse.urlencode(q)
     if debug:
         print()
         print(url)
-    r = requests.get(url=url)
+    if limiter is not None:
+        limiter.wait()
+    r = (session or requests).get(url=url)
+    if strict:
+        r.raise_for_status()
     if r.status_code == 200:
         page = r.json()
         results = {result['link']['value']
@@ -65,12 +87,42 @@ def get_dbpedia_results(query, debug=False):
     return results
 
 
-def candidates_to_freq(goldmention, goldlink, date, debug=False):
+def candidates_to_freq(goldmention, goldlink, date, debug=False,
+                       session=None, endpoint=SPARQL_ENDPOINT, limiter=None,
+                       provider=None, candidate_cache=None, view_cache=None,
+                       strict=False):
     """
+    look up the candidates of a mention and their page views on date
+
+    :param requests.Session session: see get_dbpedia_results
+    :param str endpoint: see get_dbpedia_results
+    :param RateLimiter limiter: see get_dbpedia_results
+    :param bool strict: see get_dbpedia_results
+    :param pageviews.PageViewProvider provider: source of the page views,
+    all candidates are looked up in one batch (default:
+    pageviews.default_provider)
+    :param cache.TieredCache candidate_cache: if not None, memoizes the
+    candidates per (goldmention, goldlink)
+    :param cache.TieredCache view_cache: if not None, memoizes the page
+    views per (entity, date); only missing entities are looked up
+
+    :rtype: dict
+    :return: candidate -> page views ({} if the goldlink is not a candidate),
+    candidates are sorted
     """
     freq = {}
-    query = '''select distinct(?link) where { ?disambiguation rdfs:label ?lbl. FILTER (STR(?lbl) in ("%s", "%s (disambiguation)")) . ?disambiguation <http://dbpedia.org/ontology/wikiPageDisambiguates> <%s> , ?link .}''' % (goldmention, goldmention, goldlink)
-    candidates = get_dbpedia_results(query, debug=False)
+    candidates = None
+    if candidate_cache is not None:
+        candidates = candidate_cache.get((goldmention, goldlink))
+    if candidates is None:
+        query = '''select distinct(?link) where { ?disambiguation rdfs:label ?lbl. FILTER (STR(?lbl) in ("%s", "%s (disambiguation)")) . ?disambiguation <http://dbpedia.org/ontology/wikiPageDisambiguates> <%s> , ?link .}''' % (goldmention, goldmention, goldlink)
+        candidates = sorted(get_dbpedia_results(query, debug=False,
+                                                session=session,
+                                                endpoint=endpoint,
+                                                limiter=limiter,
+                                                strict=strict))
+        if candidate_cache is not None:
+            candidate_cache.put((goldmention, goldlink), candidates)
     in_candidates = goldlink in candidates
 
     if not in_candidates:
@@ -84,10 +136,30 @@ def candidates_to_freq(goldmention, goldlink, date, debug=False):
             print(goldlink + '_(disambiguation)')
             print(candidates)
 
+        if provider is None:
+            provider = default_provider(session=session)
+        date = to_date_string(date)
+        entities = {candidate: candidate.replace(DBPEDIA_RESOURCE, '')
+                    for candidate in candidates}
+        view_counts = {}
+        if view_cache is not None:
+            for entity in entities.values():
+                view_count = view_cache.get((entity, date))
+                if view_count is not None:
+                    view_counts[entity] = view_count
+        missing = [entity for entity in entities.values()
+                   if entity not in view_counts]
+        if missing:
+            views = provider.get_views(missing, date, date)
+            for entity in missing:
+                view_counts[entity] = sum(views[entity].values())
+                if view_cache is not None:
+                    view_cache.put((entity, date), view_counts[entity])
+
         for candidate in candidates:
 
-            entity = candidate.replace('http://dbpedia.org/resource/', '')
-            view_count = obtain_view(entity, date, debug=False)
+            entity = entities[candidate]
+            view_count = view_counts[entity]
 
             freq[candidate] = view_count
 
@@ -100,24 +172,20 @@ def candidates_to_freq(goldmention, goldlink, date, debug=False):
     return freq
 
 
-def get_rank_and_relfreq(key, d, debug=False):
+def get_rank_and_relfreq(key, d, debug=False, ties='first'):
     """
     given a dictionary mapping keys to values
     this function returns the rank of the key and the relfreq
-    """
-    if key not in d:
-        return (False, None, None)
 
-    total = sum(d.values())
-    if total == 0:
-        return (False, None, None)
+    >>> get_rank_and_relfreq('b', {'a': 5, 'b': 3, 'c': 3})
+    (True, 2, 27.27272727272727)
 
-    sorted_d = [link
-                for link, value in sorted(d.items(),
-                                          key=operator.itemgetter(1),
-                                          reverse=True)]
-    rank = sorted_d.index(key) + 1
-    rel_freq = 100 * (d[key] / sum(d.values()))
+    :param str ties: tie-breaking rule (see ranking.TIES), by default
+    keys that come first in d rank higher
+    """
+    rank, rel_freq = rank_of(key, d, ties=ties)
+    if rank is None:
+        return (False, None, None)
 
     if debug:
         print()
@@ -132,52 +200,104 @@ def get_rank_and_relfreq(key, d, debug=False):
     return (True, rank, rel_freq)
 
 
-def compute_entity_ranks_relfreqs(iterable, cache_path, fixed_date=None):
+def compute_entity_ranks_relfreqs(iterable, cache_path, fixed_date=None,
+                                  max_workers=1, endpoint=SPARQL_ENDPOINT,
+                                  requests_per_second=None, provider=None,
+                                  candidate_cache=None, view_cache=None,
+                                  views_per_second=None):
     """
     loop over iterable
 
     :param iterable: iterable of tuples (identifier, goldmention, goldlink, date)
     date is of format yyyy-mm-dd
-    :param str cache_path: path where cache (pickled dict) will be stored
+    :param str cache_path: path of the FrequencyCache (SQLite) in which
+    candidate frequencies are stored per (identifier, date). Runs with
+    different dates can share it.
     :param datetime.datetime fixed_date: if not None, this date will be used to compute the
     entity rank and relative frequencies
+    :param int max_workers: if larger than 1, SPARQL lookups of different
+    mentions and page view lookups of different candidates are done
+    concurrently by this many threads each. Results are the same as with
+    max_workers=1.
+    :param str endpoint: url of the SPARQL endpoint
+    :param float requests_per_second: maximum rate of SPARQL requests
+    (default: no limit)
+    :param pageviews.PageViewProvider provider: source of the page views
+    (default: pageviews.default_provider, max_workers articles at a time
+    from one pool shared by all mentions)
+    :param cache.TieredCache candidate_cache: memoizes candidate sets per
+    (goldmention, goldlink), e.g. across runs with different dates
+    :param cache.TieredCache view_cache: memoizes page views per
+    (entity, date)
+    :param float views_per_second: maximum rate of page view requests of
+    the default provider (default: no limit)
 
     :rtype: tuple
-    :return: cache, avg_rank, avg_relfreq
+    :return: cache (identifier -> candidate frequencies of this run),
+    avg_rank, avg_relfreq
     """
     all_ranks = []
     all_relfreqs = []
 
-    if os.path.exists(cache_path):
-        cache = pickle.load(open(cache_path, 'rb'))
-    else:
-        cache = {}
-
-    total = len(iterable)
-    for counter, (identifier, goldmention, goldlink, date) in enumerate(
-            iterable):
-        if fixed_date is not None:
-            date = fixed_date
-
-        if identifier in cache:
-            freq = cache[identifier]
-        else:
-            freq = candidates_to_freq(goldmention, goldlink, date,
-                                      debug=False)
-            cache[identifier] = freq
+    cache = {}
+    frequency_cache = FrequencyCache(cache_path)
+
+    session = make_session(max_workers)
+    views_executor = None
+    if provider is None:
+        if max_workers > 1:
+            views_executor = ThreadPoolExecutor(max_workers)
+        provider = default_provider(session=session, max_workers=max_workers,
+                                    executor=views_executor,
+                                    limiter=RateLimiter(views_per_second))
+    lookup_options = {'session': session,
+                      'endpoint': endpoint,
+                      'limiter': RateLimiter(requests_per_second),
+                      'provider': provider,
+                      'candidate_cache': candidate_cache,
+                      'view_cache': view_cache}
+
+    sparql_executor = None
+    pending = {}
+    if max_workers > 1:
+        sparql_executor = ThreadPoolExecutor(max_workers)
+        for identifier, goldmention, goldlink, date in iterable:
+            date = to_date_string(fixed_date or date)
+            key = (identifier, date)
+            if key not in pending and frequency_cache.get(*key) is None:
+                pending[key] = sparql_executor.submit(
+                    candidates_to_freq, goldmention, goldlink, date,
+                    **lookup_options)
 
-        if freq:
-            succes, rank, relfreq = get_rank_and_relfreq(goldlink, freq,
-                                                         debug=False)
-            if succes:
-                all_ranks.append(rank)
-                all_relfreqs.append(relfreq)
+    try:
+        for identifier, goldmention, goldlink, date in iterable:
+            date = to_date_string(fixed_date or date)
+
+            freq = frequency_cache.get(identifier, date)
+            if freq is None:
+                if (identifier, date) in pending:
+                    freq = pending.pop((identifier, date)).result()
+                else:
+                    freq = candidates_to_freq(goldmention, goldlink, date,
+                                              debug=False, **lookup_options)
+                frequency_cache.put(identifier, date, freq)
+            cache[identifier] = freq
 
-        print(counter, total, goldmention, goldlink)
-        with open(cache_path, 'wb') as outfile:
-            pickle.dump(cache, outfile)
+            if freq:
+                succes, rank, relfreq = get_rank_and_relfreq(goldlink, freq,
+                                                             debug=False)
+                if succes:
+                    all_ranks.append(rank)
+                    all_relfreqs.append(relfreq)
+    finally:
+        if sparql_executor is not None:
+            sparql_executor.shutdown(cancel_futures=True)
+        if views_executor is not None:
+            views_executor.shutdown(cancel_futures=True)
+        session.close()
+        frequency_cache.close()
 
     avg_rank = sum(all_ranks) / len(all_ranks)
     avg_relfreq = sum(all_relfreqs) / len(all_relfreqs)
 
-    return cache, avg_rank, avg_relfreq
\ No newline at end of file
+    return cache, avg_rank, avg_relfreq
@@ -0,0 +1,197 @@
+"""
+most frequent sense (entity) baseline from the counts of one or more datasets
+
+the baseline predicts, for every lexical expression, the meaning it occurs
+with most often in the training datasets (ties go to the meaning seen
+first). The prediction per expression is precomputed as one argmax array,
+so a whole test dataset is predicted with array lookups, and it can be
+scored with scoring.GoldStrata without writing predictions to disk.
+
+Usage: python baselines.py --train WSD___SE2-AW WSD___SE3-AW --test WSD___SE13-AW
+       python baselines.py --pairs [--same-task] [--output scores.tsv]
+"""
+import argparse
+import csv
+import os
+import sys
+
+import numpy as np
+
+from analysis import Analysis
+from batch import SEPARATOR, discover
+from scoring import HEADER, NO_PREDICTION, UNKNOWN_MEANING, GoldStrata
+
+
+class MostFrequentSense:
+    """
+    >>> mfs = MostFrequentSense(['bank', 'shore'], ['bank.n.1', 'bank.n.2'],
+    ...                         np.array([1, 1]), np.array([0.75, 1.0]))
+    >>> mfs.predict(['bank', 'tree'])
+    ['bank.n.2', None]
+
+    :param list les: lexical expressions
+    :param list meanings: meanings
+    :param numpy.ndarray argmax: most frequent meaning id per lexical
+    expression id
+    :param numpy.ndarray dominance: share of the most frequent meaning per
+    lexical expression id
+    """
+
+    def __init__(self, les, meanings, argmax, dominance):
+        self.les = list(les)
+        self.le_index = {le: le_id for le_id, le in enumerate(self.les)}
+        self.meanings = list(meanings)
+        self.argmax = argmax
+        self.dominance = dominance
+
+    @classmethod
+    def fit(cls, *analyses):
+        """
+        :param analyses: analysis.Analysis objects of the training datasets
+
+        :rtype: MostFrequentSense
+        """
+        le_index, m_index = {}, {}
+        rows, cols, counts = [], [], []
+        for analysis in analyses:
+            le_map = np.array([le_index.setdefault(le, len(le_index))
+                               for le in analysis.columns.les], dtype=np.int64)
+            m_map = np.array([m_index.setdefault(m, len(m_index))
+                              for m in analysis.columns.meanings], dtype=np.int64)
+            matrix = analysis.counts
+            rows.append(le_map[matrix.rows])
+            cols.append(m_map[matrix.cols])
+            counts.append(matrix.counts)
+
+        n_m = max(len(m_index), 1)
+        keys = (np.concatenate(rows) * n_m + np.concatenate(cols)
+                if rows else np.zeros(0, dtype=np.int64))
+        unique_keys, first, inverse = np.unique(keys, return_index=True,
+                                                return_inverse=True)
+        totals = np.zeros(len(unique_keys), dtype=np.int64)
+        np.add.at(totals, inverse.ravel(),
+                  np.concatenate(counts) if counts else np.zeros(0, dtype=np.int64))
+        pair_les, pair_ms = unique_keys // n_m, unique_keys % n_m
+
+        # per expression: highest count first, then the pair seen first
+        order = np.lexsort((first, -totals, pair_les))
+        best = order[np.unique(pair_les[order], return_index=True)[1]]
+        argmax = np.full(len(le_index), NO_PREDICTION, dtype=np.int64)
+        argmax[pair_les[best]] = pair_ms[best]
+        dominance = np.zeros(len(le_index))
+        le_totals = np.bincount(pair_les, weights=totals, minlength=len(le_index))
+        dominance[pair_les[best]] = totals[best] / le_totals[pair_les[best]]
+        return cls(le_index, m_index, argmax, dominance)
+
+    def predict(self, les):
+        """
+        :param les: lexical expressions
+
+        :rtype: list
+        :return: most frequent meaning per expression, None if unseen
+        """
+        return [self.meanings[self.argmax[self.le_index[le]]] if le in self.le_index
+                else None for le in les]
+
+    def predict_ids(self, columns):
+        """
+        predict every row of a dataset, in the ids of its own vocabulary
+
+        :param loader.Columns columns: test dataset
+
+        :rtype: numpy.ndarray
+        :return: meaning id per row, NO_PREDICTION for unseen expressions,
+        UNKNOWN_MEANING if the predicted meaning is not in the vocabulary
+        of the test dataset
+
+        >>> import tempfile
+        >>> from loader import load_columns
+        >>> with tempfile.TemporaryDirectory() as directory:
+        ...     path = os.path.join(directory, 'test.tsv')
+        ...     with open(path, 'w') as outfile:
+        ...         _ = outfile.write('t1\\tbank\\tbank.n.1\\tNone\\tNone\\tNone\\n')
+        ...     MostFrequentSense.fit().predict_ids(load_columns(path)).tolist()
+        [-1]
+        """
+        if not len(self.argmax):
+            # trained on nothing, no expression is seen
+            return np.full(len(columns.le_ids), NO_PREDICTION, dtype=np.int64)
+        test_m_index = {m: m_id for m_id, m in enumerate(columns.meanings)}
+        to_test = np.array([test_m_index.get(m, UNKNOWN_MEANING) for m in self.meanings]
+                           + [NO_PREDICTION], dtype=np.int64)
+        le_ids = np.array([self.le_index.get(le, -1) for le in columns.les],
+                          dtype=np.int64)
+        predicted = np.where(le_ids >= 0, self.argmax[le_ids], NO_PREDICTION)
+        # NO_PREDICTION (-1) selects the trailing NO_PREDICTION of to_test
+        return to_test[predicted][columns.le_ids]
+
+
+def score(train, test):
+    """
+    :param list train: training datasets (analysis.Analysis)
+    :param analysis.Analysis test: test dataset
+
+    :rtype: list
+    :return: rows of scoring.GoldStrata.score
+    """
+    return GoldStrata(test).score_aligned(
+        MostFrequentSense.fit(*train).predict_ids(test.columns))
+
+
+def pairwise(paths, same_task=False):
+    """
+    score the baseline of every dataset on every dataset
+
+    :param list paths: dataset paths
+    :param bool same_task: only pairs of the same task family
+
+    :rtype: list
+    :return: rows with the training dataset as system
+    """
+    analyses = {path: Analysis(path) for path in paths}
+    models = {path: MostFrequentSense.fit(analysis) for path, analysis in analyses.items()}
+    rows = []
+    for test_path, test in analyses.items():
+        strata = GoldStrata(test)
+        for train_path, model in models.items():
+            if same_task and (os.path.basename(train_path).split(SEPARATOR)[0] !=
+                              os.path.basename(test_path).split(SEPARATOR)[0]):
+                continue
+            for row in strata.score_aligned(model.predict_ids(test.columns)):
+                row.update(system='mfs:' + os.path.basename(train_path),
+                           dataset=os.path.basename(test_path))
+                rows.append(row)
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--train', nargs='*', default=[],
+                        help='training datasets (paths or names in datasets)')
+    parser.add_argument('--test', nargs='*', default=[],
+                        help='test datasets')
+    parser.add_argument('--pairs', action='store_true',
+                        help='score every dataset on every dataset')
+    parser.add_argument('--same-task', action='store_true',
+                        help='with --pairs, only pairs of the same task family')
+    parser.add_argument('--output', default=None,
+                        help='path of the tsv table (default: stdout)')
+    args = parser.parse_args()
+
+    if args.pairs:
+        rows = pairwise(discover(), args.same_task)
+    else:
+        train = [Analysis(path) for path in args.train]
+        system = 'mfs:' + '+'.join(os.path.basename(path) for path in args.train)
+        rows = []
+        for path in args.test:
+            for row in score(train, Analysis(path)):
+                row.update(system=system, dataset=os.path.basename(path))
+                rows.append(row)
+
+    outfile = sys.stdout if args.output is None else open(args.output, 'w', newline='')
+    writer = csv.DictWriter(outfile, fieldnames=HEADER, delimiter='\t')
+    writer.writeheader()
+    writer.writerows(rows)
+    if outfile is not sys.stdout:
+        outfile.close()
@@ -0,0 +1,133 @@
+"""
+analyse all datasets in parallel and write one table with all metrics,
+per dataset and per task family (EL, WSD, EvC, SRL, EnC)
+
+Usage: python batch.py [--datasets ../datasets] [--output metrics.tsv] [--processes N]
+"""
+import argparse
+import csv
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from analysis import Analysis, DATASETS_DIR
+from metrics import DatasetMetrics
+
+SEPARATOR = '___'
+METRICS = [name for name in DatasetMetrics.NAMES if name != 'dtr']
+# 0.0 means that a dataset has no resource values
+RESOURCE_METRICS = ('rora', 'rorv')
+HEADER = ['level', 'task', 'dataset', 'rows'] + METRICS + ['dtr_start', 'dtr_end']
+
+
+def discover(datasets_dir=DATASETS_DIR):
+    """
+    find all dataset files named TASK___NAME
+
+    :param str datasets_dir: directory containing the datasets
+
+    :rtype: list
+    :return: sorted list of paths
+    """
+    return sorted(os.path.join(datasets_dir, name)
+                  for name in os.listdir(datasets_dir)
+                  if SEPARATOR in name
+                  and os.path.isfile(os.path.join(datasets_dir, name)))
+
+
+def analyse(path):
+    """
+    compute all metrics of one dataset
+
+    :param str path: path to dataset named TASK___NAME
+
+    :rtype: dict
+    :return: row of the consolidated table
+    """
+    task, name = os.path.basename(path).split(SEPARATOR, 1)
+    instance = Analysis(path)
+    row = {'level': 'dataset', 'task': task, 'dataset': name,
+           'rows': len(instance.columns)}
+    row.update((metric, getattr(instance, metric)) for metric in METRICS)
+    dtr = instance.dtr
+    row['dtr_start'] = dtr[0].date().isoformat() if dtr else ''
+    row['dtr_end'] = dtr[1].date().isoformat() if dtr else ''
+    return row
+
+
+def task_rows(dataset_rows):
+    """
+    average the metrics of the datasets of each task family. RORA and RORV
+    are averaged over the datasets with resource values only, and left
+    blank if there are none.
+
+    >>> rows = [dict(dict.fromkeys(METRICS, 0.0), task='WSD', dataset=name, rows=10,
+    ...              moa=moa, rora=rora, dtr_start='', dtr_end='')
+    ...         for name, moa, rora in (('semcor', 2.0, 0.5), ('senseval2', 4.0, 0.0))]
+    >>> [(row['moa'], row['rora'], row['rorv']) for row in task_rows(rows)]
+    [(3.0, 0.5, '')]
+
+    :param list dataset_rows: rows as returned by analyse
+
+    :rtype: list
+    :return: one row per task family
+    """
+    by_task = {}
+    for row in dataset_rows:
+        by_task.setdefault(row['task'], []).append(row)
+
+    rows = []
+    for task, members in sorted(by_task.items()):
+        row = {'level': 'task', 'task': task,
+               'dataset': ','.join(member['dataset'] for member in members),
+               'rows': sum(member['rows'] for member in members)}
+        for metric in METRICS:
+            values = [member[metric] for member in members]
+            if metric in RESOURCE_METRICS:
+                values = [value for value in values if value]
+            row[metric] = sum(values) / len(values) if values else ''
+        starts = [member['dtr_start'] for member in members if member['dtr_start']]
+        ends = [member['dtr_end'] for member in members if member['dtr_end']]
+        row['dtr_start'] = min(starts) if starts else ''
+        row['dtr_end'] = max(ends) if ends else ''
+        rows.append(row)
+    return rows
+
+
+def run(paths, processes=None):
+    """
+    analyse datasets across a process pool
+
+    :param list paths: dataset paths
+    :param int processes: number of worker processes (default: all cores)
+
+    :rtype: list
+    :return: dataset rows followed by task family rows
+    """
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        dataset_rows = list(executor.map(analyse, paths))
+    return dataset_rows + task_rows(dataset_rows)
+
+
+def write_table(rows, outfile):
+    writer = csv.DictWriter(outfile, fieldnames=HEADER, delimiter='\t')
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--datasets', default=DATASETS_DIR,
+                        help='directory with TASK___NAME files')
+    parser.add_argument('--output', default=None,
+                        help='path of the tsv table (default: stdout)')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='number of worker processes (default: all cores)')
+    args = parser.parse_args()
+
+    rows = run(discover(args.datasets), args.processes)
+    if args.output is None:
+        write_table(rows, sys.stdout)
+    else:
+        with open(args.output, 'w', newline='') as outfile:
+            write_table(rows, outfile)
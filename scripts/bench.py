@@ -0,0 +1,407 @@
+"""
+benchmarks of the loading and metric hot paths
+
+times Analysis construction, extract_jsons, every metrics.* function and
+get_rank_and_relfreq on the shipped datasets and on synthetic corpora with
+Zipfian lexical expression and meaning distributions (10k to 100M
+mentions by default), and reports throughput (rows/s) and memory. Every
+benchmark runs in a fresh worker process; its memory is the increase of
+peak RSS over the RSS after setup (imports, input parsing), so that it
+only counts what the timed code allocates.
+
+In comparison mode, each engine (Analysis, CountState, StreamingAnalysis)
+is checked against the reference implementation (the metrics.* functions
+on the dicts of the original extract_jsons parser, kept here as
+reference_extract_jsons) for speed and for exact equality. Engines that
+are slower than the reference on a corpus are flagged.
+
+Usage: python bench.py [--sizes 10000 100000 1000000] [--no-datasets]
+                       [--compare] [--repeat 3] [--workdir DIR] [--output PATH]
+"""
+import argparse
+import gc
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import metrics
+from analysis import Analysis
+from batch import discover
+from example_analysis import extract_jsons
+from incremental import CountState
+from loader import load_columns
+from streaming import StreamingAnalysis
+from synthetic import CorpusModel
+
+ATRFU_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'atrfu')
+ENGINES = ('reference', 'analysis', 'incremental', 'streaming')
+SIZES = (10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7, 10 ** 8)
+FUNCTIONS = ('MOA', 'MOV', 'MODA', 'MODV', 'EMNLE', 'ELENM', 'RORA', 'RORV',
+             'DTR', 'entropy')
+
+
+def corpora(sizes, workdir, datasets=True):
+    """
+    :rtype: list
+    :return: (name, path) of the shipped datasets and of a synthetic corpus
+    per size, synthetic corpora are generated once in workdir from a
+    Zipfian synthetic.CorpusModel with one lexical expression per 10
+    mentions (vocabularies beyond 100000 expressions are copies)
+    """
+    paths = [(os.path.basename(path), path) for path in discover()] if datasets else []
+    for size in sizes:
+        path = os.path.join(workdir, 'zipf-%d.tsv' % size)
+        if not os.path.exists(path):
+            n_les = min(max(size // 10, 1), 100000)
+            CorpusModel.zipf(n_les).write(path, size, copies=max(1, size // (10 * n_les)),
+                                          processes=None, seed=0)
+        paths.append(('zipf-%d' % size, path))
+    return paths
+
+
+def peak_rss():
+    """
+    :rtype: int
+    :return: peak resident set size of this process in bytes, since the
+    last reset_peak_rss where it is supported
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def current_rss():
+    """
+    :rtype: int
+    :return: resident set size of this process in bytes (peak RSS where
+    the current one is not available)
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return peak_rss()
+
+
+def reset_peak_rss():
+    """
+    reset the peak RSS to the current RSS (Linux), so that peak_rss only
+    covers what follows
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        pass
+
+
+def _missing(value):
+    return value.strip().lower() in ('none', '')
+
+
+def reference_extract_jsons(filename):
+    """
+    extract_jsons as it was before the columnar loader: the dicts are
+    built line by line from the text of the corpus, so that the reference
+    shares no parsing code with the engines it checks. Only missing values
+    follow the file format as the loader reads it: 'None' in any case, or
+    empty (e.g. the creation times of EnC___quizbowl).
+
+    :rtype: tuple
+    :return: see example_analysis.extract_jsons
+    """
+    sf_to_links = {}
+    links_to_sf = {}
+    sf_data_totals = {}
+    sf_resource_totals = {}
+    links_data_totals = {}
+    links_resource_totals = {}
+    dates = []
+    with open(filename, 'r') as tsvin:
+        for line in tsvin:
+            row = line.strip().split('\t')
+            if len(row) != 6:
+                continue
+            # ambiguity
+            links = sf_to_links.setdefault(row[1], {})
+            links[row[2]] = links.get(row[2], 0) + 1
+            sf_data_totals[row[1]] = sf_data_totals.get(row[1], 0) + 1
+            if not _missing(row[4]):
+                sf_resource_totals[row[1]] = int(row[4])
+            # variance
+            sfs = links_to_sf.setdefault(row[2], {})
+            sfs[row[1]] = sfs.get(row[1], 0) + 1
+            links_data_totals[row[2]] = links_data_totals.get(row[2], 0) + 1
+            if not _missing(row[5]):
+                links_resource_totals[row[2]] = int(row[5])
+
+            if not _missing(row[3]):
+                dates.append(row[3])
+
+    return (sf_to_links, links_to_sf, sf_data_totals, links_data_totals,
+            sf_resource_totals, links_resource_totals, dates)
+
+
+def best_of(function, repeat):
+    """
+    :rtype: tuple
+    :return: (fastest wall time over repeat calls, result of the last call)
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, result
+
+
+def _metric_inputs(jsons):
+    """
+    the arguments of the metrics.* functions, computed the way
+    example_analysis computes them
+    """
+    (sf_to_links, links_to_sf, sf_data_totals, links_data_totals,
+     sf_resource_totals, links_resource_totals, dates) = jsons
+    sides = {}
+    for side, grouped, totals in (('amb', sf_to_links, sf_data_totals),
+                                  ('var', links_to_sf, links_data_totals)):
+        observed, entropies, dominances, uniq_totals = {}, [], [], {}
+        for key, counts in grouped.items():
+            total = totals[key]
+            distribution = [count * 1. / total for count in counts.values()]
+            entropies.append(metrics.entropy(distribution, True))
+            dominances.append(max(distribution))
+            observed[key] = set(counts)
+            uniq_totals[key] = len(observed[key])
+        sides[side] = observed, entropies, dominances, uniq_totals
+    return sides, sf_resource_totals, links_resource_totals, dates
+
+
+def reference_metrics(path):
+    """
+    metrics of a corpus computed by the reference implementation
+
+    :rtype: dict
+    """
+    sides, r_amb, r_var, dates = _metric_inputs(reference_extract_jsons(path))
+    o_l, amb_entropies, amb_dominances, amb_uniq = sides['amb']
+    o_m, var_entropies, var_dominances, var_uniq = sides['var']
+    return {'moa': metrics.MOA(o_l),
+            'moda': metrics.MODA(amb_dominances),
+            'emnle': metrics.EMNLE(amb_entropies),
+            'rora': metrics.RORA(amb_uniq, r_amb, True) if len(r_amb) else 0.0,
+            'mov': metrics.MOV(o_m),
+            'modv': metrics.MODV(var_dominances),
+            'elenm': metrics.ELENM(var_entropies),
+            'rorv': metrics.RORV(var_uniq, r_var, True) if len(r_var) else 0.0,
+            'dtr': metrics.DTR(dates)}
+
+
+def engine_metrics(engine, path):
+    """
+    :param str engine: one of ENGINES
+
+    :rtype: dict
+    :return: metric name -> value
+    """
+    if engine == 'reference':
+        return reference_metrics(path)
+    if engine == 'analysis':
+        return Analysis(path, cached=False).metrics.as_dict()
+    if engine == 'incremental':
+        return CountState.from_columns(load_columns(path)).as_dict()
+    if engine == 'streaming':
+        instance = StreamingAnalysis(path)
+        return {name: getattr(instance, name) for name in metrics.DatasetMetrics.NAMES}
+    raise ValueError('unknown engine %r, use one of %s' % (engine, ', '.join(ENGINES)))
+
+
+def _rank_all(sf_to_links):
+    if ATRFU_DIR not in sys.path:
+        sys.path.insert(0, ATRFU_DIR)
+    from the_candidate_generation import get_rank_and_relfreq
+    for counts in sf_to_links.values():
+        for key in counts:
+            get_rank_and_relfreq(key, counts)
+
+
+def run_case(case):
+    """
+    run one benchmark, meant to be called in a fresh worker process
+
+    :param tuple case: (name of the corpus, path, benchmark, repeat), the
+    benchmark is 'analysis', 'extract_jsons', 'get_rank_and_relfreq',
+    'metrics.<function>' or 'engine.<engine>'
+
+    :rtype: dict
+    """
+    name, path, benchmark, repeat = case
+    with open(path, 'rb') as infile:
+        rows = sum(1 for _ in infile)
+
+    if benchmark == 'analysis':
+        function = lambda: Analysis(path, cached=False).metrics.as_dict()
+    elif benchmark == 'extract_jsons':
+        function = lambda: extract_jsons(path)
+    elif benchmark == 'get_rank_and_relfreq':
+        sf_to_links = extract_jsons(path)[0]
+        function = lambda: _rank_all(sf_to_links)
+    elif benchmark.startswith('metrics.'):
+        sides, r_amb, r_var, dates = _metric_inputs(extract_jsons(path))
+        o_l, amb_entropies, amb_dominances, amb_uniq = sides['amb']
+        o_m, var_entropies, var_dominances, var_uniq = sides['var']
+        arguments = {'MOA': (o_l,), 'MOV': (o_m,),
+                     'MODA': (amb_dominances,), 'MODV': (var_dominances,),
+                     'EMNLE': (amb_entropies,), 'ELENM': (var_entropies,),
+                     'RORA': (amb_uniq, r_amb, True), 'RORV': (var_uniq, r_var, True),
+                     'DTR': (dates,)}
+        function_name = benchmark.split('.', 1)[1]
+        if function_name == 'entropy':
+            distributions = [[count / sum(counts.values()) for count in counts.values()]
+                             for counts in extract_jsons(path)[0].values()]
+            function = lambda: [metrics.entropy(distribution, True)
+                                for distribution in distributions]
+        else:
+            function = lambda: getattr(metrics, function_name)(*arguments[function_name])
+    elif benchmark.startswith('engine.'):
+        engine = benchmark.split('.', 1)[1]
+        function = lambda: engine_metrics(engine, path)
+    else:
+        raise ValueError('unknown benchmark %r' % benchmark)
+
+    gc.collect()
+    setup_rss = current_rss()
+    reset_peak_rss()
+    seconds, result = best_of(function, repeat)
+    peak = peak_rss()
+    record = {'corpus': name, 'benchmark': benchmark, 'rows': rows,
+              'seconds': seconds,
+              'rows_per_second': rows / seconds if seconds else None,
+              'setup_rss_bytes': setup_rss,
+              'peak_rss_bytes': peak,
+              'rss_increase_bytes': max(peak - setup_rss, 0)}
+    if benchmark.startswith('engine.'):
+        record['result'] = result
+    return record
+
+
+def compare(records):
+    """
+    check every engine against the reference on the same corpus
+
+    :param list records: records of the engine.* benchmarks
+
+    :rtype: list
+    :return: per corpus and engine: speedup over the reference, whether it
+    is slower than the reference, whether all metrics are exactly equal and
+    the largest absolute difference
+    """
+    by_corpus = {}
+    for record in records:
+        by_corpus.setdefault(record['corpus'], {})[record['benchmark'][7:]] = record
+
+    comparisons = []
+    for corpus, engines in by_corpus.items():
+        reference = engines.get('reference')
+        if reference is None or reference['result'] is None:
+            continue
+        for engine, record in engines.items():
+            if engine == 'reference' or record['result'] is None:
+                continue
+            differences = {name: abs(record['result'][name] - value)
+                           for name, value in reference['result'].items()
+                           if name != 'dtr'}
+            comparisons.append({
+                'corpus': corpus,
+                'engine': engine,
+                'speedup': reference['seconds'] / record['seconds'],
+                'slower_than_reference': record['seconds'] > reference['seconds'],
+                'exact': all(record['result'][name] == value
+                             for name, value in reference['result'].items()),
+                'max_abs_difference': max(differences.values()),
+                'differing': sorted(name for name, value in reference['result'].items()
+                                    if record['result'][name] != value)})
+    return comparisons
+
+
+def _serializable(record):
+    record = dict(record)
+    if record.get('result') is not None:
+        result = dict(record['result'])
+        result['dtr'] = [date.date().isoformat() for date in result['dtr']]
+        record['result'] = result
+    return record
+
+
+def run(cases):
+    """
+    run every case in its own worker process
+
+    :rtype: list
+    """
+    records = []
+    for case in cases:
+        with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as executor:
+            record = executor.submit(run_case, case).result()
+        print('%-20s %-26s %10s rows/s %8.1f MB' % (
+            record['corpus'], record['benchmark'],
+            '%.0f' % record['rows_per_second'] if record['rows_per_second'] else '-',
+            record['rss_increase_bytes'] / 2 ** 20), file=sys.stderr)
+        records.append(record)
+    return records
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='*', default=list(SIZES),
+                        help='numbers of mentions of the synthetic corpora '
+                        '(default: 10k to 100M)')
+    parser.add_argument('--no-datasets', action='store_true',
+                        help='skip the shipped datasets')
+    parser.add_argument('--compare', action='store_true',
+                        help='compare the engines with the reference implementation')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of timed runs, the fastest is reported')
+    parser.add_argument('--workdir', default=None,
+                        help='directory for synthetic corpora (default: a temporary directory)')
+    parser.add_argument('--output', default=None,
+                        help='path of the JSON results (default: stdout)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        workdir = args.workdir or tmp_dir
+        os.makedirs(workdir, exist_ok=True)
+        paths = corpora(args.sizes, workdir, datasets=not args.no_datasets)
+        if args.compare:
+            benchmarks = ['engine.' + engine for engine in ENGINES]
+        else:
+            benchmarks = (['analysis', 'extract_jsons', 'get_rank_and_relfreq'] +
+                          ['metrics.' + function for function in FUNCTIONS])
+        records = run([(name, path, benchmark, args.repeat)
+                       for name, path in paths for benchmark in benchmarks])
+
+    output = {'benchmarks': [_serializable(record) for record in records]}
+    if args.compare:
+        output['comparisons'] = compare(records)
+        for comparison in output['comparisons']:
+            if comparison['slower_than_reference']:
+                print('SLOWER %-10s than the reference on %-20s (%.2fx)'
+                      % (comparison['engine'], comparison['corpus'], comparison['speedup']),
+                      file=sys.stderr)
+    if args.output is None:
+        json.dump(output, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as outfile:
+            json.dump(output, outfile, indent=2)
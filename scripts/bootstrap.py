@@ -0,0 +1,200 @@
+"""
+bootstrap confidence intervals for the dataset metrics
+
+resampling the mentions of a dataset with replacement is the same as
+drawing the counts of its (lexical expression, meaning) pairs from a
+multinomial distribution. Resampling documents (or any other unit) draws
+a multinomial weight per unit instead and sums the pair counts of the units
+with those weights. Either way, a batch of resamples is a matrix with one
+row of pair counts per resample, and all metrics are computed for all rows
+at once with grouped reductions. Batches are spread over processes.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+METRICS = ('moa', 'moda', 'emnle', 'rora', 'mov', 'modv', 'elenm', 'rorv')
+
+_data = None
+
+
+def grouped_metrics(counts, groups, n_groups, resource=None,
+                    ignore_theoretical_one=True):
+    """
+    mean cardinality, dominance, entropy and resource ratio of the keys,
+    for every row of a (resamples x pairs) count matrix. Keys without
+    counts in a row are left out of the means of that row.
+
+    >>> counts = np.array([[2, 1, 1], [3, 0, 1]])
+    >>> moa, moda, emnle, rora = grouped_metrics(counts, np.array([0, 0, 1]), 2)
+    >>> moa.tolist(), moda.tolist()
+    ([1.5, 1.0], [0.8333333333333333, 1.0])
+
+    :param numpy.ndarray counts: (resamples x pairs) counts
+    :param numpy.ndarray groups: key id of each pair
+    :param int n_groups: number of keys
+    :param numpy.ndarray resource: resource value per key id (-1 if unknown)
+    :param bool ignore_theoretical_one: see metrics.RORA
+
+    :rtype: tuple
+    :return: four arrays with one value per resample
+    """
+    order = np.argsort(groups, kind='stable')
+    counts = counts[:, order]
+    sizes = np.bincount(groups, minlength=n_groups)
+    keys = np.flatnonzero(sizes)
+    sizes = sizes[keys]
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+
+    totals = np.add.reduceat(counts, starts, axis=1)
+    present = totals > 0
+    safe_totals = np.where(present, totals, 1)
+
+    cardinality = np.add.reduceat(counts > 0, starts, axis=1)
+    dominance = np.maximum.reduceat(counts, starts, axis=1) / safe_totals
+
+    probs = counts / np.repeat(safe_totals, sizes, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terms = np.where(probs > 0, probs * np.log2(probs), 0.0)
+    entropy = -np.add.reduceat(terms, starts, axis=1)
+    entropy = np.abs(np.where(cardinality >= 2,
+                              entropy / np.log2(np.maximum(cardinality, 2)),
+                              entropy))
+
+    if resource is None:
+        resource = np.full(n_groups, -1)
+    resource = resource[keys]
+    has_resource = resource > 0
+    if ignore_theoretical_one:
+        has_resource &= resource != 1
+    ratios = cardinality / np.where(has_resource, resource, 1)
+
+    def mean(values, mask):
+        n = mask.sum(axis=1)
+        return np.where(n > 0, (values * mask).sum(axis=1) / np.maximum(n, 1), 0.0)
+
+    return (mean(cardinality, present),
+            mean(dominance, present),
+            mean(entropy, present),
+            mean(ratios, present & has_resource))
+
+
+def _init(data):
+    global _data
+    _data = data
+
+
+def _resample_batch(task):
+    """
+    draw a batch of resamples and compute their metrics
+    """
+    seed, size = task
+    data = _data
+    rng = np.random.default_rng(seed)
+
+    if data['units'] is None:
+        n_mentions = int(data['pair_counts'].sum())
+        counts = rng.multinomial(n_mentions, data['pair_counts'] / n_mentions,
+                                 size=size)
+    else:
+        n_units = data['n_units']
+        weights = rng.multinomial(n_units, np.full(n_units, 1.0 / n_units),
+                                  size=size)
+        contributions = weights[:, data['units']] * data['unit_pair_counts']
+        counts = np.add.reduceat(contributions, data['pair_starts'], axis=1)
+
+    n_les, n_meanings = data['shape']
+    values = (grouped_metrics(counts, data['rows'], n_les, data['r_amb']) +
+              grouped_metrics(counts, data['cols'], n_meanings, data['r_var']))
+    return dict(zip(METRICS, values))
+
+
+def _prepare(columns, units):
+    """
+    pair counts, and if units are given, the counts per (unit, pair)
+    sorted by pair
+    """
+    n_m = max(len(columns.meanings), 1)
+    pair_keys, pair_of_row, pair_counts = np.unique(
+        columns.le_ids * n_m + columns.m_ids,
+        return_inverse=True, return_counts=True)
+    data = {'rows': pair_keys // n_m,
+            'cols': pair_keys % n_m,
+            'shape': (len(columns.les), len(columns.meanings)),
+            'pair_counts': pair_counts,
+            'r_amb': columns.resource_ambiguity_column(),
+            'r_var': columns.resource_variance_column(),
+            'units': None}
+
+    if units is not None:
+        _, unit_of_row = np.unique(np.asarray(units), return_inverse=True)
+        n_units = int(unit_of_row.max()) + 1 if len(unit_of_row) else 0
+        n_pairs = len(pair_keys)
+        unit_pairs, unit_pair_counts = np.unique(
+            pair_of_row.ravel() * n_units + unit_of_row.ravel(),
+            return_counts=True)
+        pairs = unit_pairs // n_units
+        data.update({'units': unit_pairs % n_units,
+                     'n_units': n_units,
+                     'unit_pair_counts': unit_pair_counts,
+                     'pair_starts': np.searchsorted(pairs, np.arange(n_pairs))})
+    return data
+
+
+def bootstrap(columns, n_resamples=1000, units=None, batch_size=100,
+              processes=None, seed=None):
+    """
+    bootstrap distribution of the ambiguity and variance metrics
+
+    >>> from loader import load_columns
+    >>> from analysis import DATASETS_DIR
+    >>> columns = load_columns(DATASETS_DIR + '/WSD___SE7-AW')
+    >>> samples = bootstrap(columns, n_resamples=20, processes=1, seed=0)
+    >>> samples['moa'].shape
+    (20,)
+
+    :param loader.Columns columns: the dataset
+    :param int n_resamples: number of resamples
+    :param units: if None, mentions are resampled; otherwise a sequence with
+    the unit (e.g. document id) of every row, and units are resampled
+    :param int batch_size: number of resamples computed at once
+    :param int processes: number of worker processes (default: all cores,
+    1: no worker processes)
+    :param seed: seed of the random generator
+
+    :rtype: dict
+    :return: metric name -> array with one value per resample
+    """
+    data = _prepare(columns, units)
+    sizes = [min(batch_size, n_resamples - start)
+             for start in range(0, n_resamples, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = list(zip(seeds, sizes))
+
+    if processes == 1:
+        _init(data)
+        results = [_resample_batch(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init,
+                                 initargs=(data,)) as executor:
+            results = list(executor.map(_resample_batch, tasks))
+
+    return {name: np.concatenate([result[name] for result in results])
+            for name in METRICS}
+
+
+def confidence_intervals(columns, level=0.95, **kwargs):
+    """
+    percentile bootstrap confidence intervals
+
+    :param loader.Columns columns: the dataset
+    :param float level: confidence level
+    :param kwargs: passed on to bootstrap
+
+    :rtype: dict
+    :return: metric name -> (lower bound, upper bound)
+    """
+    samples = bootstrap(columns, **kwargs)
+    tail = 100 * (1 - level) / 2
+    return {name: tuple(np.percentile(values, [tail, 100 - tail]).tolist())
+            for name, values in samples.items()}
@@ -0,0 +1,214 @@
+"""
+binary cache of loaded corpora
+
+a corpus in tsv format is converted once into a directory of .npy files
+(one per id, date and resource column and per string table buffer) and a
+manifest. Later loads memory-map the arrays instead of parsing the text.
+The manifest records the size, modification time and SHA-1 of the source
+file; the cache is rebuilt when the file changed.
+
+Usage: python columns_cache.py [--datasets ../datasets]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from loader import Columns, load_columns
+from store import StringTable
+
+VERSION = 2
+CACHE_DIRNAME = '.columns'
+ARRAYS = ('le_ids', 'm_ids', 'creation_dates', 'r_amb', 'r_var')
+TABLES = ('identifiers', 'les', 'meanings')
+
+
+def cache_path(corpus_path, cache_dir=None):
+    """
+    :param str corpus_path: path to corpus in tsv format
+    :param str cache_dir: directory holding the caches (default: .columns
+    next to the corpus)
+
+    :rtype: str
+    :return: cache directory of the corpus
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(corpus_path)),
+                                 CACHE_DIRNAME)
+    return os.path.join(cache_dir, os.path.basename(corpus_path))
+
+
+def file_hash(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as infile:
+        for block in iter(lambda: infile.read(1 << 20), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def source_info(corpus_path, with_hash=True):
+    stat = os.stat(corpus_path)
+    info = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if with_hash:
+        info['sha1'] = file_hash(corpus_path)
+    return info
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, 'manifest.json'), encoding='utf-8') as infile:
+            manifest = json.load(infile)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != VERSION:
+        return None
+    return manifest
+
+
+def is_valid(directory, corpus_path):
+    """
+    the cache is valid if size and modification time of the source are
+    unchanged, or if only the modification time changed but not the content
+
+    :rtype: bool
+    """
+    manifest = read_manifest(directory)
+    if manifest is None:
+        return False
+    recorded = manifest['source']
+    current = source_info(corpus_path, with_hash=False)
+    if current['size'] != recorded['size']:
+        return False
+    if current['mtime_ns'] == recorded['mtime_ns']:
+        return True
+    if file_hash(corpus_path) != recorded['sha1']:
+        return False
+    # same content, record the new modification time to skip hashing next time
+    recorded['mtime_ns'] = current['mtime_ns']
+    try:
+        with open(os.path.join(directory, 'manifest.json'), 'w', encoding='utf-8') as outfile:
+            json.dump(manifest, outfile)
+    except OSError:
+        pass
+    return True
+
+
+def save(columns, directory, corpus_path):
+    """
+    write columns to a cache directory. The files are written to a
+    temporary directory first and then moved into place, so readers never
+    see a partially written cache.
+
+    :param loader.Columns columns: loaded corpus
+    :param str directory: cache directory
+    :param str corpus_path: path of the source corpus
+    """
+    parent = os.path.dirname(directory)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent, prefix='.tmp-')
+    try:
+        for name in ARRAYS:
+            np.save(os.path.join(tmp, name + '.npy'), getattr(columns, name))
+        tables = {}
+        for name in TABLES:
+            table = getattr(columns, name)
+            np.save(os.path.join(tmp, name + '.data.npy'),
+                    np.frombuffer(table.data, dtype=np.uint8))
+            np.save(os.path.join(tmp, name + '.offsets.npy'), table.offsets)
+            np.save(os.path.join(tmp, name + '.prefix_ids.npy'), table.prefix_ids)
+            tables[name] = table.prefixes
+        with open(os.path.join(tmp, 'manifest.json'), 'w', encoding='utf-8') as outfile:
+            json.dump({'version': VERSION,
+                       'source': source_info(corpus_path),
+                       'rows': len(columns),
+                       'prefixes': tables}, outfile)
+        if os.path.isdir(directory):
+            shutil.rmtree(directory, ignore_errors=True)
+        os.rename(tmp, directory)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def load(directory, mmap=True):
+    """
+    :param str directory: cache directory written by save
+    :param bool mmap: memory-map the arrays instead of reading them
+
+    :rtype: loader.Columns
+    """
+    manifest = read_manifest(directory)
+    mmap_mode = 'r' if mmap else None
+
+    def array(name):
+        return np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode)
+
+    tables = {}
+    for name in TABLES:
+        data = array(name + '.data')
+        tables[name] = StringTable(manifest['prefixes'][name],
+                                   array(name + '.prefix_ids'),
+                                   memoryview(data) if len(data) else b'',
+                                   array(name + '.offsets'))
+    return Columns(tables['identifiers'], tables['les'], tables['meanings'],
+                   *[array(name) for name in ARRAYS])
+
+
+def load_cached(corpus_path, cache_dir=None, mmap=True):
+    """
+    load a corpus from its cache, building the cache if it is missing or
+    stale. If the cache cannot be written, the parsed corpus is returned.
+
+    :param str corpus_path: path to corpus in tsv format, see loader.load_columns
+    :param str cache_dir: see cache_path
+    :param bool mmap: see load
+
+    :rtype: loader.Columns
+    """
+    directory = cache_path(corpus_path, cache_dir)
+    if is_valid(directory, corpus_path):
+        return load(directory, mmap)
+    columns = load_columns(corpus_path)
+    try:
+        save(columns, directory, corpus_path)
+    except OSError:
+        return columns
+    return load(directory, mmap)
+
+
+def build(paths, cache_dir=None):
+    """
+    build or refresh the caches of corpora
+
+    :param list paths: paths to corpora in tsv format
+    :param str cache_dir: see cache_path
+
+    :rtype: list
+    :return: paths of the corpora whose cache was (re)built
+    """
+    built = []
+    for path in paths:
+        directory = cache_path(path, cache_dir)
+        if not is_valid(directory, path):
+            save(load_columns(path), directory, path)
+            built.append(path)
+    return built
+
+
+if __name__ == '__main__':
+    from batch import discover
+    from analysis import DATASETS_DIR
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--datasets', default=DATASETS_DIR,
+                        help='directory containing the datasets')
+    parser.add_argument('--cache-dir', default=None,
+                        help='directory for the caches (default: DATASETS/%s)'
+                        % CACHE_DIRNAME)
+    args = parser.parse_args()
+
+    for path in build(discover(args.datasets), args.cache_dir):
+        print('built', path)
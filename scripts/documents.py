@@ -0,0 +1,388 @@
+"""
+per-document metrics and one sense per discourse
+
+the identifier column of most datasets encodes where a mention occurs:
+'d013.s001.t003' is token 3 of sentence 1 of document d013 (WSD),
+"('100911_Northrop_Grumman...', '1064 1065')" a token span of a MEANTIME
+document and 'selectraws/99___9406' a mention in question 99 (quizbowl).
+A format parser turns identifiers into document (and sentence) keys, which
+are interned into a document id per row. Metrics per document are computed
+for all documents at once: (document, lexical expression) and (document,
+meaning) are counted as keys of their own, and the per-key statistics are
+averaged per document with bincounts over the sorted document ids. Up to
+the order of floating point sums, the values equal those of an Analysis of
+each document on its own, with the resource values of the whole dataset.
+
+Usage: python documents.py DATASET [--parser wsd] [--sentences]
+                           [--group-pattern REGEX] [--output documents.tsv]
+"""
+import argparse
+import csv
+import re
+import sys
+from functools import cached_property
+
+import numpy as np
+
+from metrics import group_statistics
+
+PARSERS = {'wsd': re.compile(r"(?P<document>[^.]+)\.(?P<sentence>[^.]+)\.[^.]+"),
+           'meantime': re.compile(r"\('(?P<document>[^']*)', '[^']*'\)"),
+           'quizbowl': re.compile(r"(?P<document>.+)___[^_/]+")}
+METRICS = ('moa', 'moda', 'emnle', 'rora', 'mov', 'modv', 'elenm', 'rorv')
+OSPD = ('repeated', 'consistent', 'repeated_mentions', 'dominant_mentions')
+
+
+def detect_parser(identifiers):
+    """
+    name of the parser that matches the first identifier
+
+    >>> detect_parser(['d013.s001.t003'])
+    'wsd'
+    >>> detect_parser(['1']) is None, detect_parser([]) is None
+    (True, True)
+
+    :rtype: str
+    :return: key of PARSERS, None if no parser matches
+    """
+    identifier = next(iter(identifiers), None)
+    if identifier is None:
+        return None
+    for name, pattern in PARSERS.items():
+        if pattern.fullmatch(identifier):
+            return name
+    return None
+
+
+def parse_identifiers(identifiers, parser):
+    """
+    :param identifiers: identifier per row
+    :param parser: key of PARSERS or a compiled pattern with a 'document'
+    and optionally a 'sentence' group
+
+    :rtype: tuple
+    :return: (document names, document id per row, sentence names,
+    sentence id per row), sentence names and ids are None if the format
+    has no sentences
+
+    :raises ValueError: if an identifier does not match the parser
+    """
+    pattern = PARSERS[parser] if isinstance(parser, str) else parser
+    with_sentences = 'sentence' in pattern.groupindex
+    document_index, sentence_index = {}, {}
+    document_ids, sentence_ids = [], []
+    for identifier in identifiers:
+        match = pattern.fullmatch(identifier)
+        if match is None:
+            raise ValueError('identifier %r does not match %s'
+                             % (identifier, pattern.pattern))
+        document = match.group('document')
+        document_ids.append(document_index.setdefault(document, len(document_index)))
+        if with_sentences:
+            sentence = '%s.%s' % (document, match.group('sentence'))
+            sentence_ids.append(sentence_index.setdefault(sentence, len(sentence_index)))
+
+    document_ids = np.array(document_ids, dtype=np.int64)
+    if not with_sentences:
+        return list(document_index), document_ids, None, None
+    return (list(document_index), document_ids,
+            list(sentence_index), np.array(sentence_ids, dtype=np.int64))
+
+
+class KeyCounts:
+    """
+    counts of the (document, key) groups of a dataset, e.g. of every
+    lexical expression in every document over its meanings
+
+    :param numpy.ndarray documents: document id per group, sorted
+    :param numpy.ndarray keys: key id per group
+    :param numpy.ndarray totals: number of mentions per group
+    :param numpy.ndarray maxima: count of the most frequent value per group
+    :param tuple statistics: (cardinality, dominance, entropy) per group, see
+    metrics.group_statistics
+    """
+
+    def __init__(self, documents, keys, totals, maxima, statistics):
+        self.documents = documents
+        self.keys = keys
+        self.totals = totals
+        self.maxima = maxima
+        self.statistics = statistics
+
+    @classmethod
+    def count(cls, document_ids, key_ids, value_ids, n_keys, n_values):
+        """
+        :param numpy.ndarray document_ids: document id per row
+        :param numpy.ndarray key_ids: key id per row
+        :param numpy.ndarray value_ids: value id per row (the meaning for
+        ambiguity, the lexical expression for variance)
+        :param int n_keys: number of keys
+        :param int n_values: number of values
+
+        :rtype: KeyCounts
+        """
+        n_keys, n_values = max(n_keys, 1), max(n_values, 1)
+        groups, group_ids = np.unique(document_ids * n_keys + key_ids,
+                                      return_inverse=True)
+        pairs, pair_counts = np.unique(group_ids.ravel() * n_values + value_ids,
+                                       return_counts=True)
+        pair_groups = pairs // n_values
+        starts = np.flatnonzero(np.diff(pair_groups, prepend=-1))
+        maxima = (np.maximum.reduceat(pair_counts, starts) if len(starts)
+                  else np.zeros(0, dtype=np.int64))
+        return cls(groups // n_keys, groups % n_keys,
+                   np.bincount(pair_groups, weights=pair_counts,
+                               minlength=len(groups)).astype(np.int64),
+                   maxima,
+                   group_statistics(pair_groups, pair_counts, len(groups)))
+
+    def means(self, n_documents, resource=None, ignore_theoretical_one=True):
+        """
+        :param int n_documents: number of documents
+        :param numpy.ndarray resource: resource value per key id (MISSING
+        if unknown)
+        :param bool ignore_theoretical_one: see metrics.RORA
+
+        :rtype: tuple
+        :return: mean cardinality, dominance, entropy and resource ratio per
+        document, 0.0 for documents without keys (or resource values)
+        """
+        cardinality, dominance, entropy = self.statistics
+        n_keys = np.bincount(self.documents, minlength=n_documents)
+        safe_n = np.maximum(n_keys, 1)
+        means = [np.bincount(self.documents, weights=cardinality,
+                             minlength=n_documents) / safe_n,
+                 np.bincount(self.documents, weights=dominance,
+                             minlength=n_documents) / safe_n,
+                 np.bincount(self.documents, weights=entropy,
+                             minlength=n_documents) / safe_n]
+        ratios = np.zeros(n_documents)
+        if resource is not None:
+            values = resource[self.keys]
+            rated = values > 0
+            if ignore_theoretical_one:
+                rated &= values != 1
+            n_rated = np.bincount(self.documents[rated], minlength=n_documents)
+            sums = np.bincount(self.documents[rated],
+                               weights=cardinality[rated] / values[rated],
+                               minlength=n_documents)
+            ratios = np.where(n_rated > 0, (1.0 / np.maximum(n_rated, 1)) * sums, 0.0)
+        return tuple(means) + (ratios,)
+
+
+class Documents:
+    """
+    metrics per document (or per sentence, or per group of documents)
+
+    >>> from loader import Columns
+    >>> columns = Columns(['d1.s1.t1', 'd1.s1.t2', 'd1.s2.t1', 'd2.s1.t1'],
+    ...                   ['bank', 'shore'], ['bank.n.1', 'bank.n.2', 'shore.n.1'],
+    ...                   np.array([0, 0, 0, 1]), np.array([0, 0, 1, 2]),
+    ...                   None, np.full(4, -1), np.full(4, -1))
+    >>> documents = Documents.from_columns(columns)
+    >>> documents.names, documents.mentions.tolist()
+    (['d1', 'd2'], [3, 1])
+    >>> documents.metrics()['moa'].tolist()
+    [2.0, 1.0]
+    >>> documents.one_sense_per_discourse(ambiguous_only=False)['consistency']
+    0.0
+    >>> documents.sentences().metrics()['moa'].tolist()
+    [1.0, 1.0, 1.0]
+
+    :param loader.Columns columns: the dataset
+    :param list names: name per document id
+    :param numpy.ndarray document_ids: document id per row
+    :param list sentence_names: name per sentence id (None if unknown)
+    :param numpy.ndarray sentence_ids: sentence id per row (None if unknown)
+    """
+
+    def __init__(self, columns, names, document_ids,
+                 sentence_names=None, sentence_ids=None):
+        self.columns = columns
+        self.names = names
+        self.document_ids = document_ids
+        self.sentence_names = sentence_names
+        self.sentence_ids = sentence_ids
+
+    @classmethod
+    def from_columns(cls, columns, parser=None):
+        """
+        :param loader.Columns columns: the dataset
+        :param parser: key of PARSERS or a compiled pattern, detected from
+        the identifiers if None
+
+        :rtype: Documents
+
+        :raises ValueError: if no parser matches the identifiers
+        """
+        if parser is None:
+            parser = detect_parser(columns.identifiers)
+            if parser is None:
+                raise ValueError('the identifiers do not encode documents, '
+                                 'known formats: %s' % ', '.join(PARSERS))
+        return cls(columns, *parse_identifiers(columns.identifiers, parser))
+
+    def __len__(self):
+        return len(self.names)
+
+    def sentences(self):
+        """
+        :rtype: Documents
+        :return: the sentences as documents
+
+        :raises ValueError: if the identifiers have no sentences
+        """
+        if self.sentence_ids is None:
+            raise ValueError('the identifiers do not encode sentences')
+        return Documents(self.columns, self.sentence_names, self.sentence_ids)
+
+    def regroup(self, group_of):
+        """
+        :param group_of: function from document name to group name
+
+        :rtype: Documents
+        :return: the groups of documents as documents
+        """
+        group_index = {}
+        groups = np.array([group_index.setdefault(group_of(name), len(group_index))
+                           for name in self.names], dtype=np.int64)
+        return Documents(self.columns, list(group_index), groups[self.document_ids])
+
+    @cached_property
+    def mentions(self):
+        return np.bincount(self.document_ids, minlength=len(self))
+
+    @cached_property
+    def ambiguity(self):
+        """
+        :rtype: KeyCounts
+        :return: counts of every lexical expression in every document
+        """
+        return KeyCounts.count(self.document_ids, self.columns.le_ids, self.columns.m_ids,
+                               len(self.columns.les), len(self.columns.meanings))
+
+    @cached_property
+    def variance(self):
+        """
+        :rtype: KeyCounts
+        :return: counts of every meaning in every document
+        """
+        return KeyCounts.count(self.document_ids, self.columns.m_ids, self.columns.le_ids,
+                               len(self.columns.meanings), len(self.columns.les))
+
+    def metrics(self, ignore_theoretical_one=True):
+        """
+        :param bool ignore_theoretical_one: see metrics.RORA
+
+        :rtype: dict
+        :return: name in METRICS -> value per document id
+        """
+        values = (self.ambiguity.means(len(self), self.columns.resource_ambiguity_column(),
+                                       ignore_theoretical_one) +
+                  self.variance.means(len(self), self.columns.resource_variance_column(),
+                                      ignore_theoretical_one))
+        return dict(zip(METRICS, values))
+
+    def one_sense_per_discourse(self, ambiguous_only=True):
+        """
+        how often a lexical expression that occurs more than once in a
+        document keeps one meaning within it
+
+        :param bool ambiguous_only: only count lexical expressions with more
+        than one meaning in the whole dataset
+
+        :rtype: dict
+        :return: per document id: 'repeated' (lexical expressions with
+        more than one mention), 'consistent' (of which with one meaning),
+        'repeated_mentions' and 'dominant_mentions' (mentions of their most
+        frequent meaning in the document); over all documents: 'consistency'
+        (consistent / repeated) and 'dominance' (dominant_mentions /
+        repeated_mentions), nan if nothing is repeated
+        """
+        counts = self.ambiguity
+        cardinality = counts.statistics[0]
+        repeated = counts.totals > 1
+        if ambiguous_only:
+            ambiguous = np.bincount(self.columns.count_matrix().rows,
+                                    minlength=len(self.columns.les)) > 1
+            repeated &= ambiguous[counts.keys]
+        documents = counts.documents[repeated]
+        result = {
+            'repeated': np.bincount(documents, minlength=len(self)),
+            'consistent': np.bincount(documents, weights=cardinality[repeated] == 1,
+                                      minlength=len(self)).astype(np.int64),
+            'repeated_mentions': np.bincount(documents, weights=counts.totals[repeated],
+                                             minlength=len(self)).astype(np.int64),
+            'dominant_mentions': np.bincount(documents, weights=counts.maxima[repeated],
+                                             minlength=len(self)).astype(np.int64)}
+        n_repeated = int(result['repeated'].sum())
+        n_mentions = int(result['repeated_mentions'].sum())
+        result['consistency'] = (int(result['consistent'].sum()) / n_repeated
+                                 if n_repeated else float('nan'))
+        result['dominance'] = (int(result['dominant_mentions'].sum()) / n_mentions
+                               if n_mentions else float('nan'))
+        return result
+
+    def table(self, ignore_theoretical_one=True, ambiguous_only=True):
+        """
+        :rtype: list
+        :return: one row per document with its mentions, metrics and one
+        sense per discourse counts
+        """
+        columns = {'mentions': self.mentions}
+        columns.update(self.metrics(ignore_theoretical_one))
+        ospd = self.one_sense_per_discourse(ambiguous_only)
+        columns.update((name, ospd[name]) for name in OSPD)
+        lists = {name: values.tolist() for name, values in columns.items()}
+        return [dict({'document': name}, **{column: values[document_id]
+                                            for column, values in lists.items()})
+                for document_id, name in enumerate(self.names)]
+
+
+if __name__ == '__main__':
+    from analysis import Analysis
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('dataset', help='dataset path or name in datasets')
+    parser.add_argument('--parser', choices=sorted(PARSERS), default=None,
+                        help='identifier format (default: detected)')
+    parser.add_argument('--sentences', action='store_true',
+                        help='one row per sentence instead of per document')
+    parser.add_argument('--group-pattern', default=None,
+                        help='group documents by the match of this regular '
+                        'expression in their names, e.g. "^[^/]*"')
+    parser.add_argument('--all-les', action='store_true',
+                        help='one sense per discourse over all lexical '
+                        'expressions, not only the ambiguous ones')
+    parser.add_argument('--output', default=None,
+                        help='path of the tsv table (default: stdout)')
+    args = parser.parse_args()
+
+    try:
+        documents = Documents.from_columns(Analysis(args.dataset).columns, args.parser)
+        if args.sentences:
+            documents = documents.sentences()
+    except ValueError as error:
+        sys.exit(str(error))
+    if args.group_pattern is not None:
+        pattern = re.compile(args.group_pattern)
+
+        def group_of(name):
+            match = pattern.search(name)
+            return name if match is None else match.group(0)
+
+        documents = documents.regroup(group_of)
+
+    rows = documents.table(ambiguous_only=not args.all_les)
+    outfile = sys.stdout if args.output is None else open(args.output, 'w', newline='')
+    writer = csv.DictWriter(outfile, fieldnames=['document', 'mentions'] + list(METRICS) +
+                            list(OSPD), delimiter='\t')
+    writer.writeheader()
+    writer.writerows(rows)
+    if outfile is not sys.stdout:
+        outfile.close()
+
+    ospd = documents.one_sense_per_discourse(not args.all_les)
+    print('one sense per discourse: %.4f of repeated lexical expressions, '
+          '%.4f of their mentions' % (ospd['consistency'], ospd['dominance']),
+          file=sys.stderr)
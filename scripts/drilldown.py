@@ -0,0 +1,143 @@
+"""
+per-key statistics with top-k and threshold queries
+
+a KeyTable holds, for every lexical expression (ambiguity) or every meaning
+(variance), its number of mentions, observed ambiguity/variance, dominance,
+normalized entropy, resource value and ratio to the resource. The first
+query on a column sorts it once; afterwards top-k queries are slices and
+threshold queries binary searches on the sorted column.
+"""
+import numpy as np
+
+COLUMNS = ('mentions', 'observed', 'dominance', 'entropy', 'resource', 'ratio')
+DIRECTIONS = ('ambiguity', 'variance')
+
+
+class KeyTable:
+    """
+    queryable statistics per key
+
+    >>> from metrics import CountMatrix
+    >>> dataset = CountMatrix.from_ids([0, 0, 1, 2], [0, 1, 1, 2], (3, 3)).metrics()
+    >>> table = KeyTable.from_metrics(dataset, 'ambiguity', ['bank', 'shore', 'tree'])
+    >>> [row['key'] for row in table.top('observed', 1)]
+    ['bank']
+    >>> [row['key'] for row in table.where('entropy', maximum=0.0)]
+    ['shore', 'tree']
+    >>> table['bank']['dominance']
+    0.5
+
+    :param keys: key per key id (list or store.StringTable)
+    :param numpy.ndarray ids: key ids of the keys in the table
+    :param dict columns: column name -> array aligned with ids. Missing
+    values (no resource, no ratio) are nan.
+    """
+
+    def __init__(self, keys, ids, columns):
+        self.keys = keys
+        self.ids = ids
+        self.columns = columns
+        self._positions = None
+        self._sorted = {}
+
+    @classmethod
+    def from_metrics(cls, dataset, direction, keys, ignore_theoretical_one=True):
+        """
+        :param metrics.DatasetMetrics dataset: metrics of the dataset, its
+        cached per-key statistics are reused
+        :param str direction: 'ambiguity' (per lexical expression) or
+        'variance' (per meaning)
+        :param keys: key per key id
+        :param bool ignore_theoretical_one: see metrics.RORA
+
+        :rtype: KeyTable
+        """
+        if direction == 'ambiguity':
+            groups = dataset.counts.rows
+            cardinality, dominance, entropy = dataset.amb_statistics
+            resource = dataset.r_amb
+        elif direction == 'variance':
+            groups = dataset.counts.cols
+            cardinality, dominance, entropy = dataset.var_statistics
+            resource = dataset.r_var
+        else:
+            raise ValueError('unknown direction %r, use one of %s'
+                             % (direction, ', '.join(DIRECTIONS)))
+
+        mentions = np.bincount(groups, weights=dataset.counts.counts,
+                               minlength=len(cardinality)).astype(np.int64)
+        ids = np.flatnonzero(cardinality)
+        if resource is None:
+            resource = np.zeros(len(cardinality))
+        resource = resource[ids].astype(float)
+        has_resource = resource > 0
+        resource[~has_resource] = np.nan
+        rated = has_resource & (resource != 1) if ignore_theoretical_one else has_resource
+        ratio = np.full(len(ids), np.nan)
+        ratio[rated] = cardinality[ids][rated] / resource[rated]
+        return cls(keys, ids, {'mentions': mentions[ids],
+                               'observed': cardinality[ids],
+                               'dominance': dominance[ids],
+                               'entropy': entropy[ids],
+                               'resource': resource,
+                               'ratio': ratio})
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, key):
+        if self._positions is None:
+            self._positions = {self.keys[key_id]: position
+                               for position, key_id in enumerate(self.ids.tolist())}
+        return self._record(self._positions[key])
+
+    def _record(self, position):
+        record = {'key': self.keys[int(self.ids[position])]}
+        for name, values in self.columns.items():
+            value = values[position].item()
+            if value != value:
+                value = None
+            elif name == 'resource':
+                value = int(value)
+            record[name] = value
+        return record
+
+    def _sorted_column(self, column, largest):
+        """
+        positions with a value in column, sorted by value and then by key id,
+        and the values in that order
+        """
+        if (column, largest) not in self._sorted:
+            values = self.columns[column]
+            present = np.flatnonzero(~np.isnan(values.astype(float)))
+            order = present[np.lexsort((self.ids[present],
+                                        -values[present] if largest else values[present]))]
+            self._sorted[column, largest] = order, values[order]
+        return self._sorted[column, largest]
+
+    def top(self, column, k=10, largest=True):
+        """
+        :param str column: one of COLUMNS
+        :param int k: number of keys
+        :param bool largest: highest values first if True, lowest if False
+
+        :rtype: list
+        :return: the k rows with the highest (lowest) values, ties in key id
+        order. Keys without a value in column are left out.
+        """
+        order, _ = self._sorted_column(column, largest)
+        return [self._record(position) for position in order[:k].tolist()]
+
+    def where(self, column, minimum=None, maximum=None):
+        """
+        :param str column: one of COLUMNS
+        :param float minimum: lowest value (inclusive), None for no bound
+        :param float maximum: highest value (inclusive), None for no bound
+
+        :rtype: list
+        :return: rows with a value in [minimum, maximum], by increasing value
+        """
+        order, values = self._sorted_column(column, largest=False)
+        start = 0 if minimum is None else np.searchsorted(values, minimum, side='left')
+        end = len(values) if maximum is None else np.searchsorted(values, maximum, side='right')
+        return [self._record(position) for position in order[start:end].tolist()]
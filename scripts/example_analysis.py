@@ -1,6 +1,8 @@
 import sys
 import json
+import numpy as np
 import metrics as metrics
+from loader import load_columns
 
 def compute_ambiguity_metrics(mentions_to_links, l, data_totals, resource_totals):
     """
@@ -59,50 +61,26 @@ def extract_jsons(filename):
     """
     This function creates two json structures: 1) JSON which counts and groups the meanings of a LE, and 2) JSON which counts and groups the LEs for a meaning.
     """
+    columns=load_columns(filename)
+    # decode each vocabulary item once, the dicts below share the strings
+    les=columns.les.tolist()
+    meanings=columns.meanings.tolist()
+
     sf_to_links={}
     links_to_sf={}
-    sf_data_totals={}
-    sf_resource_totals={}
-    links_data_totals={}
-    links_resource_totals={}
-    o_l={}
-    o_m={}
-    dates=[]
-    single_sf=0
-    with open(filename,'r') as tsvin:
-        for line in tsvin:
-            row=line.strip().split('\t')
-            if len(row)==6:
-                    # FOR AMBIGUITY
-                    if row[1] not in sf_to_links:
-                        sf_to_links[row[1]]={row[2]:1}
-                    elif row[2] in sf_to_links[row[1]]:
-                        sf_to_links[row[1]][row[2]]+=1
-                    else:
-                        sf_to_links[row[1]][row[2]]=1
-                    if row[1] not in sf_data_totals:
-                        sf_data_totals[row[1]]=1
-                    else:
-                        sf_data_totals[row[1]]+=1
-                    if row[4].lower()!="none":
-                        sf_resource_totals[row[1]]=int(row[4])
-                    
-                    # FOR VARIANCE
-                    if row[2] not in links_to_sf:
-                        links_to_sf[row[2]]={row[1]:1}
-                    elif row[1] in links_to_sf[row[2]]:
-                        links_to_sf[row[2]][row[1]]+=1
-                    else:
-                        links_to_sf[row[2]][row[1]]=1
-                    if row[2] not in links_data_totals:
-                        links_data_totals[row[2]]=1
-                    else:
-                        links_data_totals[row[2]]+=1
-                    if row[5].lower()!="none":
-                        links_resource_totals[row[2]]=int(row[5])
+    matrix=columns.count_matrix()
+    for le_id, m_id, count in zip(matrix.rows.tolist(), matrix.cols.tolist(), matrix.counts.tolist()):
+        # FOR AMBIGUITY
+        sf_to_links.setdefault(les[le_id], {})[meanings[m_id]]=count
+        # FOR VARIANCE
+        links_to_sf.setdefault(meanings[m_id], {})[les[le_id]]=count
 
-                    if row[3].lower()!="none":
-                        dates.append(row[3])
+    sf_data_totals=dict(zip(les, np.bincount(columns.le_ids, minlength=len(les)).tolist()))
+    links_data_totals=dict(zip(meanings, np.bincount(columns.m_ids, minlength=len(meanings)).tolist()))
+    sf_resource_totals=columns.resource_ambiguity()
+    links_resource_totals=columns.resource_variance()
+
+    dates=np.datetime_as_string(columns.dated()).tolist()
 
     return sf_to_links, links_to_sf, sf_data_totals, links_data_totals, sf_resource_totals, links_resource_totals, dates
 
@@ -115,8 +93,6 @@ if __name__ == "__main__":
     
     sf_to_links, links_to_sf, sf_data_totals, links_data_totals, sf_resource_totals, links_resource_totals, dates=extract_jsons(sys.argv[1])
 
-    print(sf_to_links)
-
     compute_ambiguity_metrics(sf_to_links, len(links_to_sf), sf_data_totals, sf_resource_totals)
     compute_variance_metrics(links_to_sf, len(sf_to_links), links_data_totals, links_resource_totals)
     if len(dates):
@@ -0,0 +1,381 @@
+"""
+mergeable count state for incremental analysis
+
+CountState keeps, per lexical expression and per meaning, the counts of
+the keys it co-occurs with, the statistics derived from them (observed
+ambiguity/variance, dominance, entropy) and integer running totals.
+Appending rows only recomputes the statistics of the keys the rows touch,
+so the cost of an update is proportional to the new rows, not to the
+corpus. The per-key statistics are kept in numpy arrays. A float mean is
+averaged over them when it is first read after an update, one metric at
+a time and in key order like metrics.DatasetMetrics, so it equals the
+metric of the whole corpus exactly instead of drifting with running
+float sums; it is cached until the next update. The state can be saved
+to and loaded from a compact snapshot.
+"""
+import datetime
+
+import numpy as np
+
+import metrics
+from loader import MISSING, is_none, parse_resource_value
+
+# metric -> (key table, statistic)
+_METRICS = {'moa': ('ambiguity', 'cardinality'),
+            'moda': ('ambiguity', 'dominance'),
+            'emnle': ('ambiguity', 'entropy'),
+            'rora': ('ambiguity', 'ratio'),
+            'mov': ('variance', 'cardinality'),
+            'modv': ('variance', 'dominance'),
+            'elenm': ('variance', 'entropy'),
+            'rorv': ('variance', 'ratio')}
+
+
+class _KeyTable:
+    """
+    counts and statistics for one direction: lexical expression ->
+    meanings (ambiguity) or meaning -> lexical expressions (variance)
+
+    the statistics are numpy arrays with spare capacity, only their first
+    n_keys entries are used
+    """
+
+    STATISTICS = ('cardinality', 'dominance', 'entropy', 'ratio')
+
+    def __init__(self, ignore_theoretical_one=True):
+        self.ignore_theoretical_one = ignore_theoretical_one
+        self.counts = []
+        self.resources = np.zeros(0, dtype=np.int64)
+        self.cardinality = np.zeros(0, dtype=np.int64)
+        self.dominance = np.zeros(0)
+        self.entropy = np.zeros(0)
+        self.totals = dict.fromkeys(('keys', 'cardinality'), 0)
+        self._means = {}
+
+    @property
+    def n_keys(self):
+        return len(self.counts)
+
+    def grow(self, n_keys):
+        if n_keys <= self.n_keys:
+            return
+        self.counts.extend({} for _ in range(n_keys - self.n_keys))
+        capacity = len(self.cardinality)
+        if n_keys > capacity:
+            capacity = max(n_keys, 2 * capacity)
+            self.resources = _resize(self.resources, capacity, MISSING)
+            self.cardinality = _resize(self.cardinality, capacity, 0)
+            self.dominance = _resize(self.dominance, capacity, 0.0)
+            self.entropy = _resize(self.entropy, capacity, 0.0)
+
+    def resource_values(self):
+        """
+        :rtype: list
+        :return: resource value per key (MISSING if not available)
+        """
+        return self.resources[:self.n_keys].tolist()
+
+    def add(self, key, other, count=1):
+        key_counts = self.counts[key]
+        key_counts[other] = key_counts.get(other, 0) + count
+
+    def refresh(self, keys):
+        """
+        recompute the statistics of keys and update the running totals
+        """
+        self._means.clear()
+        totals = self.totals
+        for key in keys:
+            if self.cardinality[key]:
+                totals['keys'] -= 1
+                totals['cardinality'] -= int(self.cardinality[key])
+
+            key_counts = self.counts[key]
+            if not key_counts:
+                continue
+            total = sum(key_counts.values())
+            distribution = [count / total for count in key_counts.values()]
+            self.cardinality[key] = len(key_counts)
+            self.dominance[key] = max(distribution)
+            self.entropy[key] = metrics.entropy(distribution, normalized=True)
+
+            totals['keys'] += 1
+            totals['cardinality'] += len(key_counts)
+
+    def mean(self, statistic):
+        """
+        :param str statistic: one of STATISTICS
+
+        :rtype: float
+        :return: mean of the statistic over the keys, cached until the next
+        refresh
+        """
+        if statistic not in self._means:
+            self._means[statistic] = self._mean(statistic)
+        return self._means[statistic]
+
+    def _mean(self, statistic):
+        totals = self.totals
+        if not totals['keys']:
+            return 0.0
+        if statistic == 'cardinality':
+            return totals['cardinality'] / totals['keys']
+        cardinality = self.cardinality[:self.n_keys]
+        if statistic == 'ratio':
+            return metrics._mean_ratio(cardinality, self.resources[:self.n_keys],
+                                       self.ignore_theoretical_one)
+        values = getattr(self, statistic)[:self.n_keys]
+        return metrics._mean(values[cardinality > 0])
+
+
+class CountState:
+    """
+    mergeable per-key count state of a dataset
+
+    >>> state = CountState()
+    >>> state.update([('1', 'bank', 'bank.n.1', 'None', '2', 'None'),
+    ...               ('2', 'bank', 'bank.n.2', 'None', '2', 'None')])
+    >>> state.moa, state.rora
+    (2.0, 1.0)
+    >>> state.update([('3', 'shore', 'bank.n.2', 'None', 'None', 'None')])
+    >>> state.moa, state.mov
+    (1.5, 1.5)
+
+    metrics are available as attributes (see metrics.DatasetMetrics.NAMES)
+    and equal those of the whole corpus, however it was split into updates:
+
+    >>> rows = [(str(i), 'le%d' % (i % 7), 'm%d' % (i % 11), 'None',
+    ...          str(i % 7 % 4), str(i % 11 % 3 + 1)) for i in range(200)]
+    >>> state = CountState()
+    >>> for start in range(0, 200, 9):
+    ...     state.update(rows[start:start + 9])
+    >>> corpus = metrics.CountMatrix.from_ids([i % 7 for i in range(200)],
+    ...                                       [i % 11 for i in range(200)], (7, 11))
+    >>> corpus = corpus.metrics(np.array([le % 4 for le in range(7)]),
+    ...                         np.array([m % 3 + 1 for m in range(11)]))
+    >>> [name for name in metrics.DatasetMetrics.NAMES[:-1]
+    ...  if getattr(state, name) != getattr(corpus, name)]
+    []
+    """
+
+    def __init__(self):
+        self.les = []
+        self.le_index = {}
+        self.meanings = []
+        self.m_index = {}
+        self.ambiguity = _KeyTable()
+        self.variance = _KeyTable()
+        self.first_date = None
+        self.last_date = None
+        self.n_rows = 0
+
+    @classmethod
+    def from_columns(cls, columns):
+        """
+        :param loader.Columns columns: a loaded corpus
+
+        :rtype: CountState
+        """
+        state = cls()
+        state.les = list(columns.les)
+        state.le_index = {le: le_id for le_id, le in enumerate(state.les)}
+        state.meanings = list(columns.meanings)
+        state.m_index = {m: m_id for m_id, m in enumerate(state.meanings)}
+        counts = columns.count_matrix()
+        state._add_counts(counts.rows.tolist(), counts.cols.tolist(),
+                          counts.counts.tolist(),
+                          columns.resource_ambiguity_column().tolist(),
+                          columns.resource_variance_column().tolist())
+        state._add_dates(columns.dated())
+        state.n_rows = len(columns)
+        return state
+
+    def _add_counts(self, le_ids, m_ids, counts, r_amb, r_var):
+        """
+        add pair counts and resource values given as lists, resource
+        values are indexed by key id (MISSING keeps the current value)
+        """
+        self._add_pairs(dict(zip(zip(le_ids, m_ids), counts)),
+                        {key: value for key, value in enumerate(r_amb)
+                         if value != MISSING},
+                        {key: value for key, value in enumerate(r_var)
+                         if value != MISSING})
+
+    def _add_dates(self, dates):
+        if not len(dates):
+            return
+        first, last = dates.min(), dates.max()
+        if self.first_date is None or first < self.first_date:
+            self.first_date = first
+        if self.last_date is None or last > self.last_date:
+            self.last_date = last
+
+    def update(self, rows):
+        """
+        add rows to the state
+
+        :param rows: iterable of rows with six fields (identifier, lexical
+        expression, meaning, document creation time, resource ambiguity,
+        resource variance), other rows are skipped
+        """
+        pairs = {}
+        r_amb = {}
+        r_var = {}
+        dates = set()
+        for row in rows:
+            if len(row) != 6:
+                continue
+            iden, le, m, dct, ra, rv = row
+            le_id = self._intern(le, self.les, self.le_index)
+            m_id = self._intern(m, self.meanings, self.m_index)
+
+            pairs[le_id, m_id] = pairs.get((le_id, m_id), 0) + 1
+            ra = parse_resource_value(ra)
+            if ra != MISSING:
+                r_amb[le_id] = ra
+            rv = parse_resource_value(rv)
+            if rv != MISSING:
+                r_var[m_id] = rv
+            if not is_none(dct):
+                dates.add(dct.strip())
+            self.n_rows += 1
+
+        self._add_pairs(pairs, r_amb, r_var)
+        self._add_dates(np.array([datetime.datetime.strptime(date, '%Y-%m-%d').date()
+                                  for date in dates], dtype='datetime64[D]'))
+
+    def _intern(self, item, vocabulary, index):
+        item_id = index.setdefault(item, len(vocabulary))
+        if item_id == len(vocabulary):
+            vocabulary.append(item)
+        return item_id
+
+    def _add_pairs(self, pairs, r_amb, r_var):
+        self.ambiguity.grow(len(self.les))
+        self.variance.grow(len(self.meanings))
+        for (le_id, m_id), count in pairs.items():
+            self.ambiguity.add(le_id, m_id, count)
+            self.variance.add(m_id, le_id, count)
+        for table, values in ((self.ambiguity, r_amb), (self.variance, r_var)):
+            for key, value in values.items():
+                table.resources[key] = value
+        self.ambiguity.refresh({le_id for le_id, _ in pairs} | set(r_amb))
+        self.variance.refresh({m_id for _, m_id in pairs} | set(r_var))
+
+    def merge(self, other):
+        """
+        add the counts of another state, e.g. of a different part of the
+        same dataset. Resource values of other take precedence.
+
+        :param CountState other: state to merge into this one
+        """
+        le_map = [self._intern(le, self.les, self.le_index)
+                  for le in other.les]
+        m_map = [self._intern(m, self.meanings, self.m_index)
+                 for m in other.meanings]
+
+        pairs = {}
+        for le_id, m_counts in enumerate(other.ambiguity.counts):
+            for m_id, count in m_counts.items():
+                pairs[le_map[le_id], m_map[m_id]] = count
+        r_amb = {le_map[key]: value
+                 for key, value in enumerate(other.ambiguity.resource_values())
+                 if value != MISSING}
+        r_var = {m_map[key]: value
+                 for key, value in enumerate(other.variance.resource_values())
+                 if value != MISSING}
+        self._add_pairs(pairs, r_amb, r_var)
+        self._add_dates(np.array([date for date in (other.first_date,
+                                                    other.last_date)
+                                  if date is not None],
+                                 dtype='datetime64[D]'))
+        self.n_rows += other.n_rows
+
+    def __getattr__(self, name):
+        if name not in metrics.DatasetMetrics.NAMES:
+            raise AttributeError(name)
+        if name == 'dtr':
+            if self.first_date is None:
+                return []
+            return metrics.DTR(np.array([self.first_date, self.last_date]))
+        table, statistic = _METRICS[name]
+        return getattr(self, table).mean(statistic)
+
+    def as_dict(self):
+        """
+        :rtype: dict
+        :return: metric name -> value for all metrics
+        """
+        return {name: getattr(self, name) for name in metrics.DatasetMetrics.NAMES}
+
+    def save(self, path):
+        """
+        write a compressed snapshot of the state (numpy .npz)
+
+        :param str path: output path
+        """
+        le_ids, m_ids, counts = [], [], []
+        for le_id, m_counts in enumerate(self.ambiguity.counts):
+            le_ids.extend([le_id] * len(m_counts))
+            m_ids.extend(m_counts)
+            counts.extend(m_counts.values())
+        dates = np.array([date for date in (self.first_date, self.last_date)
+                          if date is not None], dtype='datetime64[D]')
+        les, le_lengths = _encode(self.les)
+        meanings, m_lengths = _encode(self.meanings)
+        np.savez_compressed(path,
+                            les=les,
+                            le_lengths=le_lengths,
+                            meanings=meanings,
+                            m_lengths=m_lengths,
+                            le_ids=np.array(le_ids, dtype=np.int64),
+                            m_ids=np.array(m_ids, dtype=np.int64),
+                            counts=np.array(counts, dtype=np.int64),
+                            r_amb=np.array(self.ambiguity.resource_values(), dtype=np.int64),
+                            r_var=np.array(self.variance.resource_values(), dtype=np.int64),
+                            dates=dates,
+                            n_rows=np.array(self.n_rows))
+
+    @classmethod
+    def load(cls, path):
+        """
+        :param str path: path of a snapshot written by save
+
+        :rtype: CountState
+        """
+        with np.load(path) as snapshot:
+            state = cls()
+            state.les = _decode(snapshot['les'], snapshot['le_lengths'])
+            state.le_index = {le: le_id for le_id, le in enumerate(state.les)}
+            state.meanings = _decode(snapshot['meanings'], snapshot['m_lengths'])
+            state.m_index = {m: m_id for m_id, m in enumerate(state.meanings)}
+            state._add_counts(snapshot['le_ids'].tolist(),
+                              snapshot['m_ids'].tolist(),
+                              snapshot['counts'].tolist(),
+                              snapshot['r_amb'].tolist(),
+                              snapshot['r_var'].tolist())
+            state._add_dates(snapshot['dates'])
+            state.n_rows = int(snapshot['n_rows'])
+        return state
+
+
+def _resize(values, capacity, fill):
+    resized = np.full(capacity, fill, dtype=values.dtype)
+    resized[:len(values)] = values
+    return resized
+
+
+def _encode(strings):
+    """
+    vocabulary as one utf-8 buffer plus the byte length of each item
+    """
+    encoded = [string.encode('utf-8') for string in strings]
+    return (np.frombuffer(b''.join(encoded), dtype=np.uint8),
+            np.array([len(item) for item in encoded], dtype=np.int64))
+
+
+def _decode(buffer, lengths):
+    data = buffer.tobytes()
+    ends = np.cumsum(lengths).tolist()
+    starts = [0] + ends[:-1]
+    return [data[start:end].decode('utf-8') for start, end in zip(starts, ends)]
@@ -0,0 +1,225 @@
+import datetime
+from array import array
+
+import numpy as np
+
+import metrics
+from store import (IDENTIFIER_PREFIX, MEANING_PREFIX, StringTable,
+                   StringTableBuilder)
+
+MISSING = -1
+NONE_VALUES = {'none', ''}
+
+
+class Columns:
+    """
+    columnar representation of a corpus in the six-column tsv format
+
+    lexical expressions and meanings are interned: each row only
+    stores integer ids, which index into the vocabularies (les, meanings).
+    Ids are assigned in order of first occurrence. The vocabularies and the
+    identifiers are store.StringTable objects, which keep shared prefixes
+    (URI namespaces, ili-30-, document names) once. Document creation times
+    are stored as a datetime64[D] column (NaT if missing), missing resource
+    values as MISSING.
+    """
+
+    def __init__(self, identifiers, les, meanings,
+                 le_ids, m_ids, creation_dates, r_amb, r_var):
+        self.identifiers = identifiers
+        self.les = les
+        self.meanings = meanings
+        self.le_ids = le_ids
+        self.m_ids = m_ids
+        self.creation_dates = creation_dates
+        self.r_amb = r_amb
+        self.r_var = r_var
+
+    def __len__(self):
+        return len(self.le_ids)
+
+    def dates(self):
+        """
+        :rtype: set
+        :return: set of document creation times (yyyy-mm-dd) observed in the corpus
+        """
+        return set(np.datetime_as_string(np.unique(self.dated())).tolist())
+
+    def dated(self):
+        """
+        :rtype: numpy.ndarray
+        :return: the creation dates of all rows that have one
+        """
+        return self.creation_dates[~np.isnat(self.creation_dates)]
+
+    def resource_ambiguity(self):
+        """
+        :rtype: dict
+        :return: lexical expression -> resource ambiguity
+        (last value in the corpus)
+        """
+        return _to_dict(self.resource_ambiguity_column(), self.les)
+
+    def resource_variance(self):
+        """
+        :rtype: dict
+        :return: meaning -> resource variance (last value in the corpus)
+        """
+        return _to_dict(self.resource_variance_column(), self.meanings)
+
+    def resource_ambiguity_column(self):
+        """
+        :rtype: numpy.ndarray
+        :return: resource ambiguity per lexical expression id
+        (MISSING if not available)
+        """
+        return _last_values(self.le_ids, self.r_amb, len(self.les))
+
+    def resource_variance_column(self):
+        """
+        :rtype: numpy.ndarray
+        :return: resource variance per meaning id (MISSING if not available)
+        """
+        return _last_values(self.m_ids, self.r_var, len(self.meanings))
+
+    @property
+    def nbytes(self):
+        """
+        :rtype: int
+        :return: approximate size of the columns in bytes
+        """
+        return (self.identifiers.nbytes + self.les.nbytes + self.meanings.nbytes +
+                sum(column.nbytes for column in (self.le_ids, self.m_ids,
+                                                 self.creation_dates,
+                                                 self.r_amb, self.r_var)))
+
+    def count_matrix(self):
+        """
+        :rtype: metrics.CountMatrix
+        :return: lexical expression x meaning co-occurrence counts
+        """
+        return metrics.CountMatrix.from_ids(self.le_ids, self.m_ids,
+                                            (len(self.les), len(self.meanings)))
+
+
+def _last_values(ids, values, size):
+    """
+    map each key id to the last non-missing value it was observed with
+    """
+    mask = values != MISSING
+    ids = ids[mask][::-1]
+    values = values[mask][::-1]
+    unique_ids, index = np.unique(ids, return_index=True)
+    column = np.full(size, MISSING, dtype=np.int64)
+    column[unique_ids] = values[index]
+    return column
+
+
+def _to_dict(column, vocabulary):
+    """
+    map vocabulary items to their non-missing values in column
+    """
+    key_ids = np.flatnonzero(column != MISSING)
+    return {vocabulary[key]: value
+            for key, value in zip(key_ids.tolist(),
+                                  column[key_ids].tolist())}
+
+
+def is_none(value):
+    """
+    missing values are 'None' in any case, or empty
+
+    >>> is_none('NONE'), is_none(' none'), is_none('4')
+    (True, True, False)
+    """
+    return value.strip().lower() in NONE_VALUES
+
+
+def parse_resource_value(value):
+    """
+    >>> parse_resource_value('4')
+    4
+    >>> parse_resource_value('none')
+    -1
+    """
+    if is_none(value):
+        return MISSING
+    return int(value)
+
+
+def parse_dates(date_values, date_ids):
+    """
+    parse interned dates, each distinct date string is parsed once
+
+    >>> np.datetime_as_string(parse_dates(['2015-1-26', '2013-08-12'], np.array([0, -1, 1, 0]))).tolist()
+    ['2015-01-26', 'NaT', '2013-08-12', '2015-01-26']
+
+    :param list date_values: distinct date strings (yyyy-mm-dd)
+    :param numpy.ndarray date_ids: index into date_values per row, MISSING if none
+
+    :rtype: numpy.ndarray
+    :return: datetime64[D] column
+    """
+    parsed = np.array([datetime.datetime.strptime(value, '%Y-%m-%d').date()
+                       for value in date_values] + [None],
+                      dtype='datetime64[D]')
+    # MISSING (-1) selects the trailing NaT
+    return parsed[date_ids]
+
+
+def load_columns(corpus_path):
+    """
+    load a corpus in tsv format into interned columns
+
+    :param str corpus_path: path to corpus in tsv format
+    1. identifier
+    2. lexical expression
+    3. meaning
+    4. [if available] document creation time
+    5. [if available] resource ambiguity
+    6. [if available] resource variance
+
+    rows that do not consist of six fields are skipped.
+
+    :rtype: Columns
+    :return: the corpus as columns of integer ids
+    """
+    identifiers = StringTableBuilder(IDENTIFIER_PREFIX)
+    le_index = {}
+    m_index = {}
+    date_index = {}
+    le_ids = array('q')
+    m_ids = array('q')
+    date_ids = array('q')
+    r_amb = array('q')
+    r_var = array('q')
+
+    with open(corpus_path, encoding='utf-8') as infile:
+        for line in infile:
+            try:
+                iden, le, m, dct, ra, rv = line.strip().split('\t')
+            except ValueError:
+                continue
+
+            identifiers.append(iden)
+            le_ids.append(le_index.setdefault(le, len(le_index)))
+            m_ids.append(m_index.setdefault(m, len(m_index)))
+
+            dct = dct.strip()
+            if is_none(dct):
+                date_ids.append(MISSING)
+            else:
+                date_ids.append(date_index.setdefault(dct, len(date_index)))
+
+            r_amb.append(parse_resource_value(ra))
+            r_var.append(parse_resource_value(rv))
+
+    return Columns(identifiers.build(),
+                   StringTable.from_strings(le_index),
+                   StringTable.from_strings(m_index, MEANING_PREFIX),
+                   np.frombuffer(le_ids, dtype=np.int64),
+                   np.frombuffer(m_ids, dtype=np.int64),
+                   parse_dates(list(date_index),
+                               np.frombuffer(date_ids, dtype=np.int64)),
+                   np.frombuffer(r_amb, dtype=np.int64),
+                   np.frombuffer(r_var, dtype=np.int64))
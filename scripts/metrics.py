@@ -1,6 +1,9 @@
 import datetime
+from functools import cached_property
 from math import *
 
+import numpy as np
+
 def MOA(o_l):
     '''
     Mean Observed Ambiguity (MOA)
@@ -325,15 +328,369 @@ def DTR(dates):
 
     where :math:`date_{doc}` is the publishing date of a document.
 
-    :param list dates: list of dates (e.g. '2015-1-26')
+    :param list dates: list of dates (e.g. '2015-1-26'), or a numpy datetime64 array (NaT values are ignored)
 
     >>> DTR(['2015-1-28','2015-1-26', '2013-8-12', '2014-3-2'])
     [datetime.datetime(2013, 8, 12, 0, 0), datetime.datetime(2015, 1, 28, 0, 0)]
+    >>> DTR(np.array(['2015-01-28', 'NaT', '2013-08-12'], dtype='datetime64[D]'))
+    [datetime.datetime(2013, 8, 12, 0, 0), datetime.datetime(2015, 1, 28, 0, 0)]
 
     :rtype: list
     :return: list of two datetime values, denoting the earliest and the latest document publishing date
     '''
+    if isinstance(dates, np.ndarray) and np.issubdtype(dates.dtype, np.datetime64):
+        dates = dates[~np.isnat(dates)].astype('datetime64[D]')
+        if not len(dates):
+            return []
+        return [datetime.datetime.combine(date.item(), datetime.time())
+                for date in (dates.min(), dates.max())]
     if not len(dates):
         return []
-    dates_in_format =[datetime.datetime.strptime(date, "%Y-%m-%d") for date in dates]
+    dates_in_format =[datetime.datetime.strptime(date, "%Y-%m-%d") for date in set(dates)]
     return [min(dates_in_format), max(dates_in_format)]
+
+
+class CountMatrix:
+    '''
+    Sparse lexical expression x meaning co-occurrence count matrix in coordinate format.
+
+    Each distinct (lexical expression, meaning) pair is stored once, in order of its first
+    occurrence in the dataset, so that per-key statistics are accumulated in the same order
+    as the scalar functions above and the dataset metrics match them exactly.
+
+    >>> matrix = CountMatrix.from_ids([0, 0, 1, 0], [0, 1, 2, 0], (2, 3))
+    >>> matrix.counts.tolist()
+    [2, 1, 1]
+    >>> matrix.metrics().moa
+    1.5
+
+    :param numpy.ndarray rows: lexical expression id of each pair
+    :param numpy.ndarray cols: meaning id of each pair
+    :param numpy.ndarray counts: number of occurrences of each pair
+    :param tuple shape: (number of lexical expressions, number of meanings)
+    '''
+
+    def __init__(self, rows, cols, counts, shape):
+        self.rows = rows
+        self.cols = cols
+        self.counts = counts
+        self.shape = shape
+        self._key_index = None
+
+    @classmethod
+    def from_ids(cls, le_ids, m_ids, shape):
+        '''
+        count the (lexical expression, meaning) pairs of a dataset
+
+        :param le_ids: lexical expression id of each mention
+        :param m_ids: meaning id of each mention
+        :param tuple shape: (number of lexical expressions, number of meanings)
+
+        :rtype: CountMatrix
+        '''
+        le_ids = np.asarray(le_ids, dtype=np.int64)
+        m_ids = np.asarray(m_ids, dtype=np.int64)
+        n_m = max(shape[1], 1)
+        keys = le_ids * n_m + m_ids
+        unique_keys, first, counts = np.unique(keys,
+                                               return_index=True,
+                                               return_counts=True)
+        order = np.argsort(first, kind='stable')
+        matrix = cls(unique_keys[order] // n_m, unique_keys[order] % n_m, counts[order], shape)
+        positions = np.empty_like(order)
+        positions[order] = np.arange(len(order))
+        matrix._key_index = (n_m, unique_keys, positions)
+        return matrix
+
+    def key_index(self, n_m):
+        '''
+        :param int n_m: number of meanings the keys are computed with
+
+        :rtype: tuple
+        :return: (sorted pair keys le_id * n_m + m_id, position of each sorted key in this
+        matrix), built once and kept up to date by merge
+        '''
+        if self._key_index is None or self._key_index[0] != n_m:
+            keys = self.rows * n_m + self.cols
+            positions = np.argsort(keys, kind='stable')
+            self._key_index = (n_m, keys[positions], positions)
+        return self._key_index[1:]
+
+    def merge(self, other):
+        '''
+        add the counts of another matrix over the same vocabularies, pairs that only occur
+        in other are appended after the pairs of this matrix
+
+        The pairs of other are looked up in the sorted keys of this matrix, and its new keys
+        inserted into them, so that merging many small matrices into a large one (e.g. the
+        windows of a timeline) does not sort the accumulated keys again at every step.
+
+        >>> first = CountMatrix.from_ids([0, 1], [0, 0], (2, 1))
+        >>> merged = first.merge(CountMatrix.from_ids([1, 1], [0, 0], (2, 1)))
+        >>> merged.rows.tolist(), merged.counts.tolist()
+        ([0, 1], [1, 3])
+        >>> merged = merged.merge(CountMatrix.from_ids([1, 0, 1], [1, 0, 1], (2, 2)))
+        >>> merged.rows.tolist(), merged.cols.tolist(), merged.counts.tolist()
+        ([0, 1, 1], [0, 0, 1], [2, 3, 2])
+
+        :param CountMatrix other: counts to add
+
+        :rtype: CountMatrix
+        :return: a new matrix with the summed counts
+        '''
+        shape = (max(self.shape[0], other.shape[0]),
+                 max(self.shape[1], other.shape[1]))
+        n_m = max(shape[1], 1)
+        sorted_keys, positions = self.key_index(n_m)
+        other_keys = other.rows * n_m + other.cols
+        at = np.searchsorted(sorted_keys, other_keys)
+        found = at < len(sorted_keys)
+        found[found] = sorted_keys[at[found]] == other_keys[found]
+
+        # the keys of other are distinct, so every position is added to once
+        counts = self.counts.copy()
+        counts[positions[at[found]]] += other.counts[found]
+
+        new = np.flatnonzero(~found)
+        merged = CountMatrix(np.concatenate((self.rows, other.rows[new])),
+                             np.concatenate((self.cols, other.cols[new])),
+                             np.concatenate((counts, other.counts[new])),
+                             shape)
+        new_order = np.argsort(other_keys[new])
+        new_keys = other_keys[new][new_order]
+        insert_at = np.searchsorted(sorted_keys, new_keys)
+        merged._key_index = (n_m,
+                             np.insert(sorted_keys, insert_at, new_keys),
+                             np.insert(positions, insert_at, len(self.counts) + new_order))
+        return merged
+
+    def row_statistics(self):
+        '''
+        :rtype: tuple
+        :return: (observed ambiguity, dominance, normalized entropy) per lexical expression id
+        '''
+        return group_statistics(self.rows, self.counts, self.shape[0])
+
+    def col_statistics(self):
+        '''
+        :rtype: tuple
+        :return: (observed variance, dominance, normalized entropy) per meaning id
+        '''
+        return group_statistics(self.cols, self.counts, self.shape[1])
+
+    def row_cardinality(self):
+        '''
+        :rtype: numpy.ndarray
+        :return: observed ambiguity per lexical expression id
+        '''
+        return np.bincount(self.rows, minlength=self.shape[0])
+
+    def col_cardinality(self):
+        '''
+        :rtype: numpy.ndarray
+        :return: observed variance per meaning id
+        '''
+        return np.bincount(self.cols, minlength=self.shape[1])
+
+    def metrics(self, r_amb=None, r_var=None, dates=()):
+        '''
+        :param numpy.ndarray r_amb: resource ambiguity per lexical expression id (-1 if unknown)
+        :param numpy.ndarray r_var: resource variance per meaning id (-1 if unknown)
+        :param dates: document creation times, used for DTR
+
+        :rtype: DatasetMetrics
+        :return: lazily computed metrics of the dataset
+        '''
+        return DatasetMetrics(self, r_amb, r_var, dates)
+
+
+class DatasetMetrics:
+    '''
+    All metrics of a dataset, computed from its CountMatrix on first access and cached.
+    Only the statistics a metric needs are computed: MOA and MOV for instance only require
+    the number of distinct pairs per key.
+
+    >>> dataset = CountMatrix.from_ids([0, 0, 1], [0, 1, 1], (2, 2)).metrics()
+    >>> dataset.moa, dataset.mov
+    (1.5, 1.5)
+    >>> dataset.as_dict()['modv']
+    0.75
+    '''
+    NAMES = ('moa', 'moda', 'emnle', 'rora',
+             'mov', 'modv', 'elenm', 'rorv',
+             'dtr')
+
+    def __init__(self, counts, r_amb=None, r_var=None, dates=()):
+        self.counts = counts
+        self.r_amb = r_amb
+        self.r_var = r_var
+        self.dates = dates
+
+    @cached_property
+    def amb_cardinality(self):
+        return self.counts.row_cardinality()
+
+    @cached_property
+    def amb_statistics(self):
+        return self.counts.row_statistics()
+
+    @cached_property
+    def var_cardinality(self):
+        return self.counts.col_cardinality()
+
+    @cached_property
+    def var_statistics(self):
+        return self.counts.col_statistics()
+
+    @property
+    def amb_dominance(self):
+        return self.amb_statistics[1]
+
+    @property
+    def amb_entropy(self):
+        return self.amb_statistics[2]
+
+    @property
+    def var_dominance(self):
+        return self.var_statistics[1]
+
+    @property
+    def var_entropy(self):
+        return self.var_statistics[2]
+
+    @cached_property
+    def moa(self):
+        return _mean_cardinality(self.amb_cardinality)
+
+    @cached_property
+    def moda(self):
+        return _mean(self.amb_dominance[self.amb_dominance > 0])
+
+    @cached_property
+    def emnle(self):
+        return _mean(self.amb_entropy[self.amb_cardinality > 0])
+
+    @cached_property
+    def rora(self):
+        return _mean_ratio(self.amb_cardinality, self.r_amb)
+
+    @cached_property
+    def mov(self):
+        return _mean_cardinality(self.var_cardinality)
+
+    @cached_property
+    def modv(self):
+        return _mean(self.var_dominance[self.var_dominance > 0])
+
+    @cached_property
+    def elenm(self):
+        return _mean(self.var_entropy[self.var_cardinality > 0])
+
+    @cached_property
+    def rorv(self):
+        return _mean_ratio(self.var_cardinality, self.r_var)
+
+    @cached_property
+    def dtr(self):
+        return DTR(self.dates)
+
+    def as_dict(self):
+        '''
+        :rtype: dict
+        :return: metric name -> value for all metrics
+        '''
+        return {name: getattr(self, name) for name in self.NAMES}
+
+
+def group_statistics(groups, counts, n_groups):
+    '''
+    per group cardinality, maximum share and normalized entropy of a count distribution
+
+    >>> cardinality, dominance, entropy = group_statistics(np.array([0, 1, 0]), np.array([1, 3, 1]), 2)
+    >>> cardinality.tolist(), dominance.tolist(), entropy.tolist()
+    ([2, 1], [0.5, 1.0], [1.0, 0.0])
+
+    :param numpy.ndarray groups: group id of each count, ids range from 0 to n_groups - 1
+    :param numpy.ndarray counts: positive counts
+    :param int n_groups: number of groups, groups without counts get zero for all statistics
+
+    :rtype: tuple
+    :return: (cardinality, dominance, entropy) arrays indexed by group id
+    '''
+    order = np.argsort(groups, kind='stable')
+    counts = counts[order]
+    cardinality = np.bincount(groups, minlength=n_groups)
+    starts = np.zeros(n_groups, dtype=np.int64)
+    np.cumsum(cardinality[:-1], out=starts[1:])
+
+    present = cardinality > 0
+    totals = np.zeros(n_groups, dtype=np.int64)
+    maxima = np.zeros(n_groups, dtype=np.int64)
+    if len(counts):
+        totals[present] = np.add.reduceat(counts, starts[present])
+        maxima[present] = np.maximum.reduceat(counts, starts[present])
+    dominance = np.zeros(n_groups)
+    dominance[present] = maxima[present] / totals[present]
+
+    probs = counts / np.repeat(totals, cardinality)
+    terms = probs * _log2(probs)
+    entropy = -1.0 * _segment_sum(terms, starts, cardinality)
+    normalize = cardinality >= 2
+    entropy[normalize] = entropy[normalize] / _log2(cardinality[normalize])
+
+    return cardinality, dominance, np.abs(entropy)
+
+
+def _log2(values):
+    '''
+    log base 2 as computed by math.log, evaluated once per distinct value
+    '''
+    unique_values, inverse = np.unique(values, return_inverse=True)
+    logs = np.array([log(value, 2) for value in unique_values.tolist()])
+    return logs[inverse]
+
+
+def _segment_sum(values, starts, lengths):
+    '''
+    left-to-right sum of values[start:start + length] for every segment
+    '''
+    totals = np.zeros(len(starts))
+    if not len(values):
+        return totals
+    by_length = np.argsort(-lengths, kind='stable')
+    sorted_lengths = lengths[by_length]
+    for offset in range(sorted_lengths[0]):
+        active = by_length[:np.searchsorted(-sorted_lengths, -offset, side='left')]
+        totals[active] += values[starts[active] + offset]
+    return totals
+
+
+def _mean(values):
+    '''
+    left-to-right average of values, 0.0 if there are none
+    '''
+    if not len(values):
+        return 0.0
+    return float(np.add.accumulate(values)[-1]) / len(values)
+
+
+def _mean_cardinality(cardinality):
+    cardinality = cardinality[cardinality > 0]
+    if not len(cardinality):
+        return 0.0
+    return int(cardinality.sum()) / len(cardinality)
+
+
+def _mean_ratio(observed, resource, ignore_theoretical_one=True):
+    '''
+    array version of RORA and RORV
+    '''
+    if resource is None:
+        return 0.0
+    mask = (observed > 0) & (resource > 0)
+    if ignore_theoretical_one:
+        mask &= resource != 1
+    if not mask.any():
+        return 0.0
+    ratios = observed[mask] / resource[mask]
+    return (1.0 / len(ratios)) * float(np.add.accumulate(ratios)[-1])
@@ -0,0 +1,213 @@
+"""
+overlap and divergence between datasets
+
+every dataset is reduced to a Profile: sorted arrays of stable hashes of
+its lexical expressions, meanings and (lexical expression, meaning) pairs,
+plus the sense distribution P(meaning | expression) per pair. Overlaps of
+two profiles are merges of sorted arrays, and the Jensen-Shannon
+divergence of the sense distributions of their shared expressions is a
+grouped sum over the union of their pairs. Profiles are built and pairs of
+datasets compared in worker processes; the result is one .npz file with an
+N x N matrix per measure.
+
+Usage: python overlap.py [--datasets ../datasets] [--output overlap.npz] [--processes N]
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+import numpy as np
+
+from analysis import Analysis, DATASETS_DIR
+from resource_index import stable_hashes
+
+VOCABULARIES = ('les', 'meanings', 'pairs')
+MATRICES = (['%s_%s' % (vocabulary, measure) for vocabulary in VOCABULARIES
+             for measure in ('shared', 'jaccard')] + ['jsd', 'jsd_les'])
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+_profiles = None
+
+
+def pair_hashes(le_hashes, m_hashes):
+    """
+    combine the hashes of lexical expressions and meanings into pair hashes
+    """
+    with np.errstate(over='ignore'):
+        mixed = le_hashes.view(np.uint64) * _MIX + m_hashes.view(np.uint64)
+    return mixed.view(np.int64)
+
+
+class Profile:
+    """
+    hashed vocabularies and sense distributions of a dataset
+
+    :param str name: name of the dataset
+    :param numpy.ndarray les: sorted hashes of the lexical expressions
+    :param numpy.ndarray meanings: sorted hashes of the meanings
+    :param numpy.ndarray pairs: sorted hashes of the pairs
+    :param numpy.ndarray pair_les: lexical expression hash per pair
+    :param numpy.ndarray probabilities: P(meaning | expression) per pair
+    """
+
+    def __init__(self, name, les, meanings, pairs, pair_les, probabilities):
+        self.name = name
+        self.les = les
+        self.meanings = meanings
+        self.pairs = pairs
+        self.pair_les = pair_les
+        self.probabilities = probabilities
+
+    @classmethod
+    def from_analysis(cls, name, analysis):
+        """
+        :param str name: name of the dataset
+        :param analysis.Analysis analysis: the dataset
+
+        :rtype: Profile
+        """
+        le_hashes = stable_hashes(analysis.columns.les)
+        m_hashes = stable_hashes(analysis.columns.meanings)
+        counts = analysis.counts
+        totals = np.bincount(counts.rows, weights=counts.counts,
+                             minlength=len(le_hashes))
+        pairs = pair_hashes(le_hashes[counts.rows], m_hashes[counts.cols])
+        order = np.argsort(pairs)
+        return cls(name,
+                   np.unique(le_hashes[counts.rows]),
+                   np.unique(m_hashes[counts.cols]),
+                   pairs[order],
+                   le_hashes[counts.rows][order],
+                   (counts.counts / totals[counts.rows])[order])
+
+    @classmethod
+    def from_path(cls, path):
+        """
+        :param str path: dataset path, the file name is the name
+
+        :rtype: Profile
+        """
+        return cls.from_analysis(os.path.basename(path), Analysis(path))
+
+
+def overlap(first, second):
+    """
+    :param Profile first: a dataset
+    :param Profile second: another dataset
+
+    :rtype: dict
+    :return: number of shared items and Jaccard index per vocabulary
+    """
+    result = {}
+    for vocabulary in VOCABULARIES:
+        a, b = getattr(first, vocabulary), getattr(second, vocabulary)
+        shared = len(np.intersect1d(a, b, assume_unique=True))
+        union = len(a) + len(b) - shared
+        result[vocabulary + '_shared'] = shared
+        result[vocabulary + '_jaccard'] = shared / union if union else 0.0
+    return result
+
+
+def divergence(first, second):
+    """
+    Jensen-Shannon divergence (base 2) between the sense distributions of
+    the lexical expressions both datasets share, averaged over them
+
+    >>> first = Profile('a', np.array([1]), np.array([5, 6]), np.array([10, 11]),
+    ...                 np.array([1, 1]), np.array([0.5, 0.5]))
+    >>> second = Profile('b', np.array([1]), np.array([5]), np.array([10]),
+    ...                  np.array([1]), np.array([1.0]))
+    >>> round(divergence(first, second)[0], 4)
+    0.3113
+
+    :rtype: tuple
+    :return: (mean divergence, number of shared expressions), nan if none
+    """
+    shared = np.intersect1d(first.les, second.les, assume_unique=True)
+    if not len(shared):
+        return float('nan'), 0
+
+    keep_first = np.isin(first.pair_les, shared)
+    keep_second = np.isin(second.pair_les, shared)
+    pairs = np.concatenate((first.pairs[keep_first], second.pairs[keep_second]))
+    pair_les = np.concatenate((first.pair_les[keep_first], second.pair_les[keep_second]))
+    unique_pairs, first_index, inverse = np.unique(pairs, return_index=True,
+                                                   return_inverse=True)
+    inverse = inverse.ravel()
+    n_first = int(keep_first.sum())
+    p = np.zeros(len(unique_pairs))
+    q = np.zeros(len(unique_pairs))
+    np.add.at(p, inverse[:n_first], first.probabilities[keep_first])
+    np.add.at(q, inverse[n_first:], second.probabilities[keep_second])
+
+    mean = (p + q) / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terms = (np.where(p > 0, p * np.log2(p / mean), 0.0) +
+                 np.where(q > 0, q * np.log2(q / mean), 0.0))
+    le_index = np.searchsorted(shared, pair_les[first_index])
+    per_le = 0.5 * np.bincount(le_index, weights=terms, minlength=len(shared))
+    return float(per_le.mean()), len(shared)
+
+
+def _init(profiles):
+    global _profiles
+    _profiles = profiles
+
+
+def _compare(pair):
+    i, j = pair
+    result = overlap(_profiles[i], _profiles[j])
+    result['jsd'], result['jsd_les'] = divergence(_profiles[i], _profiles[j])
+    return i, j, result
+
+
+def matrix(paths, processes=None):
+    """
+    compare every pair of datasets
+
+    :param list paths: dataset paths
+    :param int processes: number of worker processes (None: all cores)
+
+    :rtype: dict
+    :return: 'names' and an N x N matrix per name in MATRICES
+    """
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        profiles = list(executor.map(Profile.from_path, paths))
+    n = len(profiles)
+    result = {'names': np.array([profile.name for profile in profiles])}
+    for name in MATRICES:
+        result[name] = np.zeros((n, n))
+    for i, profile in enumerate(profiles):
+        for vocabulary in VOCABULARIES:
+            result[vocabulary + '_shared'][i, i] = len(getattr(profile, vocabulary))
+            result[vocabulary + '_jaccard'][i, i] = 1.0
+        result['jsd_les'][i, i] = len(profile.les)
+
+    pairs = list(combinations(range(n), 2))
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init,
+                             initargs=(profiles,)) as executor:
+        for i, j, values in executor.map(_compare, pairs,
+                                         chunksize=max(1, len(pairs) // 64)):
+            for name, value in values.items():
+                result[name][i, j] = result[name][j, i] = value
+    return result
+
+
+if __name__ == '__main__':
+    from batch import discover
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--datasets', default=DATASETS_DIR,
+                        help='directory with TASK___NAME files')
+    parser.add_argument('--output', default='overlap.npz',
+                        help='path of the matrices (numpy .npz)')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='number of worker processes (default: all cores)')
+    args = parser.parse_args()
+
+    result = matrix(discover(args.datasets), args.processes)
+    np.savez_compressed(args.output, **result)
+    print('wrote %d x %d matrices (%s) to %s'
+          % (len(result['names']), len(result['names']),
+             ', '.join(MATRICES), args.output))
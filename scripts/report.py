@@ -0,0 +1,193 @@
+"""
+metric report for one or many datasets, as JSON or CSV, with the wall time
+and peak memory of every stage (parse, resource_join, aggregate, metrics)
+
+Usage: python report.py [DATASET ...] [--format json|csv] [--output PATH]
+                        [--processes N] [--resources INDEX_DIR] [--cached]
+                        [--no-memory]
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+from batch import SEPARATOR, METRICS, discover
+from columns_cache import load_cached
+from loader import load_columns
+from resource_index import ResourceIndex
+
+STAGES = ('parse', 'resource_join', 'aggregate', 'metrics')
+
+
+class StageTimer:
+    """
+    wall time and peak traced memory (tracemalloc) per stage
+
+    >>> timer = StageTimer()
+    >>> with timer.stage('parse'):
+    ...     data = list(range(1000))
+    >>> sorted(timer.stages['parse'])
+    ['peak_bytes', 'seconds']
+
+    :param bool trace_memory: trace allocations; peak_bytes is None if
+    False. Tracing slows down pure Python stages such as parsing.
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        started_tracing = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            peak = None
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1] - baseline
+                if started_tracing:
+                    tracemalloc.stop()
+            self.stages[name] = {'seconds': seconds, 'peak_bytes': peak}
+
+
+def report(path, cached=False, resources=None, trace_memory=True):
+    """
+    compute all metrics of a dataset, stage by stage
+
+    :param str path: path to dataset named TASK___NAME
+    :param bool cached: load the dataset from its binary cache
+    (see columns_cache) instead of parsing the tsv
+    :param str resources: directory of a resource_index.ResourceIndex, whose
+    values replace the resource columns of the dataset
+    :param bool trace_memory: see StageTimer
+
+    :rtype: dict
+    :return: dataset, task, rows, metrics (name -> value), stages
+    (name -> seconds and peak_bytes) and rows_per_second
+    """
+    timer = StageTimer(trace_memory)
+    tracing = trace_memory and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    try:
+        with timer.stage('parse'):
+            columns = load_cached(path) if cached else load_columns(path)
+        if resources is not None:
+            with timer.stage('resource_join'):
+                columns = ResourceIndex.load(resources).apply(columns)
+        with timer.stage('aggregate'):
+            counts = columns.count_matrix()
+        with timer.stage('metrics'):
+            values = counts.metrics(columns.resource_ambiguity_column(),
+                                    columns.resource_variance_column(),
+                                    columns.creation_dates).as_dict()
+    finally:
+        if tracing:
+            tracemalloc.stop()
+
+    name = os.path.basename(path)
+    task, dataset = name.split(SEPARATOR, 1) if SEPARATOR in name else ('', name)
+    dtr = values.pop('dtr')
+    values['dtr_start'] = dtr[0].date().isoformat() if dtr else None
+    values['dtr_end'] = dtr[1].date().isoformat() if dtr else None
+    seconds = sum(stage['seconds'] for stage in timer.stages.values())
+    return {'dataset': dataset,
+            'task': task,
+            'rows': len(columns),
+            'metrics': values,
+            'stages': timer.stages,
+            'rows_per_second': len(columns) / seconds if seconds else None}
+
+
+def _report(args):
+    path, kwargs = args
+    return report(path, **kwargs)
+
+
+def run(paths, processes=1, **kwargs):
+    """
+    report on several datasets, in worker processes if processes != 1
+
+    :param list paths: dataset paths
+    :param int processes: number of worker processes (None: all cores)
+    :param kwargs: passed on to report
+
+    :rtype: list
+    """
+    tasks = [(path, kwargs) for path in paths]
+    if processes == 1:
+        return [_report(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(_report, tasks))
+
+
+def flatten(record):
+    """
+    one CSV row per dataset: metrics as columns, stages as
+    <stage>_seconds and <stage>_peak_bytes
+    """
+    row = {'task': record['task'], 'dataset': record['dataset'],
+           'rows': record['rows'], 'rows_per_second': record['rows_per_second']}
+    row.update(record['metrics'])
+    for stage in STAGES:
+        values = record['stages'].get(stage, {})
+        row[stage + '_seconds'] = values.get('seconds')
+        row[stage + '_peak_bytes'] = values.get('peak_bytes')
+    return row
+
+
+def write_csv(records, outfile):
+    fieldnames = (['task', 'dataset', 'rows', 'rows_per_second'] + METRICS +
+                  ['dtr_start', 'dtr_end'] +
+                  ['%s_%s' % (stage, field) for stage in STAGES
+                   for field in ('seconds', 'peak_bytes')])
+    writer = csv.DictWriter(outfile, fieldnames=fieldnames)
+    writer.writeheader()
+    writer.writerows(flatten(record) for record in records)
+
+
+def write_json(records, outfile):
+    json.dump(records, outfile, indent=2)
+    outfile.write('\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('datasets', nargs='*',
+                        help='dataset paths (default: all datasets)')
+    parser.add_argument('--format', choices=('json', 'csv'), default='json')
+    parser.add_argument('--output', default=None,
+                        help='output path (default: stdout)')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='number of worker processes (0: all cores)')
+    parser.add_argument('--resources', default=None,
+                        help='resource index directory, see resource_index.py')
+    parser.add_argument('--cached', action='store_true',
+                        help='load datasets from their binary cache')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='do not trace memory (faster, no peak_bytes)')
+    args = parser.parse_args()
+
+    records = run(args.datasets or discover(), args.processes or None,
+                  cached=args.cached, resources=args.resources,
+                  trace_memory=not args.no_memory)
+    write = write_json if args.format == 'json' else write_csv
+    if args.output is None:
+        write(records, sys.stdout)
+    else:
+        with open(args.output, 'w', newline='') as outfile:
+            write(records, outfile)
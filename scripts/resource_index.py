@@ -0,0 +1,221 @@
+"""
+resource ambiguity and variance from a lexicon
+
+a ResourceIndex is built once from a lexicon dump with one (lexical
+expression, meaning) pair per line, e.g. lemma and synset of WordNet or
+anchor text and entity of DBpedia. It maps every lexical expression to its
+number of senses (resource ambiguity) and every meaning to its number of
+lexicalizations (resource variance). Keys are stored as sorted arrays of
+stable 64-bit hashes, so lookups are binary searches on memory-mapped
+arrays, and the whole vocabulary of a dataset is joined in one call.
+
+Usage: python resource_index.py lexicon.tsv index_dir [--le-column 0] [--m-column 1]
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+
+import numpy as np
+
+from loader import MISSING, Columns
+
+VERSION = 1
+# hashes of a (lexical expression, meaning) pair
+PAIR = np.dtype([('le', np.int64), ('m', np.int64)])
+
+
+def stable_hashes(strings):
+    """
+    64-bit hashes that are the same in every process and run, unlike hash()
+
+    >>> stable_hashes(['bank', 'bank', 'shore']).tolist() == stable_hashes(['bank', 'bank', 'shore']).tolist()
+    True
+
+    :param strings: iterable of strings
+
+    :rtype: numpy.ndarray
+    :return: int64 hash per string
+    """
+    digests = b''.join(hashlib.blake2b(string.encode('utf-8'), digest_size=8).digest()
+                       for string in strings)
+    return np.frombuffer(digests, dtype='<i8').astype(np.int64)
+
+
+def _count_keys(hashes):
+    keys, counts = np.unique(hashes, return_counts=True)
+    return keys, counts.astype(np.int64)
+
+
+def _lookup(keys, counts, hashes):
+    if not len(keys):
+        return np.full(len(hashes), MISSING, dtype=np.int64)
+    positions = np.minimum(np.searchsorted(keys, hashes), len(keys) - 1)
+    found = keys[positions] == hashes
+    return np.where(found, counts[positions], MISSING)
+
+
+class ResourceIndex:
+    """
+    lexical expression -> number of senses, meaning -> number of
+    lexicalizations
+
+    >>> index = ResourceIndex.build([('bank', 'bank.n.1'), ('bank', 'bank.n.2'),
+    ...                              ('depository', 'bank.n.2'), ('bank', 'bank.n.1')])
+    >>> index.senses('bank'), index.lexicalizations('bank.n.2'), index.senses('shore')
+    (2, 2, -1)
+    >>> index = ResourceIndex.build([('bank', 'bank.n.1'), ('bank', 'bank.n.2'),
+    ...                              ('depository', 'bank.n.2'), ('bank', 'bank.n.1')], chunksize=1)
+    >>> index.senses('bank'), index.lexicalizations('bank.n.2'), index.senses('shore')
+    (2, 2, -1)
+
+    an index written by another version is rejected
+
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     index.save(directory)
+    ...     with open(os.path.join(directory, 'manifest.json'), 'w') as outfile:
+    ...         json.dump({'version': 0}, outfile)
+    ...     ResourceIndex.load(directory)  # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+    ...
+    ValueError: ... resource index version 0, expected 1, rebuild it
+
+    :param numpy.ndarray le_keys: sorted hashes of the lexical expressions
+    :param numpy.ndarray le_counts: number of senses per lexical expression
+    :param numpy.ndarray m_keys: sorted hashes of the meanings
+    :param numpy.ndarray m_counts: number of lexicalizations per meaning
+    """
+
+    def __init__(self, le_keys, le_counts, m_keys, m_counts):
+        self.le_keys = le_keys
+        self.le_counts = le_counts
+        self.m_keys = m_keys
+        self.m_counts = m_counts
+
+    @classmethod
+    def build(cls, pairs, chunksize=100000):
+        """
+        :param pairs: iterable of (lexical expression, meaning), duplicate
+        pairs are counted once. The pairs are hashed as they stream in, so
+        only the hashes of the distinct pairs are kept in memory.
+        :param int chunksize: number of pairs hashed at a time
+
+        :rtype: ResourceIndex
+        """
+        pairs = iter(pairs)
+        chunks = []
+        while True:
+            chunk = list(itertools.islice(pairs, chunksize))
+            if not chunk:
+                break
+            hashed = np.empty(len(chunk), dtype=PAIR)
+            hashed['le'] = stable_hashes(le for le, _ in chunk)
+            hashed['m'] = stable_hashes(m for _, m in chunk)
+            chunks.append(np.unique(hashed))
+        hashed = np.unique(np.concatenate(chunks)) if chunks else np.empty(0, dtype=PAIR)
+        return cls(*_count_keys(hashed['le']), *_count_keys(hashed['m']))
+
+    @classmethod
+    def from_file(cls, path, le_column=0, m_column=1):
+        """
+        :param str path: lexicon dump in tsv format
+        :param int le_column: column of the lexical expressions
+        :param int m_column: column of the meanings
+
+        :rtype: ResourceIndex
+        """
+        def pairs():
+            with open(path, encoding='utf-8') as infile:
+                for line in infile:
+                    fields = line.rstrip('\n').split('\t')
+                    if len(fields) > max(le_column, m_column):
+                        yield fields[le_column], fields[m_column]
+        return cls.build(pairs())
+
+    def save(self, directory):
+        """
+        :param str directory: output directory (created if needed)
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in ('le_keys', 'le_counts', 'm_keys', 'm_counts'):
+            np.save(os.path.join(directory, name + '.npy'), getattr(self, name))
+        with open(os.path.join(directory, 'manifest.json'), 'w', encoding='utf-8') as outfile:
+            json.dump({'version': VERSION,
+                       'lexical_expressions': len(self.le_keys),
+                       'meanings': len(self.m_keys)}, outfile)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """
+        :param str directory: directory written by save
+        :param bool mmap: memory-map the arrays instead of reading them
+
+        :rtype: ResourceIndex
+        :raises ValueError: if the index was written by another version
+        """
+        with open(os.path.join(directory, 'manifest.json'), encoding='utf-8') as infile:
+            version = json.load(infile).get('version')
+        if version != VERSION:
+            raise ValueError('%s: resource index version %s, expected %s, rebuild it'
+                             % (directory, version, VERSION))
+        mmap_mode = 'r' if mmap else None
+        return cls(*[np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode)
+                     for name in ('le_keys', 'le_counts', 'm_keys', 'm_counts')])
+
+    def senses(self, le):
+        """
+        :rtype: int
+        :return: resource ambiguity of le, MISSING if not in the lexicon
+        """
+        return int(_lookup(self.le_keys, self.le_counts, stable_hashes([le]))[0])
+
+    def lexicalizations(self, m):
+        """
+        :rtype: int
+        :return: resource variance of m, MISSING if not in the lexicon
+        """
+        return int(_lookup(self.m_keys, self.m_counts, stable_hashes([m]))[0])
+
+    def join(self, columns):
+        """
+        look up the whole vocabulary of a dataset
+
+        :param loader.Columns columns: loaded corpus
+
+        :rtype: tuple
+        :return: (resource ambiguity per lexical expression id, resource
+        variance per meaning id), MISSING for keys not in the lexicon
+        """
+        return (_lookup(self.le_keys, self.le_counts, stable_hashes(columns.les)),
+                _lookup(self.m_keys, self.m_counts, stable_hashes(columns.meanings)))
+
+    def apply(self, columns):
+        """
+        :param loader.Columns columns: loaded corpus
+
+        :rtype: loader.Columns
+        :return: the same corpus with the resource columns taken from the
+        index instead of the tsv
+        """
+        r_amb, r_var = self.join(columns)
+        return Columns(columns.identifiers, columns.les, columns.meanings,
+                       columns.le_ids, columns.m_ids, columns.creation_dates,
+                       r_amb[columns.le_ids], r_var[columns.m_ids])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('lexicon', help='lexicon dump in tsv format')
+    parser.add_argument('index', help='output directory')
+    parser.add_argument('--le-column', type=int, default=0,
+                        help='column of the lexical expressions')
+    parser.add_argument('--m-column', type=int, default=1,
+                        help='column of the meanings')
+    args = parser.parse_args()
+
+    index = ResourceIndex.from_file(args.lexicon, args.le_column, args.m_column)
+    index.save(args.index)
+    print('indexed %d lexical expressions and %d meanings'
+          % (len(index.le_keys), len(index.m_keys)))
@@ -0,0 +1,272 @@
+"""
+accuracy of system outputs stratified by dataset metrics
+
+predictions of a system are joined on the identifier (column 1) to a gold
+dataset, and accuracy is reported overall and per bucket of the observed
+ambiguity, dominance, entropy and resource ratio of the lexical expression
+of each mention. A mention is an identifier: rows that share one (several
+gold meanings) are scored once, and the prediction is correct if it is
+any of the gold meanings of the identifier. Strata are computed once per
+dataset and shared by all systems; counting per bucket is a bincount.
+
+Predictions are tsv files with the identifier and the predicted meaning,
+one directory per system, one file per dataset named like the dataset:
+
+    predictions/<system>/WSD___SE2-AW
+
+Usage: python scoring.py PREDICTIONS_DIR [--datasets ../datasets]
+                         [--output scores.tsv] [--processes N]
+"""
+import argparse
+import csv
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from analysis import Analysis, DATASETS_DIR
+
+STRATA = ('ambiguity', 'dominance', 'entropy', 'ratio')
+BINS = {'dominance': [0.0, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0],
+        'entropy': [0.0, 0.2, 0.4, 0.6, 0.8, 1.0],
+        'ratio': [0.0, 0.25, 0.5, 0.75, 1.0]}
+HEADER = ['system', 'dataset', 'stratum', 'bucket', 'gold', 'attempted',
+          'correct', 'precision', 'recall']
+NO_PREDICTION = -1
+UNKNOWN_MEANING = -2
+
+
+def _bin_labels(edges):
+    labels = ['<%s' % edges[0]]
+    labels += ['[%s, %s)' % (low, high) for low, high in zip(edges[:-2], edges[1:-1])]
+    labels += ['[%s, %s]' % (edges[-2], edges[-1]), '>%s' % edges[-1]]
+    return labels
+
+
+def bucketize(values, edges):
+    """
+    bucket index per value, the last bin includes its upper edge
+
+    >>> bucketize(np.array([0.3, 0.5, 1.0, np.nan]), [0.0, 0.5, 1.0]).tolist()
+    [1, 2, 2, 4]
+
+    :param numpy.ndarray values: values, nan for no value
+    :param list edges: increasing bin edges
+
+    :rtype: numpy.ndarray
+    :return: 0 below the first edge, len(edges) above the last one,
+    len(edges) + 1 for nan
+    """
+    buckets = np.digitize(values, edges)
+    buckets[values == edges[-1]] = len(edges) - 1
+    buckets[np.isnan(values)] = len(edges) + 1
+    return buckets
+
+
+def read_predictions(path):
+    """
+    :param str path: tsv file with identifier and predicted meaning
+
+    :rtype: dict
+    :return: identifier -> predicted meaning (the last one if repeated)
+    """
+    predictions = {}
+    with open(path, encoding='utf-8') as infile:
+        for line in infile:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) >= 2:
+                predictions[fields[0].strip()] = fields[1].strip()
+    return predictions
+
+
+class GoldStrata:
+    """
+    gold meanings and strata of every mention (identifier) of a dataset
+
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     path = os.path.join(directory, 'gold.tsv')
+    ...     with open(path, 'w') as outfile:
+    ...         _ = outfile.write('t1\\tbank\\tbank.n.1\\tNone\\t2\\tNone\\n'
+    ...                           't1\\tbank\\tbank.n.2\\tNone\\t2\\tNone\\n'
+    ...                           't2\\tbank\\tbank.n.1\\tNone\\t2\\tNone\\n')
+    ...     strata = GoldStrata(Analysis(path, cached=False))
+    >>> [(row['gold'], row['correct']) for row in strata.score({'t1': 'bank.n.2', 't2': 'bank.n.2'})][0]
+    (2, 1)
+
+    :param analysis.Analysis analysis: the gold dataset
+    :param int max_ambiguity: observed ambiguities from this value on are
+    one bucket
+    :param dict bins: stratum -> bin edges, see BINS
+    """
+
+    def __init__(self, analysis, max_ambiguity=5, bins=BINS):
+        columns = analysis.columns
+        self.gold = columns.m_ids
+        self.identifier_index = {}
+        self.identifier_ids = np.array([self.identifier_index.setdefault(identifier,
+                                                                         len(self.identifier_index))
+                                        for identifier in columns.identifiers],
+                                       dtype=np.int64)
+        self.m_index = {meaning: m_id for m_id, meaning in enumerate(columns.meanings)}
+        # identifier ids are numbered in order of first occurrence
+        self.first_rows = np.unique(self.identifier_ids, return_index=True)[1]
+        self.n_meanings = max(len(columns.meanings), 1)
+        self.gold_pairs = np.unique(self.identifier_ids * self.n_meanings + self.gold)
+
+        table = analysis.ambiguity_table
+        per_le = {}
+        for name in ('observed', 'dominance', 'entropy', 'ratio'):
+            values = np.full(len(columns.les), np.nan)
+            values[table.ids] = table.columns[name]
+            per_le[name] = values[columns.le_ids]
+
+        # the rows of an identifier share its lexical expression
+        per_le = {name: values[self.first_rows] for name, values in per_le.items()}
+        observed = np.minimum(per_le['observed'], max_ambiguity).astype(np.int64)
+        self.strata = {'ambiguity': (['%d' % value for value in range(1, max_ambiguity)] +
+                                     ['%d+' % max_ambiguity],
+                                     observed - 1)}
+        for stratum in ('dominance', 'entropy', 'ratio'):
+            edges = bins[stratum]
+            self.strata[stratum] = (_bin_labels(edges) + ['none'],
+                                    bucketize(per_le[stratum], edges))
+
+    def align(self, predictions):
+        """
+        :param dict predictions: identifier -> predicted meaning
+
+        :rtype: numpy.ndarray
+        :return: predicted meaning id per gold row, NO_PREDICTION if the row
+        has no prediction, UNKNOWN_MEANING if the meaning is not in the gold
+        vocabulary. Predictions for unknown identifiers are ignored; rows
+        that share an identifier (several gold meanings) all get its
+        prediction.
+        """
+        predicted = np.full(len(self.identifier_index), NO_PREDICTION, dtype=np.int64)
+        identifier_ids, m_ids = [], []
+        for identifier, meaning in predictions.items():
+            identifier_id = self.identifier_index.get(identifier)
+            if identifier_id is not None:
+                identifier_ids.append(identifier_id)
+                m_ids.append(self.m_index.get(meaning, UNKNOWN_MEANING))
+        predicted[identifier_ids] = m_ids
+        return predicted[self.identifier_ids]
+
+    def score(self, predictions):
+        """
+        :param dict predictions: identifier -> predicted meaning
+
+        :rtype: list
+        :return: one row per stratum and bucket with the number of gold
+        mentions (identifiers), attempted and correct mentions, precision
+        and recall; the first row is the overall score
+        """
+        return self.score_aligned(self.align(predictions))
+
+    def score_aligned(self, predicted):
+        """
+        :param numpy.ndarray predicted: predicted meaning id per gold row,
+        see align; the prediction of the first row of an identifier is its
+        prediction
+
+        :rtype: list
+        :return: see score
+        """
+        predicted = predicted[self.first_rows]
+        attempted = predicted != NO_PREDICTION
+        pairs = np.arange(len(predicted)) * self.n_meanings + predicted
+        correct = (predicted >= 0) & np.isin(pairs, self.gold_pairs)
+
+        rows = [_score_row('all', 'all', len(predicted), attempted.sum(), correct.sum())]
+        for stratum in STRATA:
+            labels, buckets = self.strata[stratum]
+            gold = np.bincount(buckets, minlength=len(labels))
+            n_attempted = np.bincount(buckets, weights=attempted, minlength=len(labels))
+            n_correct = np.bincount(buckets, weights=correct, minlength=len(labels))
+            rows.extend(_score_row(stratum, label, gold[bucket], n_attempted[bucket],
+                                   n_correct[bucket])
+                        for bucket, label in enumerate(labels) if gold[bucket])
+        return rows
+
+
+def _score_row(stratum, bucket, gold, attempted, correct):
+    gold, attempted, correct = int(gold), int(attempted), int(correct)
+    return {'stratum': stratum, 'bucket': bucket, 'gold': gold,
+            'attempted': attempted, 'correct': correct,
+            'precision': correct / attempted if attempted else 0.0,
+            'recall': correct / gold if gold else 0.0}
+
+
+def score_dataset(task):
+    """
+    score all systems on one dataset
+
+    :param tuple task: (dataset path, {system: predictions path})
+
+    :rtype: list
+    """
+    path, systems = task
+    strata = GoldStrata(Analysis(path))
+    dataset = os.path.basename(path)
+    rows = []
+    for system, predictions_path in sorted(systems.items()):
+        for row in strata.score(read_predictions(predictions_path)):
+            row.update(system=system, dataset=dataset)
+            rows.append(row)
+    return rows
+
+
+def discover_predictions(predictions_dir, datasets_dir=DATASETS_DIR):
+    """
+    :rtype: dict
+    :return: dataset path -> {system: predictions path}, for the datasets
+    that have predictions
+    """
+    tasks = {}
+    for system in sorted(os.listdir(predictions_dir)):
+        system_dir = os.path.join(predictions_dir, system)
+        if not os.path.isdir(system_dir):
+            continue
+        for name in os.listdir(system_dir):
+            dataset = os.path.join(datasets_dir, name)
+            if os.path.isfile(dataset):
+                tasks.setdefault(dataset, {})[system] = os.path.join(system_dir, name)
+    return tasks
+
+
+def run(tasks, processes=None):
+    """
+    :param dict tasks: see discover_predictions
+    :param int processes: number of worker processes, one dataset per task
+
+    :rtype: list
+    """
+    tasks = sorted(tasks.items())
+    if processes == 1:
+        results = [score_dataset(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(score_dataset, tasks))
+    return [row for rows in results for row in rows]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('predictions', help='directory with one directory per system')
+    parser.add_argument('--datasets', default=DATASETS_DIR,
+                        help='directory with the gold datasets')
+    parser.add_argument('--output', default=None,
+                        help='path of the tsv table (default: stdout)')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='number of worker processes (default: all cores)')
+    args = parser.parse_args()
+
+    rows = run(discover_predictions(args.predictions, args.datasets), args.processes)
+    outfile = sys.stdout if args.output is None else open(args.output, 'w', newline='')
+    writer = csv.DictWriter(outfile, fieldnames=HEADER, delimiter='\t')
+    writer.writeheader()
+    writer.writerows(rows)
+    if outfile is not sys.stdout:
+        outfile.close()
@@ -0,0 +1,233 @@
+"""
+compact storage of the strings and groupings of a corpus
+
+a StringTable stores a vocabulary (or any other column of strings) as one
+utf-8 buffer plus offsets instead of one Python string per item. Items are
+split into a shared prefix and a suffix, so that e.g. the
+'http://dbpedia.org/resource/' of DBpedia URIs or the 'ili-30-' of
+interlingual index ids are stored once. GroupedIds maps each key to the
+values it occurs with, one per mention, as a single array of ids sorted
+by key. Ids and offsets are stored in the smallest integer type that holds
+them, a single prefix (e.g. of identifiers without document names) is not
+stored per item.
+"""
+import re
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+
+import numpy as np
+
+# URIs up to the last / or #, ili-<version>- of interlingual index ids
+MEANING_PREFIX = re.compile(r'^(?:.*[/#]|[a-z]+-\d+-)')
+# document part of identifiers: 'd013.' of 'd013.s001.t003', the document
+# name of MEANTIME identifiers ("('<document>', '<tokens>')")
+IDENTIFIER_PREFIX = re.compile(r'^[^.,]*[.,]')
+
+
+def _ids_dtype(size):
+    return np.int32 if size < 2 ** 31 else np.int64
+
+
+def _smallest_dtype(size):
+    """
+    >>> _smallest_dtype(255), _smallest_dtype(70000)
+    (dtype('uint8'), dtype('uint32'))
+    """
+    return np.min_scalar_type(max(size, 0))
+
+
+class StringTable:
+    """
+    read-only, prefix-compressed sequence of strings
+
+    >>> table = StringTable.from_strings(['http://dbpedia.org/resource/Paris',
+    ...                                   'http://dbpedia.org/resource/France',
+    ...                                   'ili-30-13686660-n'], MEANING_PREFIX)
+    >>> table[1], len(table), table.prefixes
+    ('http://dbpedia.org/resource/France', 3, ['http://dbpedia.org/resource/', 'ili-30-'])
+    >>> table.index('ili-30-13686660-n')
+    2
+
+    :param list prefixes: distinct prefixes
+    :param numpy.ndarray prefix_ids: index into prefixes per item
+    :param data: utf-8 encoded suffixes, concatenated (bytes or memoryview)
+    :param numpy.ndarray offsets: start of each suffix in data, plus the end
+    of the last one
+    """
+
+    def __init__(self, prefixes, prefix_ids, data, offsets):
+        self.prefixes = prefixes
+        self.prefix_ids = prefix_ids
+        self.data = data
+        self.offsets = offsets
+        self._order = None
+
+    @classmethod
+    def from_strings(cls, strings, pattern=None):
+        """
+        :param strings: iterable of strings
+        :param pattern: compiled regular expression, its match at the start
+        of an item is stored as the prefix (no prefixes if None)
+
+        :rtype: StringTable
+        """
+        builder = StringTableBuilder(pattern)
+        for string in strings:
+            builder.append(string)
+        return builder.build()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(len(self))[item]]
+        if not isinstance(item, (int, np.integer)):
+            return [self[i] for i in np.asarray(item).tolist()]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError('StringTable index out of range')
+        start, end = int(self.offsets[item]), int(self.offsets[item + 1])
+        return self.prefixes[self.prefix_ids[item]] + str(self.data[start:end], 'utf-8')
+
+    def __iter__(self):
+        offsets = self.offsets.tolist()
+        data = self.data
+        prefixes = self.prefixes
+        for prefix_id, start, end in zip(self.prefix_ids.tolist(),
+                                         offsets[:-1], offsets[1:]):
+            yield prefixes[prefix_id] + str(data[start:end], 'utf-8')
+
+    def __contains__(self, string):
+        return self.find(string) is not None
+
+    def tolist(self):
+        return list(self)
+
+    def find(self, string):
+        """
+        :rtype: int
+        :return: id of the first occurrence of string, None if absent
+        """
+        if self._order is None:
+            # sorted once, looked up by binary search, no index dict kept
+            self._order = np.array(sorted(range(len(self)), key=self.__getitem__),
+                                   dtype=_ids_dtype(len(self)))
+        order = self._order
+        position = bisect_left(order, string, key=lambda i: self[int(i)])
+        if position < len(order) and self[int(order[position])] == string:
+            return int(order[position])
+        return None
+
+    def index(self, string):
+        """
+        :rtype: int
+        :return: id of string, raises ValueError if absent
+        """
+        item = self.find(string)
+        if item is None:
+            raise ValueError('%r is not in the table' % string)
+        return item
+
+    @property
+    def nbytes(self):
+        """
+        :rtype: int
+        :return: approximate size of the table in bytes
+        """
+        prefix_ids = self.prefix_ids.nbytes if self.prefix_ids.strides != (0,) else 0
+        return (len(self.data) + self.offsets.nbytes + prefix_ids +
+                sum(len(prefix) for prefix in self.prefixes))
+
+
+class StringTableBuilder:
+    """
+    builds a StringTable one string at a time, without keeping the strings
+
+    :param pattern: see StringTable.from_strings
+    """
+
+    def __init__(self, pattern=None):
+        self.pattern = pattern
+        self.prefix_index = {}
+        self.prefix_ids = array('q')
+        self.lengths = array('q')
+        self.data = bytearray()
+
+    def append(self, string):
+        match = self.pattern.match(string) if self.pattern is not None else None
+        prefix = match.group() if match else ''
+        self.prefix_ids.append(self.prefix_index.setdefault(prefix,
+                                                            len(self.prefix_index)))
+        suffix = string[len(prefix):].encode('utf-8')
+        self.lengths.append(len(suffix))
+        self.data += suffix
+
+    def build(self):
+        """
+        :rtype: StringTable
+        """
+        prefixes = list(self.prefix_index)
+        offsets = np.zeros(len(self.lengths) + 1, dtype=_smallest_dtype(len(self.data)))
+        np.cumsum(np.frombuffer(self.lengths, dtype=np.int64), out=offsets[1:])
+        if len(prefixes) == 1:
+            # one prefix for all items: a read-only view of a single zero
+            prefix_ids = np.broadcast_to(np.zeros(1, dtype=np.uint8), (len(self.lengths),))
+        else:
+            prefix_ids = np.frombuffer(self.prefix_ids, dtype=np.int64).astype(
+                _smallest_dtype(len(prefixes) - 1))
+        return StringTable(prefixes, prefix_ids, bytes(self.data), offsets)
+
+
+class GroupedIds(Mapping):
+    """
+    key -> values it occurs with (one per mention), e.g. lexical
+    expression -> meanings. Value ids are stored in a single array sorted by
+    key id, lists of strings are only created when a key is looked up.
+
+    >>> keys = StringTable.from_strings(['bank', 'shore'])
+    >>> values = StringTable.from_strings(['bank.n.1', 'bank.n.2'])
+    >>> le2m = GroupedIds(np.array([0, 1, 0]), keys, np.array([0, 1, 1]), values)
+    >>> le2m['bank'], len(le2m)
+    (['bank.n.1', 'bank.n.2'], 2)
+    >>> le2m.ids(1).tolist()
+    [1]
+
+    :param numpy.ndarray key_ids: key id per mention
+    :param keys: key vocabulary
+    :param numpy.ndarray value_ids: value id per mention
+    :param values: value vocabulary
+    """
+
+    def __init__(self, key_ids, keys, value_ids, values):
+        self.keys_table = keys
+        self.values_table = values
+        order = np.argsort(key_ids, kind='stable')
+        self.value_ids = value_ids[order].astype(_smallest_dtype(len(values) - 1))
+        self.offsets = np.zeros(len(keys) + 1, dtype=_smallest_dtype(len(key_ids)))
+        np.cumsum(np.bincount(key_ids, minlength=len(keys)), out=self.offsets[1:])
+
+    def ids(self, key_id):
+        """
+        :rtype: numpy.ndarray
+        :return: value ids of the mentions of key id
+        """
+        return self.value_ids[self.offsets[key_id]:self.offsets[key_id + 1]]
+
+    def __getitem__(self, key):
+        key_id = self.keys_table.find(key)
+        if key_id is None or self.offsets[key_id] == self.offsets[key_id + 1]:
+            raise KeyError(key)
+        values = self.values_table
+        return [values[value_id] for value_id in self.ids(key_id).tolist()]
+
+    def __iter__(self):
+        present = np.flatnonzero(np.diff(self.offsets))
+        keys = self.keys_table
+        for key_id in present.tolist():
+            yield keys[key_id]
+
+    def __len__(self):
+        return int(np.count_nonzero(np.diff(self.offsets)))
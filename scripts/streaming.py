@@ -0,0 +1,261 @@
+"""
+streaming analysis of corpora that do not fit in memory
+
+the corpus is read in fixed-size chunks. Lexical expressions and meanings
+are not interned but hashed to 64 bit integers, so no vocabulary is kept.
+Each chunk is reduced to (expression, meaning, count) records. Records are
+compacted in memory and spilled to disk, partitioned by key, when more than
+max_pairs distinct pairs are buffered. Metrics are computed partition by
+partition at the end, which keeps memory bounded regardless of the number
+of rows.
+"""
+import os
+import tempfile
+
+import numpy as np
+
+import metrics
+from loader import MISSING, is_none, parse_resource_value
+
+
+def read_chunks(corpus_path, chunksize=100000):
+    """
+    read a corpus in tsv format in chunks
+
+    :param str corpus_path: path to corpus in six-column tsv format
+    :param int chunksize: number of rows per chunk
+
+    :rtype: generator
+    :return: generates (le hashes, meaning hashes, resource ambiguity,
+    resource variance, set of dates) per chunk
+    """
+    def to_chunk(rows, dates):
+        les, ms, ras, rvs = zip(*rows)
+        return (np.fromiter(map(hash, les), dtype=np.int64, count=len(rows)),
+                np.fromiter(map(hash, ms), dtype=np.int64, count=len(rows)),
+                np.fromiter(map(parse_resource_value, ras), dtype=np.int64,
+                            count=len(rows)),
+                np.fromiter(map(parse_resource_value, rvs), dtype=np.int64,
+                            count=len(rows)),
+                dates)
+
+    rows = []
+    dates = set()
+    with open(corpus_path, encoding='utf-8') as infile:
+        for line in infile:
+            try:
+                iden, le, m, dct, r_amb, r_var = line.strip().split('\t')
+            except ValueError:
+                continue
+
+            rows.append((le, m, r_amb, r_var))
+            dct = dct.strip()
+            if not is_none(dct):
+                dates.add(dct)
+
+            if len(rows) == chunksize:
+                yield to_chunk(rows, dates)
+                rows = []
+                dates = set()
+
+    if rows:
+        yield to_chunk(rows, dates)
+
+
+def aggregate_pairs(keys, others, counts):
+    """
+    sum counts of identical (key, other) pairs
+
+    >>> keys, others, counts = aggregate_pairs(np.array([1, 2, 1]), np.array([5, 5, 5]), np.array([1, 1, 2]))
+    >>> keys.tolist(), others.tolist(), counts.tolist()
+    ([1, 2], [5, 5], [3, 1])
+
+    :rtype: tuple
+    :return: (keys, others, counts) sorted by key and other
+    """
+    order = np.lexsort((others, keys))
+    keys, others, counts = keys[order], others[order], counts[order]
+    if not len(keys):
+        return keys, others, counts
+    starts = np.flatnonzero(np.concatenate(
+        ([True], (keys[1:] != keys[:-1]) | (others[1:] != others[:-1]))))
+    return keys[starts], others[starts], np.add.reduceat(counts, starts)
+
+
+def last_values(keys, values, positions):
+    """
+    keep the value at the highest position per key
+
+    >>> keys, values, positions = last_values(np.array([1, 1, 2]), np.array([4, 3, 9]), np.array([0, 1, 2]))
+    >>> keys.tolist(), values.tolist(), positions.tolist()
+    ([1, 2], [3, 9], [1, 2])
+    """
+    order = np.lexsort((positions, keys))
+    keys, values, positions = keys[order], values[order], positions[order]
+    if not len(keys):
+        return keys, values, positions
+    ends = np.flatnonzero(np.concatenate((keys[1:] != keys[:-1], [True])))
+    return keys[ends], values[ends], positions[ends]
+
+
+class _Side:
+    """
+    count state for one direction: lexical expression -> meanings
+    (ambiguity) or meaning -> lexical expressions (variance)
+    """
+
+    def __init__(self, name, partitions, spill_dir):
+        self.name = name
+        self.partitions = partitions
+        self.spill_dir = spill_dir
+        self.pairs = []
+        self.n_pairs = 0
+        self.resources = []
+        self.spilled = False
+
+    def add(self, keys, others, resources, positions):
+        self.pairs.append(aggregate_pairs(keys, others,
+                                          np.ones(len(keys), dtype=np.int64)))
+        self.n_pairs += len(self.pairs[-1][0])
+        mask = resources != MISSING
+        self.resources.append(last_values(keys[mask], resources[mask],
+                                          positions[mask]))
+
+    def compact(self):
+        self.pairs = [aggregate_pairs(*map(np.concatenate, zip(*self.pairs)))]
+        self.n_pairs = len(self.pairs[0][0])
+        self.resources = [last_values(*map(np.concatenate,
+                                           zip(*self.resources)))]
+
+    def spill(self):
+        self.compact()
+        for kind, records in (('pairs', self.pairs[0]),
+                              ('resources', self.resources[0])):
+            records = np.stack(records, axis=1)
+            partition_ids = records[:, 0] % self.partitions
+            for partition in np.unique(partition_ids).tolist():
+                with open(self._path(kind, partition), 'ab') as outfile:
+                    records[partition_ids == partition].tofile(outfile)
+        self.pairs = []
+        self.n_pairs = 0
+        self.resources = []
+        self.spilled = True
+
+    def _path(self, kind, partition):
+        return os.path.join(self.spill_dir,
+                            '%s.%s.%d' % (self.name, kind, partition))
+
+    def _read(self, kind, partition):
+        path = self._path(kind, partition)
+        if not os.path.exists(path):
+            return (np.zeros(0, dtype=np.int64),) * 3
+        records = np.fromfile(path, dtype=np.int64).reshape(-1, 3)
+        return records[:, 0], records[:, 1], records[:, 2]
+
+    def parts(self):
+        """
+        generates (pairs, resources) per partition, all keys of a partition
+        are in a single part
+        """
+        if not self.spilled:
+            if self.pairs:
+                self.compact()
+                yield self.pairs[0], self.resources[0]
+            return
+        if self.pairs:
+            self.spill()
+        for partition in range(self.partitions):
+            yield (aggregate_pairs(*self._read('pairs', partition)),
+                   last_values(*self._read('resources', partition)))
+
+    def totals(self, ignore_theoretical_one=True):
+        """
+        :rtype: dict
+        :return: sums over all keys of cardinality, dominance, entropy
+        and resource ratio, plus the number of keys and of ratios
+        """
+        totals = dict.fromkeys(('keys', 'cardinality', 'dominance', 'entropy',
+                                'ratios', 'ratio'), 0)
+        for (keys, others, counts), (r_keys, r_values, _) in self.parts():
+            unique_keys, groups = np.unique(keys, return_inverse=True)
+            cardinality, dominance, entropy = metrics.group_statistics(
+                groups, counts, len(unique_keys))
+
+            resource = np.full(len(unique_keys), MISSING, dtype=np.int64)
+            found = np.isin(r_keys, unique_keys)
+            resource[np.searchsorted(unique_keys, r_keys[found])] = r_values[found]
+            mask = resource > 0
+            if ignore_theoretical_one:
+                mask &= resource != 1
+
+            totals['keys'] += len(unique_keys)
+            totals['cardinality'] += int(cardinality.sum())
+            totals['dominance'] += float(dominance.sum())
+            totals['entropy'] += float(entropy.sum())
+            totals['ratios'] += int(mask.sum())
+            totals['ratio'] += float((cardinality[mask] / resource[mask]).sum())
+        return totals
+
+
+class StreamingAnalysis:
+    """
+    out-of-core counterpart of analysis.Analysis
+
+    metrics are the same as those of Analysis (moa, moda, emnle, rora,
+    mov, modv, elenm, rorv, dtr) and are available as attributes. Values
+    may differ from Analysis in the last digits because sums are
+    accumulated per partition.
+
+    :param str corpus_path: path to corpus in six-column tsv format
+    :param int chunksize: number of rows read at a time
+    :param int max_pairs: maximum number of pairs kept in memory per
+    direction, the pairs are compacted when it is exceeded and spilled to
+    disk if more than half of them are distinct
+    :param int partitions: number of spill partitions, a partition should
+    fit in memory when metrics are computed
+    :param str spill_dir: directory for spill files (default: a temporary
+    directory that is removed afterwards)
+    """
+
+    def __init__(self, corpus_path, chunksize=100000, max_pairs=5000000,
+                 partitions=64, spill_dir=None):
+        self.rows = 0
+        self.dtr = []
+        with tempfile.TemporaryDirectory(dir=spill_dir) as tmp_dir:
+            ambiguity = _Side('amb', partitions, tmp_dir)
+            variance = _Side('var', partitions, tmp_dir)
+
+            for le_h, m_h, r_amb, r_var, dates in read_chunks(corpus_path,
+                                                              chunksize):
+                positions = np.arange(self.rows, self.rows + len(le_h))
+                self.rows += len(le_h)
+                if dates:
+                    self.dtr = [min(self.dtr + metrics.DTR(dates)),
+                                max(self.dtr + metrics.DTR(dates))]
+
+                for side, keys, others, resources in (
+                        (ambiguity, le_h, m_h, r_amb),
+                        (variance, m_h, le_h, r_var)):
+                    side.add(keys, others, resources, positions)
+                    if side.n_pairs > max_pairs:
+                        side.compact()
+                        # spill unless compaction freed at least half of
+                        # the buffer, else every chunk compacts again
+                        if side.n_pairs > max_pairs // 2:
+                            side.spill()
+
+            self.set_metrics(ambiguity.totals(), variance.totals())
+
+    def set_metrics(self, amb, var):
+        def mean(total, n):
+            return total / n if n else 0.0
+
+        self.moa = mean(amb['cardinality'], amb['keys'])
+        self.moda = mean(amb['dominance'], amb['keys'])
+        self.emnle = mean(amb['entropy'], amb['keys'])
+        self.rora = mean(amb['ratio'], amb['ratios'])
+
+        self.mov = mean(var['cardinality'], var['keys'])
+        self.modv = mean(var['dominance'], var['keys'])
+        self.elenm = mean(var['entropy'], var['keys'])
+        self.rorv = mean(var['ratio'], var['ratios'])
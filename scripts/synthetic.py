@@ -0,0 +1,216 @@
+"""
+synthetic corpora in the six-column format
+
+a CorpusModel is the joint distribution of (lexical expression, meaning)
+pairs of a corpus, so it holds the expression -> meaning distributions of
+Analysis.le2m and the meaning -> expression distributions of m2le at once,
+together with the resource values and the distribution of creation dates.
+Sampling mentions from it reproduces the ambiguity and variance profiles
+(MOA, MODA, EMNLE, ...) of the corpus. Larger corpora are made of copies
+of the vocabulary ('bank', 'bank_1', 'bank_2', ...), each sampled from the
+same distributions, so that metrics stay comparable while the number of
+mentions and keys grows. The copy number is appended to the local name, so
+that copies of meanings keep their prefix (store.MEANING_PREFIX).
+
+Usage: python synthetic.py DATASET OUTPUT --mentions N [--copies K]
+                           [--chunksize N] [--processes N] [--seed S]
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from loader import MISSING
+
+
+class CorpusModel:
+    """
+    joint distribution of pairs of a corpus
+
+    >>> model = CorpusModel(['bank', 'shore'], ['bank.n.1', 'bank.n.2'],
+    ...                     np.array([0, 0, 1]), np.array([0, 1, 1]),
+    ...                     np.array([0.6, 0.2, 0.2]))
+    >>> lines = model.generate(5, seed=0, copies=2).splitlines()
+    >>> len(lines), lines[0].split('\\t')[0], len(lines[0].split('\\t'))
+    (5, '0', 6)
+    >>> model = CorpusModel(['Paris'], ['http://dbpedia.org/resource/Paris'],
+    ...                     np.array([0]), np.array([0]), np.array([1.0]))
+    >>> sorted({line.split('\\t')[2] for line in model.generate(20, seed=0, copies=2).splitlines()})
+    ['http://dbpedia.org/resource/Paris', 'http://dbpedia.org/resource/Paris_1']
+    >>> counts = np.array([2, 46, 10, 18, 34, 23, 28, 29, 8, 1, 47, 40, 8, 33, 26, 37, 8])
+    >>> model = CorpusModel(['Paris'], ['http://dbpedia.org/resource/Paris'],
+    ...                     np.array([0]), np.array([0]), np.array([1.0]),
+    ...                     dates=['2015-07-%02d' % day for day in range(1, 18)],
+    ...                     date_probabilities=counts / counts.sum())
+    >>> float(model.date_probabilities[-1])
+    0.0
+    >>> {line.split('\\t')[3] for line in model.generate(1000, seed=0).splitlines()} <= set(model.dates)
+    True
+
+    :param list les: lexical expressions
+    :param list meanings: meanings
+    :param numpy.ndarray pair_les: lexical expression id per pair
+    :param numpy.ndarray pair_meanings: meaning id per pair
+    :param numpy.ndarray probabilities: probability per pair
+    :param numpy.ndarray r_amb: resource ambiguity per lexical expression id
+    (MISSING if not available)
+    :param numpy.ndarray r_var: resource variance per meaning id
+    :param list dates: distinct creation dates (yyyy-mm-dd)
+    :param numpy.ndarray date_probabilities: probability per date, the
+    remainder is the probability of a mention without date
+    """
+
+    def __init__(self, les, meanings, pair_les, pair_meanings, probabilities,
+                 r_amb=None, r_var=None, dates=(), date_probabilities=()):
+        self.les = list(les)
+        self.meanings = list(meanings)
+        self.pair_les = pair_les
+        self.pair_meanings = pair_meanings
+        self.probabilities = probabilities / probabilities.sum()
+        self.r_amb = (np.full(len(self.les), MISSING, dtype=np.int64)
+                      if r_amb is None else r_amb)
+        self.r_var = (np.full(len(self.meanings), MISSING, dtype=np.int64)
+                      if r_var is None else r_var)
+        self.dates = list(dates)
+        date_probabilities = np.asarray(date_probabilities, dtype=float)
+        # the remainder of a fully dated corpus can round to slightly below 0
+        date_probabilities = np.append(date_probabilities,
+                                       max(0.0, 1 - date_probabilities.sum()))
+        self.date_probabilities = date_probabilities / date_probabilities.sum()
+
+    @classmethod
+    def fit(cls, analysis):
+        """
+        :param analysis.Analysis analysis: analysed corpus
+
+        :rtype: CorpusModel
+        """
+        columns = analysis.columns
+        counts = analysis.counts
+        dates, date_counts = np.unique(columns.dated(), return_counts=True)
+        return cls(columns.les, columns.meanings,
+                   counts.rows, counts.cols, counts.counts.astype(float),
+                   columns.resource_ambiguity_column(),
+                   columns.resource_variance_column(),
+                   np.datetime_as_string(dates).tolist(),
+                   date_counts / max(len(columns), 1))
+
+    @classmethod
+    def zipf(cls, n_les, a=1.3, senses=5, p=0.7, seed=0):
+        """
+        model with Zipfian lexical expressions: expression i has weight
+        1 / (i + 1) ** a, its k-th sense weight p * (1 - p) ** k, so every
+        expression has a dominant meaning. Meanings are shared between
+        expressions, which gives variance.
+
+        :param int n_les: number of lexical expressions
+        :param float a: Zipf exponent
+        :param int senses: number of senses per lexical expression
+        :param float p: parameter of the geometric sense distribution
+        :param int seed: seed for the resource values
+
+        :rtype: CorpusModel
+        """
+        n_meanings = 2 * n_les
+        le_ids = np.repeat(np.arange(n_les), senses)
+        sense_ids = np.tile(np.arange(senses), n_les)
+        weights = (1.0 / (le_ids + 1.0) ** a) * p * (1 - p) ** sense_ids
+        m_ids = (le_ids * 7919 + sense_ids * 104729) % n_meanings
+        used, m_ids = np.unique(m_ids, return_inverse=True)
+        rng = np.random.default_rng(seed)
+        return cls(['le%d' % i for i in range(n_les)],
+                   ['m%d' % i for i in used.tolist()],
+                   le_ids, m_ids.ravel(), weights,
+                   rng.integers(senses, 3 * senses, n_les),
+                   rng.integers(1, 4, len(used)))
+
+    def _strings(self, ids, copies, vocabulary):
+        return [vocabulary[key] if copy == 0 else '%s_%d' % (vocabulary[key], copy)
+                for key, copy in zip(ids.tolist(), copies.tolist())]
+
+    def generate(self, n_mentions, seed=None, copies=1, start=0):
+        """
+        sample mentions
+
+        :param int n_mentions: number of rows
+        :param seed: seed of the random generator
+        :param int copies: number of copies of the vocabulary
+        :param int start: identifier of the first row
+
+        :rtype: str
+        :return: rows in tsv format
+        """
+        rng = np.random.default_rng(seed)
+        pairs = rng.choice(len(self.probabilities), n_mentions, p=self.probabilities)
+        copy = rng.integers(copies, size=n_mentions)
+        dates = rng.choice(len(self.date_probabilities), n_mentions,
+                           p=self.date_probabilities)
+
+        le_ids = self.pair_les[pairs]
+        m_ids = self.pair_meanings[pairs]
+        les = self._strings(le_ids, copy, self.les)
+        meanings = self._strings(m_ids, copy, self.meanings)
+        date_strings = self.dates + ['None']
+        r_amb = self.r_amb[le_ids].tolist()
+        r_var = self.r_var[m_ids].tolist()
+        return ''.join('%d\t%s\t%s\t%s\t%s\t%s\n'
+                       % (start + i, le, m, date_strings[date],
+                          ra if ra != MISSING else 'None',
+                          rv if rv != MISSING else 'None')
+                       for i, (le, m, date, ra, rv)
+                       in enumerate(zip(les, meanings, dates.tolist(), r_amb, r_var)))
+
+    def write(self, path, n_mentions, copies=1, chunksize=1000000,
+              processes=1, seed=None):
+        """
+        write a synthetic corpus, chunk by chunk
+
+        :param str path: output path
+        :param int n_mentions: number of rows
+        :param int copies: number of copies of the vocabulary
+        :param int chunksize: number of rows generated at a time
+        :param int processes: number of worker processes generating chunks
+        (None: all cores)
+        :param seed: seed of the random generator, every chunk gets its own
+        stream, so the output does not depend on processes
+        """
+        starts = list(range(0, n_mentions, chunksize))
+        seeds = np.random.SeedSequence(seed).spawn(len(starts))
+        tasks = [(self, min(chunksize, n_mentions - start), chunk_seed, copies, start)
+                 for start, chunk_seed in zip(starts, seeds)]
+        with open(path, 'w', encoding='utf-8') as outfile:
+            if processes == 1:
+                for task in tasks:
+                    outfile.write(_generate(task))
+            else:
+                with ProcessPoolExecutor(max_workers=processes) as executor:
+                    for chunk in executor.map(_generate, tasks):
+                        outfile.write(chunk)
+
+
+def _generate(task):
+    model, n_mentions, seed, copies, start = task
+    return model.generate(n_mentions, seed, copies, start)
+
+
+if __name__ == '__main__':
+    from analysis import Analysis
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('dataset', help='dataset to fit, path or name in datasets')
+    parser.add_argument('output', help='path of the synthetic corpus')
+    parser.add_argument('--mentions', type=int, required=True,
+                        help='number of rows')
+    parser.add_argument('--copies', type=int, default=None,
+                        help='copies of the vocabulary (default: keep the '
+                        'number of mentions per key of the dataset)')
+    parser.add_argument('--chunksize', type=int, default=1000000)
+    parser.add_argument('--processes', type=int, default=1,
+                        help='number of worker processes (0: all cores)')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    analysis = Analysis(args.dataset)
+    copies = args.copies or max(1, round(args.mentions / max(len(analysis.columns), 1)))
+    CorpusModel.fit(analysis).write(args.output, args.mentions, copies,
+                                    args.chunksize, args.processes or None, args.seed)
@@ -0,0 +1,91 @@
+"""
+metrics per time window of document creation time
+
+rows are grouped into windows (day, month or year) of their document
+creation time and counted once per window. Metrics of a window are computed
+from its counts, cumulative metrics by merging the counts of consecutive
+windows, so no window is ever recounted from the rows.
+"""
+import numpy as np
+
+from metrics import DatasetMetrics, CountMatrix, DTR
+
+UNITS = {'day': 'D', 'month': 'M', 'year': 'Y'}
+
+
+class TimeIndex:
+    """
+    time-bucketed index over the creation dates of a corpus
+
+    :param loader.Columns columns: the corpus
+    :param str unit: 'day', 'month' or 'year'
+    """
+
+    def __init__(self, columns, unit='month'):
+        self.unit = unit
+        buckets = columns.creation_dates.astype('datetime64[%s]' % UNITS[unit])
+        dated = np.flatnonzero(~np.isnat(buckets))
+        # stable, so that rows keep their corpus order within a window
+        order = dated[np.argsort(buckets[dated], kind='stable')]
+        windows, starts = np.unique(buckets[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+
+        shape = (len(columns.les), len(columns.meanings))
+        self.windows = [str(window) for window in windows]
+        self.counts = [CountMatrix.from_ids(columns.le_ids[order[start:end]],
+                                            columns.m_ids[order[start:end]],
+                                            shape)
+                       for start, end in zip(starts.tolist(), ends.tolist())]
+        self.dtrs = [DTR(columns.creation_dates[order[start:end]])
+                     for start, end in zip(starts.tolist(), ends.tolist())]
+        self.r_amb = columns.resource_ambiguity_column()
+        self.r_var = columns.resource_variance_column()
+
+    def __len__(self):
+        return len(self.windows)
+
+    def metrics(self, window):
+        """
+        :param str window: e.g. '2013-04' for unit 'month'
+
+        :rtype: metrics.DatasetMetrics
+        :return: metrics of the rows in window
+        """
+        index = self.windows.index(window)
+        return DatasetMetrics(self.counts[index], self.r_amb, self.r_var,
+                              self._dates(self.dtrs[index]))
+
+    def cumulative(self):
+        """
+        :rtype: generator
+        :return: (window, metrics of all rows up to and including window)
+        """
+        counts = None
+        dtr = []
+        for window, window_counts, window_dtr in zip(self.windows,
+                                                     self.counts, self.dtrs):
+            counts = window_counts if counts is None else counts.merge(window_counts)
+            dtr = [min(dtr + window_dtr), max(dtr + window_dtr)]
+            yield window, DatasetMetrics(counts, self.r_amb, self.r_var,
+                                         self._dates(dtr))
+
+    def table(self, cumulative=False, names=DatasetMetrics.NAMES):
+        """
+        :param bool cumulative: if True, metrics up to each window,
+        otherwise metrics per window
+        :param tuple names: metrics to compute
+
+        :rtype: list
+        :return: one dict per window: {'window': window, name: value, ...}
+        """
+        if cumulative:
+            per_window = self.cumulative()
+        else:
+            per_window = ((window, self.metrics(window))
+                          for window in self.windows)
+        return [dict([('window', window)] +
+                     [(name, getattr(dataset_metrics, name)) for name in names])
+                for window, dataset_metrics in per_window]
+
+    def _dates(self, dtr):
+        return np.array([date.date() for date in dtr], dtype='datetime64[D]')